@@ -1,4 +1,60 @@
 import scrapy
+from lxml import etree
+
+# Header text that identifies each column, matched case-insensitively
+COLUMNS = {
+    "name": ("medical school", "school name", "institution", "school", "name"),
+    "city": ("city",),
+    "state": ("state", "province"),
+    "designation": ("degree", "designation", "type"),
+    "mission": ("mission",),
+}
+
+# Column order of a report table without a recognizable header row
+DEFAULT_COLUMNS = {"name": 0, "city": 1, "state": 2, "mission": 3}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def cell_text(cell):
+    return " ".join("".join(cell.itertext()).split())
+
+
+def header_columns(cells, minimum=2):
+    """Map field names to column positions, or None if the row is not a header"""
+    columns = {}
+    for position, cell in enumerate(cells):
+        text = cell_text(cell).lower()
+        for field, labels in COLUMNS.items():
+            if field not in columns and text.startswith(labels):
+                columns[field] = position
+                break
+    return columns if "name" in columns and len(columns) >= minimum else None
+
+
+def iter_rows(body, encoding=None):
+    """
+    Stream the <tr> elements of an HTML document as lists of cell elements.
+    Each row is cleared, and dropped from its parent, once the caller moves on,
+    so memory stays flat however long the table is.
+    """
+    parser = etree.HTMLPullParser(events=("end",), tag="tr", encoding=encoding)
+    for start in range(0, len(body), CHUNK_SIZE):
+        parser.feed(body[start:start + CHUNK_SIZE])
+        yield from _drain(parser)
+    parser.close()
+    yield from _drain(parser)
+
+
+def _drain(parser):
+    for _, row in parser.read_events():
+        yield [cell for cell in row if cell.tag in ("td", "th")]
+        row.clear()
+        parent = row.getparent()
+        if parent is not None:
+            while row.getprevious() is not None:
+                del parent[0]
+
 
 class MedSchoolsSpider(scrapy.Spider):
     name = "med_schools"
@@ -9,14 +65,27 @@ class MedSchoolsSpider(scrapy.Spider):
     custom_settings = {"DOWNLOAD_DELAY": 0.5}
 
     def parse(self, response):
-        for row in response.css("table tr"):
-            cells = row.css("td::text").getall()
-            if len(cells) < 4:
+        columns = DEFAULT_COLUMNS
+        for cells in iter_rows(response.body, response.encoding):
+            if all(cell.tag == "th" for cell in cells):
+                columns = header_columns(cells) or columns
+                continue
+            if columns is DEFAULT_COLUMNS and header_columns(cells, minimum=3):
+                # Header row made of <td> cells
+                columns = header_columns(cells)
+                continue
+            if len(cells) <= max(columns.values()):
+                continue
+            row = {field: cell_text(cells[position]) for field, position in columns.items()}
+            if not row["name"]:
                 continue
+            designation = row.get("designation", "").replace(".", "").upper()
+            if designation not in ("MD", "DO"):
+                designation = "DO" if "osteopathic" in row["name"].lower() else "MD"
             yield {
-                "name": cells[0].strip(),
-                "city": cells[1].strip(),
-                "state": cells[2].strip(),
-                "designation": 'MD' if 'Medicine' in cells[0] else 'DO',
-                "mission": row.css("td:nth-child(4)::text").get(default='').strip()
+                "name": row["name"],
+                "city": row.get("city", ""),
+                "state": row.get("state", ""),
+                "designation": designation,
+                "mission": row.get("mission", ""),
             }
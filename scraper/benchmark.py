@@ -0,0 +1,279 @@
+"""
+Offline benchmark for the extraction code of the spiders
+Runs spider callbacks over saved HTML pages, without any network access:
+    python benchmark.py                       # benchmark_corpus/ + synthetic 1-5 MB pages
+    python benchmark.py my_pages/ --repeat 5 --save today.json
+    python benchmark.py --compare baseline.json
+
+Each page is an .html file with an optional .json sidecar of the same name:
+    {"spider": "school_websites" | "med_schools", "callback": "parse",
+     "url": "...", "school": {...csv metadata...}, "meta": {...},
+     "expected": {"tuition": 41250, ...}}
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+from scraper.items import MedicalSchoolItem
+from scraper.spiders.med_schools import MedSchoolsSpider
+from scraper.spiders.school_websites import SchoolWebsitesSpider
+
+SPIDERS = {
+    'school_websites': SchoolWebsitesSpider,
+    'med_schools': MedSchoolsSpider,
+}
+
+FIELDS = [field for field in MedicalSchoolItem.fields if field not in ('link',)]
+
+
+class Page:
+    def __init__(self, name, body, spider='school_websites', callback='parse', url=None,
+                 meta=None, expected=None):
+        self.name = name
+        self.body = body
+        self.spider = spider
+        self.callback = callback
+        self.url = url or f'https://{name.replace("_", "-")}.example.edu/'
+        self.meta = meta or {}
+        self.expected = expected or {}
+
+    def response(self):
+        request = Request(self.url, meta=dict(self.meta))
+        return HtmlResponse(self.url, body=self.body, encoding='utf-8', request=request)
+
+
+def load_corpus(directory):
+    """Pages of a fixture directory"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            body = f.read()
+        options = {}
+        sidecar = os.path.splitext(path)[0] + '.json'
+        if os.path.exists(sidecar):
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                options = json.load(f)
+        meta = dict(options.get('meta', {}))
+        if 'school' in options:
+            meta['school'] = options['school']
+        pages.append(Page(name, body, spider=options.get('spider', 'school_websites'),
+                          callback=options.get('callback', 'parse'), url=options.get('url'),
+                          meta=meta, expected=options.get('expected')))
+    return pages
+
+
+def synthetic_pages(sizes_mb=(1, 2, 5)):
+    """Large pages built to expose regex backtracking and full-body scans"""
+    filler = [
+        'The average student reports that the gpa requirement is discussed later. ',
+        'Tuition and fees are described on another page for every program. ',
+        '2024 students in the class of the acceptance committee met ',
+        'mcat preparation score reports primary secondary deadline information ',
+        '<a href="/news/item">News item</a> <span class="location-tag">Campus</span> ',
+    ]
+    script = '<script>var data = "' + 'x' * 20000 + '";</script>'
+    pages = []
+    for size in sizes_mb:
+        target = size * 1024 * 1024
+        parts = ['<html><head><title>Synthetic School of Medicine</title></head><body>', script]
+        length = sum(len(p) for p in parts)
+        i = 0
+        while length < target:
+            chunk = '<p>' + filler[i % len(filler)] * 20 + '</p>'
+            parts.append(chunk)
+            length += len(chunk)
+            i += 1
+        parts.append('<p>Tuition: $45,000. Average GPA: 3.70. MCAT: 511.</p></body></html>')
+        pages.append(Page(f'synthetic_{size}mb', ''.join(parts).encode('utf-8'),
+                          meta={'school': {'name': 'Synthetic School of Medicine', 'type': 'MD'}}))
+    return pages
+
+
+def instrument(spider, timings):
+    """Wrap the spider's _extract_* methods to record their durations"""
+    for name in dir(spider):
+        if not name.startswith('_extract_'):
+            continue
+        method = getattr(spider, name)
+
+        def timed(*args, _method=method, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                timings.setdefault(_name, []).append(time.perf_counter() - start)
+
+        setattr(spider, name, timed)
+
+
+def run_page(spiders, page):
+    """Run a page's callback and return the items it produced"""
+    spider = spiders[page.spider]
+    callback = getattr(spider, page.callback)
+    return [result for result in callback(page.response()) or []
+            if not isinstance(result, Request)]
+
+
+def values_match(expected, actual):
+    if isinstance(expected, float) and isinstance(actual, (int, float)):
+        return abs(expected - actual) < 1e-6
+    if isinstance(expected, list) and isinstance(actual, list):
+        return sorted(expected) == sorted(actual)
+    return expected == actual
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def benchmark(pages, repeat=1):
+    """Time every page and score the extracted fields"""
+    timings = {}
+    spiders = {}
+    for key, cls in SPIDERS.items():
+        spiders[key] = cls()
+        instrument(spiders[key], timings)
+
+    page_times = {}
+    items = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            start = time.perf_counter()
+            items[page.name] = run_page(spiders, page)
+            page_times.setdefault(page.name, []).append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    measured = {name: list(t) for name, t in timings.items()}
+
+    # Separate pass for memory: tracemalloc would distort the timings
+    tracemalloc.start()
+    for page in pages:
+        run_page(spiders, page)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    filled = total = 0
+    correct = checked = 0
+    misses = []
+    for page in pages:
+        for item in items[page.name]:
+            for field in FIELDS:
+                total += 1
+                if item.get(field) not in (None, '', [], {}):
+                    filled += 1
+            for field, expected in page.expected.items():
+                checked += 1
+                if values_match(expected, item.get(field)):
+                    correct += 1
+                else:
+                    misses.append(f'{page.name}.{field}: expected {expected!r}, got {item.get(field)!r}')
+
+    return {
+        'pages': len(pages) * repeat,
+        'seconds': elapsed,
+        'pages_per_sec': len(pages) * repeat / elapsed if elapsed else 0.0,
+        'peak_memory_mb': peak_memory / (1024 * 1024),
+        'fill_rate': filled / total if total else 0.0,
+        'accuracy': correct / checked if checked else None,
+        'page_ms': {name: percentile(t, 0.5) * 1000 for name, t in page_times.items()},
+        'extractors': {
+            name: {
+                'calls': len(t),
+                'p50_ms': percentile(t, 0.5) * 1000,
+                'p99_ms': percentile(t, 0.99) * 1000,
+            }
+            for name, t in sorted(measured.items())
+        },
+        'misses': misses,
+    }
+
+
+def print_report(result):
+    print(f"Pages:        {result['pages']} in {result['seconds']:.2f}s "
+          f"({result['pages_per_sec']:.1f} pages/sec)")
+    print(f"Peak memory:  {result['peak_memory_mb']:.1f} MB")
+    print(f"Fill rate:    {result['fill_rate']:.1%}")
+    if result['accuracy'] is not None:
+        print(f"Accuracy:     {result['accuracy']:.1%} of expected fields")
+    print('\nSlowest pages (p50 ms):')
+    for name, ms in sorted(result['page_ms'].items(), key=lambda p: -p[1])[:5]:
+        print(f'  {name:<30} {ms:10.2f}')
+    print('\nExtractors:          calls    p50 ms    p99 ms')
+    for name, stats in result['extractors'].items():
+        print(f"  {name:<18} {stats['calls']:6d} {stats['p50_ms']:9.3f} {stats['p99_ms']:9.3f}")
+    if result['misses']:
+        print('\nMismatches:')
+        for miss in result['misses']:
+            print(f'  {miss}')
+
+
+def compare(result, baseline, tolerance):
+    """Print differences against a saved run; return False on a regression"""
+    ok = True
+    print(f'\nCompared with baseline (tolerance {tolerance:.0%}):')
+
+    def check(label, new, old, higher_is_better=True):
+        nonlocal ok
+        if old in (None, 0) or new is None:
+            return
+        change = (new - old) / old
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        marker = '  REGRESSION' if worse else ''
+        print(f'  {label:<28} {old:10.3f} -> {new:10.3f} ({change:+.1%}){marker}')
+        ok = ok and not worse
+
+    check('pages/sec', result['pages_per_sec'], baseline['pages_per_sec'])
+    check('peak memory MB', result['peak_memory_mb'], baseline['peak_memory_mb'], higher_is_better=False)
+    check('fill rate', result['fill_rate'], baseline['fill_rate'])
+    if result['accuracy'] is not None and baseline.get('accuracy') is not None and result['accuracy'] < baseline['accuracy']:
+        print(f"  accuracy                     {baseline['accuracy']:10.3f} -> {result['accuracy']:10.3f}  REGRESSION")
+        ok = False
+    for name, stats in result['extractors'].items():
+        old = baseline['extractors'].get(name)
+        if old:
+            check(f'{name} p99 ms', stats['p99_ms'], old['p99_ms'], higher_is_better=False)
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark spider extraction on saved pages')
+    parser.add_argument('corpus', nargs='?', default='benchmark_corpus',
+                        help='Directory of .html fixtures (with optional .json sidecars)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per page')
+    parser.add_argument('--no-synthetic', action='store_true', help='Skip the 1-5 MB synthetic pages')
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Compare with results saved by an earlier --save')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Relative change counted as a regression')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not args.no_synthetic:
+        pages += synthetic_pages()
+    if not pages:
+        print(f'No pages found in {args.corpus}')
+        sys.exit(1)
+
+    result = benchmark(pages, repeat=args.repeat)
+    print_report(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.tolerance):
+            sys.exit(1)
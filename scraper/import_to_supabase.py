@@ -1,12 +1,42 @@
 """
 Script to import scraped CSV data into Supabase
 Run this after scraping: python import_to_supabase.py
+
+Also reads the streamed JSON Lines export, one row at a time:
+    python import_to_supabase.py medical_schools.jsonl
+    python import_to_supabase.py 'medical_schools-*.jsonl.gz'
+
+And the indexed SQLite export:
+    python import_to_supabase.py medical_schools.sqlite
+
+Bulk mode sends rows in batches over pooled connections:
+    python import_to_supabase.py medical_schools.jsonl --bulk --batch-size 500 --in-flight 4
+    python import_to_supabase.py medical_schools.csv --bulk --rest-url http://localhost:3000 --rest-path ''
+
+Several sources can be imported together; --dedupe merges the rows of the
+same school scraped under different names ("Harvard Medical School",
+"Harvard University School of Medicine") into one record first:
+    python import_to_supabase.py medical_schools.jsonl msar_schools.csv --dedupe --bulk
+
+Incremental mode only sends schools whose data changed since the last import
+(tracked in a local manifest of name -> content hash):
+    python import_to_supabase.py medical_schools.jsonl --bulk --incremental [--delete-missing]
 """
+import argparse
 import csv
+import glob
+import gzip
+import hashlib
+import itertools
 import json
 import os
+import sqlite3
 from supabase import create_client, Client
 
+from scraper.dedupe import resolve
+from scraper.normalize import build_school_data, parse_value
+from scraper.postgrest import PostgrestClient, bulk_upsert
+
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv('../.env.local')
@@ -15,120 +45,300 @@ SUPABASE_URL = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
 # Try service role key first (bypasses RLS), fall back to anon key
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Missing Supabase credentials in .env.local. Add SUPABASE_SERVICE_ROLE_KEY for imports.")
+supabase: Client = None  # Created on first use by get_supabase()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Fingerprints of the rows sent by previous incremental imports
+MANIFEST_FILE = '.import_manifest.json'
 
 
-def parse_value(value, field_type):
-    """Parse CSV value based on field type"""
-    if not value or value == '':
-        return None
-    
-    if field_type == 'int':
-        try:
-            return int(value)
-        except:
-            return None
-    elif field_type == 'float':
-        try:
-            return float(value)
-        except:
-            return None
-    elif field_type == 'list':
-        try:
-            return json.loads(value) if value else []
-        except:
-            return []
-    elif field_type == 'dict':
-        try:
-            return json.loads(value) if value else None
-        except:
-            return None
-    return value.strip() if value else None
-
-
-def import_csv_to_supabase(csv_file='scraped_schools.csv'):
+def get_supabase():
+    """Supabase client for row-by-row imports"""
+    global supabase
+    if supabase is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("Missing Supabase credentials in .env.local. Add SUPABASE_SERVICE_ROLE_KEY for imports.")
+        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return supabase
+
+
+def iter_csv_rows(csv_file):
+    """Yield rows of a scraped CSV file"""
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def jsonl_files(pattern):
+    """Files of a JSON Lines export: a path or glob, including rotated and .gz parts"""
+    paths = sorted(glob.glob(pattern))
+    if not paths and not glob.has_magic(pattern):
+        # medical_schools.jsonl also matches its rotated medical_schools-NNNN.jsonl parts
+        stem, ext = os.path.splitext(pattern)
+        paths = sorted(glob.glob(f'{stem}-[0-9]*{ext}') + glob.glob(f'{stem}-[0-9]*{ext}.gz'))
+    return paths
+
+
+def iter_jsonl_rows(pattern):
+    """Yield rows of a JSON Lines export one at a time (constant memory)"""
+    for path in jsonl_files(pattern):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A crashed crawl can leave a truncated last line in a .tmp part
+                    print(f"Skipping unreadable line {line_number} in {path}")
+
+
+def iter_sqlite_rows(db_file):
+    """Yield rows of the SQLite export, with courses and deadlines from the side tables"""
+    db = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        for school in db.execute('SELECT * FROM schools ORDER BY id'):
+            row = dict(school)
+            school_id = row.pop('id')
+            row.pop('updated_at', None)
+            row['required_courses'] = [course for (course,) in db.execute(
+                'SELECT course FROM school_courses WHERE school_id = ?', (school_id,))]
+            row['deadlines'] = dict(db.execute(
+                'SELECT kind, deadline FROM school_deadlines WHERE school_id = ?', (school_id,)).fetchall())
+            yield row
+    finally:
+        db.close()
+
+
+def import_csv_to_supabase(csv_file='scraped_schools.csv', **options):
     """Import CSV data into Supabase schools table"""
     
     if not os.path.exists(csv_file):
         print(f"Error: {csv_file} not found. Run the scraper first.")
         return
     
-    schools_imported = 0
-    schools_skipped = 0
+    import_rows(iter_csv_rows(csv_file), **options)
+
+
+def source_rows(source):
+    """Rows of a CSV, JSON Lines or SQLite export, or None if it does not exist"""
+    if '.jsonl' in source:
+        return iter_jsonl_rows(source) if jsonl_files(source) else None
+    if not os.path.exists(source):
+        return None
+    if source.endswith(('.sqlite', '.db')):
+        return iter_sqlite_rows(source)
+    return iter_csv_rows(source)
+
+
+def import_sources(sources, dedupe=False, **options):
+    """Import one or more exports, optionally merging duplicate schools across them"""
     
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    row_sources = []
+    for source in sources:
+        rows = source_rows(source)
+        if rows is None:
+            print(f"Error: {source} not found. Run the scraper first.")
+            return
+        row_sources.append(rows)
+    rows = itertools.chain.from_iterable(row_sources)
+    
+    if dedupe:
+        rows = list(rows)
+        total = len(rows)
+        rows = resolve(rows)
+        print(f"Resolved {total} rows into {len(rows)} schools")
+    
+    import_rows(rows, **options)
+
+
+def iter_school_records(rows, counts):
+    """Normalize rows, skipping (and counting) those missing required fields"""
+    for row in rows:
+        school_data = build_school_data(row)
         
-        for row in reader:
-            # Parse required_courses - handle both JSON string and comma-separated string
-            courses_str = row.get('required_courses', '')
-            required_courses = []
-            if courses_str:
-                try:
-                    # Try parsing as JSON first
-                    required_courses = json.loads(courses_str) if courses_str.startswith('[') else []
-                except:
-                    # If not JSON, try splitting by comma
-                    if courses_str:
-                        required_courses = [c.strip() for c in courses_str.split(',') if c.strip()]
-            
-            # Construct location from available fields
-            location = parse_value(row.get('location'), 'str')
-            if not location:
-                # Try to construct from city and state
-                city = parse_value(row.get('city'), 'str')
-                state = parse_value(row.get('state'), 'str')
-                if city and state:
-                    location = f"{city}, {state}"
-                elif city:
-                    location = city
-                elif state:
-                    location = state
-                else:
-                    location = "Not specified"  # Required field, use default
-            
-            # Prepare data for Supabase
-            school_data = {
-                'name': parse_value(row.get('name'), 'str'),
-                'type': parse_value(row.get('type'), 'str') or 'MD',  # Default to MD
-                'location': location,
-                'tuition': parse_value(row.get('tuition'), 'int'),
-                'avg_gpa': parse_value(row.get('avg_gpa'), 'float'),
-                'avg_mcat': parse_value(row.get('avg_mcat'), 'int'),
-                'required_courses': required_courses if required_courses else [],
-                'mission': parse_value(row.get('mission'), 'str'),
-                'deadlines': parse_value(row.get('deadlines'), 'dict'),
-                'link': parse_value(row.get('link') or row.get('website'), 'str'),
-            }
-            
-            # Skip if missing required fields (only name and type are required)
-            if not school_data['name'] or not school_data['type']:
-                print(f"Skipping {row.get('name', 'Unknown')}: Missing required fields (name or type)")
-                schools_skipped += 1
-                continue
-            
+        # Skip if missing required fields (only name and type are required)
+        if not school_data['name'] or not school_data['type']:
+            print(f"Skipping {row.get('name', 'Unknown')}: Missing required fields (name or type)")
+            counts['skipped'] += 1
+            continue
+        
+        yield school_data
+
+
+def school_fingerprint(school_data):
+    """Stable hash of a normalized school record"""
+    encoded = json.dumps(school_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def load_manifest(path):
+    """Load the name -> fingerprint manifest of earlier imports"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    """Write the manifest atomically"""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, sort_keys=True, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def iter_changed_records(records, manifest, seen, counts):
+    """Pass on only records that are new or differ from the manifest"""
+    for school_data in records:
+        name = school_data['name']
+        seen.add(name)
+        previous = manifest.get(name)
+        if previous == school_fingerprint(school_data):
+            counts['unchanged'] += 1
+            continue
+        counts['changed' if previous else 'inserted'] += 1
+        yield school_data
+
+
+def import_rows(rows, bulk=False, incremental=False, manifest_path=MANIFEST_FILE,
+                delete_missing=False, **bulk_options):
+    """Upsert scraped rows into the schools table"""
+    counts = {'imported': 0, 'skipped': 0, 'inserted': 0, 'changed': 0,
+              'unchanged': 0, 'deleted': 0}
+    records = iter_school_records(rows, counts)
+    
+    manifest = {}
+    seen = set()
+    if incremental:
+        manifest = load_manifest(manifest_path)
+        records = iter_changed_records(records, manifest, seen, counts)
+    
+    if bulk:
+        def record(succeeded, failed):
+            counts['imported'] += len(succeeded)
+            counts['skipped'] += len(failed)
+            for school_data in succeeded:
+                manifest[school_data['name']] = school_fingerprint(school_data)
+        
+        bulk_import(records, on_batch=record, **bulk_options)
+    else:
+        for school_data in records:
             try:
                 # Upsert (insert or update if exists)
-                result = supabase.table('schools').upsert(
+                result = get_supabase().table('schools').upsert(
                     school_data,
                     on_conflict='name'
                 ).execute()
                 
                 print(f"✓ Imported: {school_data['name']}")
-                schools_imported += 1
+                counts['imported'] += 1
+                manifest[school_data['name']] = school_fingerprint(school_data)
                 
             except Exception as e:
                 print(f"✗ Error importing {school_data['name']}: {e}")
-                schools_skipped += 1
+                counts['skipped'] += 1
+    
+    if incremental:
+        if delete_missing:
+            missing = [name for name in manifest if name not in seen]
+            for name in delete_schools(missing, bulk, **bulk_options):
+                del manifest[name]
+                counts['deleted'] += 1
+        save_manifest(manifest_path, manifest)
     
     print(f"\n✅ Import complete!")
-    print(f"   Imported: {schools_imported}")
-    print(f"   Skipped: {schools_skipped}")
+    print(f"   Imported: {counts['imported']}")
+    print(f"   Skipped: {counts['skipped']}")
+    if incremental:
+        print(f"   New: {counts['inserted']}, changed: {counts['changed']}, "
+              f"unchanged: {counts['unchanged']}, deleted: {counts['deleted']}")
+
+
+def delete_schools(names, bulk=False, rest_url=None, rest_path='/rest/v1', **_):
+    """Delete schools by name in chunks, returning the names actually deleted"""
+    deleted = []
+    client = None
+    if bulk and names:
+        client = PostgrestClient(rest_url or SUPABASE_URL, SUPABASE_KEY or '', rest_path=rest_path)
+    try:
+        for start in range(0, len(names), 100):
+            chunk = names[start:start + 100]
+            try:
+                if client:
+                    client.delete_in('schools', 'name', chunk)
+                else:
+                    get_supabase().table('schools').delete().in_('name', chunk).execute()
+            except Exception as e:
+                print(f"✗ Error deleting {len(chunk)} schools: {e}")
+                continue
+            for name in chunk:
+                print(f"✓ Deleted: {name}")
+            deleted.extend(chunk)
+    finally:
+        if client:
+            client.close()
+    return deleted
+
+
+def bulk_import(records, batch_size=500, in_flight=4, rest_url=None, rest_path='/rest/v1',
+                on_batch=None):
+    """
+    Upsert records in batches with a bounded number of requests in flight.
+    on_batch(succeeded, failed) is called with the rows of each finished batch.
+    """
+    base_url = rest_url or SUPABASE_URL
+    if not base_url:
+        raise ValueError("Missing Supabase credentials in .env.local. Add SUPABASE_SERVICE_ROLE_KEY for imports.")
+    
+    def report(succeeded, failed):
+        print(f"✓ Batch: {len(succeeded)} imported, {len(failed)} failed")
+        for school_data, error in failed:
+            print(f"✗ Error importing {school_data['name']}: {error}")
+        if on_batch:
+            on_batch(succeeded, failed)
+    
+    client = PostgrestClient(base_url, SUPABASE_KEY or '', max_connections=in_flight,
+                             rest_path=rest_path)
+    try:
+        result = bulk_upsert(client, 'schools', records, on_conflict='name',
+                             batch_size=batch_size, max_in_flight=in_flight,
+                             on_batch=report)
+    finally:
+        client.close()
+    print(f"   {result.requests} requests for {result.succeeded + result.failed} rows")
+    return result
 
 
 if __name__ == '__main__':
-    import_csv_to_supabase()
+    parser = argparse.ArgumentParser(description='Import scraped schools into Supabase')
+    parser.add_argument('sources', nargs='*', default=['scraped_schools.csv'],
+                        help='CSV files, JSON Lines exports (.jsonl, .jsonl.gz or a glob) or SQLite exports')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Send rows in batches instead of one request per row')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--in-flight', type=int, default=4,
+                        help='Maximum concurrent batch requests (bulk mode)')
+    parser.add_argument('--rest-url', help='PostgREST base URL (defaults to the Supabase URL)')
+    parser.add_argument('--rest-path', default='/rest/v1',
+                        help="Path of the REST API under --rest-url ('' for plain PostgREST)")
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only send new or changed schools (see --manifest)')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help='Fingerprint manifest used by --incremental')
+    parser.add_argument('--delete-missing', action='store_true',
+                        help='With --incremental, delete imported schools missing from these sources')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Merge rows of the same school under different names before importing')
+    args = parser.parse_args()
+    
+    options = {}
+    if args.bulk:
+        options = dict(bulk=True, batch_size=args.batch_size, in_flight=args.in_flight,
+                       rest_url=args.rest_url, rest_path=args.rest_path)
+    if args.incremental:
+        options.update(incremental=True, manifest_path=args.manifest,
+                       delete_missing=args.delete_missing)
+    
+    import_sources(args.sources, dedupe=args.dedupe, **options)
 
@@ -0,0 +1,93 @@
+# Per-request download budgets: size caps and content-type filtering
+from weakref import WeakKeyDictionary
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured, StopDownload
+
+# Everything the spiders can read: pages, robots.txt and (gzipped) sitemaps
+DEFAULT_CONTENT_TYPES = [
+    'text/html',
+    'application/xhtml+xml',
+    'text/plain',
+    'text/xml',
+    'application/xml',
+    'application/gzip',
+    'application/x-gzip',
+]
+
+
+class DownloadBudgetMiddleware:
+    """
+    Stops downloads that the spider could not use, or only partly.
+
+    A response whose Content-Type is not in DOWNLOAD_BUDGET_CONTENT_TYPES
+    (PDFs, videos, images...) is stopped as soon as its headers arrive and
+    reaches the spider with an empty body. Other bodies are cut off after
+    DOWNLOAD_BUDGET_MAX_BYTES, on the wire while downloading and again after
+    decompression, so neither bandwidth nor parse time depend on how large a
+    site's pages are. Requests can set their own limits with the
+    download_budget_bytes and download_content_types meta keys (None = no limit).
+    Bytes not downloaded are counted in the download_budget/bytes_saved stat.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DOWNLOAD_BUDGET_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.max_bytes = settings.getint('DOWNLOAD_BUDGET_MAX_BYTES', 2 * 1024 * 1024)
+        self.content_types = settings.getlist('DOWNLOAD_BUDGET_CONTENT_TYPES', DEFAULT_CONTENT_TYPES)
+        self.received = WeakKeyDictionary()  # request -> body bytes so far
+        crawler.signals.connect(self.headers_received, signal=signals.headers_received)
+        crawler.signals.connect(self.bytes_received, signal=signals.bytes_received)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _max_bytes(self, request):
+        return request.meta.get('download_budget_bytes', self.max_bytes)
+
+    def _allowed(self, request, content_type):
+        allowed = request.meta.get('download_content_types', self.content_types)
+        if not allowed or not content_type:
+            return True
+        content_type = content_type.split(b';')[0].strip().decode('latin-1').lower()
+        return any(content_type.startswith(prefix) for prefix in allowed)
+
+    def headers_received(self, headers, body_length, request, spider):
+        if not self._allowed(request, headers.get('Content-Type')):
+            self.crawler.stats.inc_value('download_budget/skipped')
+            if body_length and body_length > 0:
+                self.crawler.stats.inc_value('download_budget/bytes_saved', body_length)
+            raise StopDownload(fail=False)
+        self.received[request] = (0, body_length)
+
+    def bytes_received(self, data, request, spider):
+        max_bytes = self._max_bytes(request)
+        if not max_bytes or request not in self.received:
+            return
+        received, body_length = self.received[request]
+        received += len(data)
+        self.received[request] = (received, body_length)
+        if received >= max_bytes:
+            self.crawler.stats.inc_value('download_budget/truncated')
+            if body_length and body_length > received:
+                self.crawler.stats.inc_value('download_budget/bytes_saved', body_length - received)
+            raise StopDownload(fail=False)
+
+    def process_response(self, request, response, spider):
+        self.received.pop(request, None)
+        # Also applies to cached responses and to decompressed bodies
+        if response.body and not self._allowed(request, response.headers.get('Content-Type')):
+            return response.replace(body=b'')
+        max_bytes = self._max_bytes(request)
+        if max_bytes and len(response.body) > max_bytes:
+            if 'download_stopped' not in response.flags:
+                # Small on the wire, but large once decompressed
+                self.crawler.stats.inc_value('download_budget/truncated_decoded')
+            return response.replace(body=response.body[:max_bytes])
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self.received.pop(request, None)
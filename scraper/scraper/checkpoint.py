@@ -0,0 +1,283 @@
+# Resumable crawls: a compact on-disk seen-set and periodic checkpoints under JOBDIR
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+from time import time
+
+from scrapy import signals
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# Sent before a checkpoint is written; components that hold items back
+# (batching pipelines) release them, so that the checkpoint need not wait
+checkpoint_requested = object()
+
+# Sent while a checkpoint is written; handlers add their own resume state to
+# the state dict (e.g. the byte offsets of export files)
+checkpoint_saving = object()
+
+
+def load_checkpoint(jobdir):
+    """State saved by the last checkpoint of a job, or {} for a new job"""
+    if not jobdir:
+        return {}
+    path = os.path.join(jobdir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def completed_schools(settings):
+    """School URLs finished by earlier runs of the job in JOBDIR"""
+    return set(load_checkpoint(settings.get('JOBDIR')).get('completed', []))
+
+
+def completed_key(response):
+    """School URL (or request URL) an item was scraped for; also accepts errback Failures"""
+    request = getattr(response, 'request', None)
+    if request is None:
+        return None
+    return request.meta.get('school', {}).get('url') or request.url
+
+
+class BloomFilter:
+    """
+    Bloom filter over request fingerprints, in a memory-mapped file.
+
+    Sized for capacity entries at the given false-positive rate: 2 million
+    fingerprints at 1e-6 take 7 MB, a fraction of a set of the same
+    fingerprints. Without a path the bits live in anonymous memory.
+    """
+
+    MAGIC = b'BLOOM001'
+    HEADER = struct.Struct('<8sQQQ')  # magic, bits, hashes, entries
+
+    def __init__(self, path=None, capacity=2000000, error_rate=1e-6):
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        self.path = path
+        if path and os.path.exists(path):
+            with open(path, 'r+b') as f:
+                magic, bits, hashes, entries = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic != self.MAGIC:
+                    raise ValueError(f'{path} is not a Bloom filter')
+                self.mm = mmap.mmap(f.fileno(), 0)
+        else:
+            size = self.HEADER.size + (bits + 7) // 8
+            if path:
+                with open(path, 'w+b') as f:
+                    f.truncate(size)  # Sparse until bits are set
+                    self.mm = mmap.mmap(f.fileno(), 0)
+            else:
+                self.mm = mmap.mmap(-1, size)
+            entries = 0
+            self.mm[:self.HEADER.size] = self.HEADER.pack(self.MAGIC, bits, hashes, 0)
+        self.bits = bits
+        self.hashes = hashes
+        self.entries = entries
+
+    def _positions(self, fingerprint):
+        # Double hashing over the (already uniform) fingerprint bytes
+        h1 = int.from_bytes(fingerprint[:8], 'little')
+        h2 = int.from_bytes(fingerprint[8:16], 'little') | 1
+        offset = self.HEADER.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.bits
+            yield offset + (position >> 3), 1 << (position & 7)
+
+    def __contains__(self, fingerprint):
+        mm = self.mm
+        return all(mm[byte] & mask for byte, mask in self._positions(fingerprint))
+
+    def add(self, fingerprint):
+        """Add a fingerprint; returns True if it was (probably) already present"""
+        mm = self.mm
+        present = True
+        for byte, mask in self._positions(fingerprint):
+            value = mm[byte]
+            if not value & mask:
+                mm[byte] = value | mask
+                present = False
+        if not present:
+            self.entries += 1
+        return present
+
+    def flush(self):
+        self.mm[:self.HEADER.size] = self.HEADER.pack(self.MAGIC, self.bits, self.hashes, self.entries)
+        if self.path:
+            self.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.mm.close()
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """
+    Request dupefilter backed by a BloomFilter instead of a set in memory.
+
+    With JOBDIR the filter is kept in JOBDIR/requests.bloom, so a resumed
+    crawl still skips requests scheduled by earlier runs. A false positive
+    (DUPEFILTER_BLOOM_ERROR_RATE) drops an unseen request; requests made
+    with dont_filter=True are never checked.
+    """
+
+    def __init__(self, fingerprinter, path=None, capacity=2000000, error_rate=1e-6, debug=False):
+        self.fingerprinter = fingerprinter
+        self.bloom = BloomFilter(path, capacity, error_rate)
+        self.debug = debug
+        self.logdupes = True
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        jobdir = settings.get('JOBDIR')
+        path = None
+        if jobdir:
+            os.makedirs(jobdir, exist_ok=True)
+            path = os.path.join(jobdir, 'requests.bloom')
+        return cls(
+            crawler.request_fingerprinter,
+            path=path,
+            capacity=settings.getint('DUPEFILTER_BLOOM_CAPACITY', 2000000),
+            error_rate=settings.getfloat('DUPEFILTER_BLOOM_ERROR_RATE', 1e-6),
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+        )
+
+    def request_seen(self, request):
+        return self.bloom.add(self.fingerprinter.fingerprint(request))
+
+    def close(self, reason):
+        self.bloom.close()
+
+    def log(self, request, spider):
+        if self.debug:
+            logger.debug('Filtered duplicate request: %(request)s', {'request': request},
+                         extra={'spider': spider})
+        elif self.logdupes:
+            logger.debug('Filtered duplicate request: %(request)s - no more duplicates will be '
+                         'shown (see DUPEFILTER_DEBUG to show all duplicates)',
+                         {'request': request}, extra={'spider': spider})
+            self.logdupes = False
+        spider.crawler.stats.inc_value('dupefilter/filtered')
+
+
+class CrawlCheckpoint:
+    """
+    Saves the resume state of a JOBDIR crawl every CHECKPOINT_INTERVAL seconds.
+
+    JOBDIR/checkpoint.json records the schools (or request URLs) whose items
+    were scraped and, through the checkpoint_saving signal, the byte offsets
+    of the export files at that moment. On restart with the same JOBDIR the
+    exports are truncated back to those offsets and finished schools are
+    skipped, so nothing is fetched or exported twice. Scrapy's own JOBDIR
+    support keeps the pending request queue.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.jobdir = settings.get('JOBDIR')
+        if not self.jobdir:
+            raise NotConfigured
+        self.crawler = crawler
+        self.interval = settings.getfloat('CHECKPOINT_INTERVAL', 60.0)
+        self.path = os.path.join(self.jobdir, CHECKPOINT_FILE)
+        self.completed = set(load_checkpoint(self.jobdir).get('completed', []))
+        self.task = None
+        self.retry = None  # Pending retry of a checkpoint that had to wait
+        if self.completed:
+            logger.info(f'Resuming {self.jobdir}: {len(self.completed)} schools already done')
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.item_scraped, signal=signals.item_scraped)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        os.makedirs(self.jobdir, exist_ok=True)
+        self.task = task.LoopingCall(self.save)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+        if self.retry and self.retry.active():
+            self.retry.cancel()
+        # Export pipelines are closed by now and report their final offsets
+        self.save(force=True)
+
+    def item_scraped(self, item, response, spider):
+        key = completed_key(response)
+        if key:
+            self.completed.add(key)
+
+    def save(self, force=False):
+        """Write the checkpoint, unless items are still inside the pipelines"""
+        if not force:
+            self.crawler.signals.send_catch_log(checkpoint_requested)
+        scraper = getattr(self.crawler.engine, 'scraper', None)
+        slot = getattr(scraper, 'slot', None)
+        if not force and slot is not None and slot.itemproc_size:
+            # An item written to the CSV but not yet marked complete would be
+            # scraped and exported again after a restart: retry in a moment
+            if not (self.retry and self.retry.active()):
+                from twisted.internet import reactor
+                self.retry = reactor.callLater(1.0, self._retry)
+            return
+        state = {'saved_at': time(), 'completed': sorted(self.completed)}
+        self.crawler.signals.send_catch_log(checkpoint_saving, state=state)
+        try:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            logger.error(f'Could not write checkpoint {self.path}: {e}')
+            return
+        self.crawler.stats.set_value('checkpoint/completed', len(self.completed))
+        self.crawler.stats.inc_value('checkpoint/saved')
+
+    def _retry(self):
+        if self.task and self.task.running:
+            self.save()
+
+
+class StaleRequestMiddleware:
+    """
+    Drops requests of an earlier run before they are downloaded.
+
+    Spiders that tag their requests with a run id (meta['run'], or the run
+    of a focused crawl in meta['focus']) restart unfinished schools from
+    their homepage on resume, so requests restored from the JOBDIR queue
+    with another run id would only be downloaded to be discarded.
+    """
+
+    def __init__(self, crawler):
+        if not crawler.settings.get('JOBDIR'):
+            raise NotConfigured
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        current = getattr(spider, 'run_id', None)
+        run = request.meta.get('run') or request.meta.get('focus', {}).get('run')
+        if current is None or run is None or run == current:
+            return None
+        self.crawler.stats.inc_value('checkpoint/stale_requests')
+        raise IgnoreRequest('Request restored from an earlier run')
@@ -0,0 +1 @@
+# Project commands (COMMANDS_MODULE), e.g. `scrapy replay`
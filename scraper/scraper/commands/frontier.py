@@ -0,0 +1,62 @@
+# `scrapy frontier`: inspect a shared frontier and export its items
+import os
+
+import scrapy
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from scraper.frontier import Frontier
+from scraper.items import MedicalSchoolItem
+from scraper.pipelines import export_items
+
+ACTIONS = ('status', 'merge')
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return '<status|merge> [frontier]'
+
+    def short_desc(self):
+        return 'Show the progress of a shared frontier, or export its items'
+
+    def long_desc(self):
+        return (
+            'status: requests done and pending, leased hosts and live workers of '
+            'the frontier. merge: write the items stored by all workers, one per '
+            'school, through the CSV, JSON Lines and SQLite export pipelines. '
+            'The frontier defaults to the FRONTIER_PATH setting.'
+        )
+
+    def process_options(self, args, opts):
+        super().process_options(args, opts)
+        self.frontier_path = args[1] if len(args) > 1 else self.settings.get('FRONTIER_PATH')
+        # The export pipelines only run outside of frontier workers
+        self.settings.set('FRONTIER_PATH', '', priority='cmdline')
+
+    def run(self, args, opts):
+        if not args or args[0] not in ACTIONS or len(args) > 2:
+            raise UsageError()
+        if not self.frontier_path or not os.path.exists(self.frontier_path):
+            raise UsageError(f'No frontier at {self.frontier_path!r}', print_help=False)
+
+        frontier = Frontier(self.frontier_path)
+        try:
+            status = frontier.status()
+            if args[0] == 'status':
+                for name, value in status.items():
+                    print(f'{name}: {value}')
+                return
+
+            pending = status['requests'] - status['done']
+            if pending:
+                print(f'Warning: {pending} requests are not done yet')
+            spidercls = scrapy.Spider
+            if status['spider'] in self.crawler_process.spider_loader.list():
+                spidercls = self.crawler_process.spider_loader.load(status['spider'])
+            crawler = self.crawler_process.create_crawler(spidercls)
+            count = export_items(crawler, (MedicalSchoolItem(item) for item in frontier.iter_items()))
+            print(f'Exported {count} items')
+        finally:
+            frontier.close()
@@ -0,0 +1,177 @@
+# `scrapy replay`: re-run a spider's callbacks over the HTTP cache, in parallel
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.conf import arglist_to_dict
+from scrapy.utils.project import data_path
+
+from scraper.items import MedicalSchoolItem
+from scraper.pipelines import EXPORT_PIPELINES, component_path, export_items
+from scraper.replay import parse_shard
+
+JSONL_PIPELINE = 'scraper.pipelines.JsonLinesExportPipeline'
+
+
+def _read_items(path):
+    """Items of a shard's JSON Lines file, including an unfinished .tmp file"""
+    if not os.path.exists(path):
+        path += '.tmp'
+        if not os.path.exists(path):
+            return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield MedicalSchoolItem(json.loads(line))
+            except ValueError:
+                break  # Last line of a shard that was killed mid-write
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return '[options] <spider>'
+
+    def short_desc(self):
+        return 'Re-extract items from the HTTP cache without the network'
+
+    def long_desc(self):
+        return (
+            'Run a spider over the responses stored in its HTTP cache, split into '
+            'shards crawled by parallel processes, then merge their items into the '
+            'CSV, JSON Lines and SQLite exports. Requests missing from the cache '
+            'are dropped, nothing is downloaded.'
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument('-a', dest='spargs', action='append', default=[], metavar='NAME=VALUE',
+                            help='set spider argument (may be repeated)')
+        parser.add_argument('-j', '--jobs', type=int, default=0,
+                            help='worker processes (default: one per CPU core)')
+        parser.add_argument('--workdir', metavar='DIR',
+                            help='directory for shard items and logs (default: .scrapy/replay/<spider>-<time>)')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the shard files after a successful merge')
+
+    def process_options(self, args, opts):
+        super().process_options(args, opts)
+        try:
+            opts.spargs = arglist_to_dict(opts.spargs)
+        except ValueError:
+            raise UsageError('Invalid -a value, use -a NAME=VALUE', print_help=False)
+        if opts.jobs < 0:
+            raise UsageError('--jobs must be positive', print_help=False)
+        # A replay is never resumed, and must not resume the exports of a crawl
+        self.settings.set('JOBDIR', '', priority='cmdline')
+        self.settings.set('FRONTIER_PATH', '', priority='cmdline')
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+        try:
+            spidercls = self.crawler_process.spider_loader.load(args[0])
+        except KeyError:
+            raise UsageError(f'Spider not found: {args[0]}', print_help=False)
+
+        if self.settings['HTTPCACHE_STORAGE'] == 'scraper.httpcache.SqliteCacheStorage':
+            cache = os.path.join(data_path(self.settings['HTTPCACHE_DIR']), f'{spidercls.name}.sqlite')
+            if not os.path.exists(cache):
+                raise UsageError(f'No HTTP cache at {cache}: crawl with HTTPCACHE_ENABLED first',
+                                 print_help=False)
+
+        jobs = opts.jobs or os.cpu_count() or 1
+        workdir = opts.workdir or data_path(
+            os.path.join('replay', f'{spidercls.name}-{time.strftime("%Y%m%d-%H%M%S")}'))
+        os.makedirs(workdir, exist_ok=True)
+
+        started = time.monotonic()
+        shard_paths = self._run_shards(spidercls, opts, jobs, workdir)
+        if self.exitcode:
+            print(f'Exports left unchanged; shard items and logs are in {workdir}')
+            return
+
+        items = self._merge(spidercls, shard_paths)
+        print(f'Replayed {items} items in {time.monotonic() - started:.1f}s with {jobs} processes')
+        if not opts.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _shard_pipelines(self):
+        """ITEM_PIPELINES of a shard: the export files are written by the merge"""
+        pipelines = {
+            component_path(component): priority
+            for component, priority in self.settings.getwithbase('ITEM_PIPELINES').items()
+            if priority is not None
+        }
+        for path in EXPORT_PIPELINES:
+            if path != JSONL_PIPELINE:
+                pipelines.pop(path, None)
+        pipelines.setdefault(JSONL_PIPELINE, 301)
+        return pipelines
+
+    def _shard_settings(self, shard, workdir):
+        index, count = parse_shard(shard)
+        name = os.path.join(workdir, f'shard-{index:03d}')
+        return {
+            'REPLAY_SHARD': shard,
+            # Every response comes from the cache, as stored, however old
+            'HTTPCACHE_ENABLED': '1',
+            'HTTPCACHE_POLICY': 'scrapy.extensions.httpcache.DummyPolicy',
+            'HTTPCACHE_IGNORE_MISSING': '1',
+            'HTTPCACHE_SQLITE_READ_ONLY': '1',
+            'ROBOTSTXT_OBEY': '0',
+            'DNS_RESOLVER': 'scrapy.resolver.CachingThreadedResolver',
+            'DOWNLOAD_DELAY': '0',
+            'AUTOTHROTTLE_ENABLED': '0',
+            'HOST_THROTTLE_ENABLED': '0',
+            # The shards are the worker processes
+            'EXTRACTION_POOL_ENABLED': '0',
+            'JOBDIR': '',
+            'FRONTIER_PATH': '',
+            'ITEM_PIPELINES': json.dumps(self._shard_pipelines()),
+            'JSONL_EXPORT_PATH': f'{name}.jsonl',
+            'JSONL_EXPORT_GZIP': '0',
+            'JSONL_EXPORT_MAX_BYTES': '0',
+            'TELEMETRY_FILE': f'{name}.prom',
+            'LOG_FILE': f'{name}.log',
+            'LOG_LEVEL': self.settings['LOG_LEVEL'],
+        }
+
+    def _run_shards(self, spidercls, opts, jobs, workdir):
+        """Crawl the shards in parallel processes; returns their JSON Lines paths"""
+        processes = []
+        for index in range(jobs):
+            shard_settings = self._shard_settings(f'{index}/{jobs}', workdir)
+            command = [sys.executable, '-m', 'scrapy', 'crawl', spidercls.name]
+            for name, value in opts.spargs.items():
+                command += ['-a', f'{name}={value}']
+            # The shard settings win over the command line of the replay
+            for setting in opts.set:
+                command += ['-s', setting]
+            for name, value in shard_settings.items():
+                command += ['-s', f'{name}={value}']
+            processes.append((subprocess.Popen(command), shard_settings, time.monotonic()))
+
+        paths = []
+        for index, (process, shard_settings, started) in enumerate(processes):
+            status = process.wait()
+            elapsed = time.monotonic() - started
+            if status:
+                self.exitcode = 1
+                print(f'Shard {index}/{jobs} failed with exit status {status} after {elapsed:.1f}s, '
+                      f'see {shard_settings["LOG_FILE"]}')
+            else:
+                print(f'Shard {index}/{jobs} finished in {elapsed:.1f}s')
+            paths.append(shard_settings['JSONL_EXPORT_PATH'])
+        return paths
+
+    def _merge(self, spidercls, paths):
+        """Feed the shard items through the enabled export pipelines; returns the item count"""
+        crawler = self.crawler_process.create_crawler(spidercls)
+        return export_items(crawler, (item for path in paths for item in _read_items(path)))
@@ -0,0 +1,251 @@
+# Entity resolution: merge the records of one school scraped under different names
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from scraper.linkscore import site_key
+
+# Words that say what kind of institution a name is, not which one
+GENERIC_TOKENS = frozenset({
+    'the', 'of', 'and', 'at', 'in', 'for', 'school', 'college', 'university',
+    'medicine', 'medical', 'osteopathic', 'osteopathy', 'allopathic', 'human',
+    'health', 'science', 'sciences', 'center', 'centre', 'campus', 'program',
+    'institute', 'faculty', 'graduate', 'department', 'md', 'do',
+})
+
+# Abbreviations expanded before comparing names
+TOKEN_ALIASES = {
+    'univ': 'university',
+    'u': 'university',
+    'coll': 'college',
+    'sch': 'school',
+    'med': 'medical',
+    'ctr': 'center',
+    'hlth': 'health',
+    'sci': 'sciences',
+    'st': 'saint',
+    'mt': 'mount',
+    'ft': 'fort',
+}
+
+US_STATES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA',
+    'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE', 'district of columbia': 'DC',
+    'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL',
+    'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
+    'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI',
+    'minnesota': 'MN', 'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT',
+    'nebraska': 'NE', 'nevada': 'NV', 'new hampshire': 'NH', 'new jersey': 'NJ',
+    'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC', 'north dakota': 'ND',
+    'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA',
+    'puerto rico': 'PR', 'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD',
+    'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA',
+    'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+}
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+HOST_RE = re.compile(r'^https?://([^/?#:]+)', re.IGNORECASE)
+
+
+def name_tokens(name):
+    """Distinctive tokens of a school name ('Harvard Medical School' -> {'harvard'})"""
+    text = (name or '').lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    tokens = {TOKEN_ALIASES.get(token, token) for token in WORD_RE.findall(text)}
+    return frozenset(tokens - GENERIC_TOKENS)
+
+
+def normalize_state(state):
+    state = (state or '').strip()
+    if len(state) == 2:
+        return state.upper()
+    return US_STATES.get(state.lower(), state.lower())
+
+
+def school_type(record):
+    """MD/DO of a record; 'designation' is the MSAR spider's name for type"""
+    if 'osteopath' in (record.get('name') or '').lower():
+        return 'DO'
+    return (record.get('type') or record.get('designation') or '').strip().upper()
+
+
+def school_domain(record):
+    match = HOST_RE.match(record.get('website') or record.get('link') or '')
+    return _host_domain(match.group(1).lower()) if match else ''
+
+
+@lru_cache(maxsize=65536)
+def _host_domain(host):
+    return site_key(f'http://{host}/')
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # Path halving
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        """Merge the sets of i and j; returns the root of the merged set"""
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            # Keep the earliest record as the root so cluster order is stable
+            self.parent[max(i, j)] = min(i, j)
+        return min(i, j)
+
+
+class _Key:
+    """Comparison key of one record"""
+    __slots__ = ('tokens', 'type', 'state', 'domain')
+
+    def __init__(self, record, tokens):
+        self.tokens = tokens
+        self.type = school_type(record)
+        self.state = normalize_state(record.get('state'))
+        self.domain = school_domain(record)
+
+
+def same_school(a, b, threshold):
+    """Whether two record keys describe the same school"""
+    if a.type and b.type and a.type != b.type:
+        return False
+    if a.state and b.state and a.state != b.state:
+        return False
+    if not a.tokens or not b.tokens:
+        return False
+    shared = len(a.tokens & b.tokens)
+    if a.domain and a.domain == b.domain and shared:
+        return True
+    return shared / len(a.tokens | b.tokens) >= threshold
+
+
+def blocking_keys(key, frequency, threshold):
+    """
+    Keys of the blocks a record is compared within.
+
+    Two token sets with Jaccard similarity >= threshold must share one of
+    their rarest len - ceil(threshold * len) + 1 tokens (prefix filtering),
+    so only those tokens are used as blocks, plus the record's domain.
+    """
+    tokens = sorted(key.tokens, key=lambda token: (frequency[token], token))
+    prefix = len(tokens) - math.ceil(threshold * len(tokens)) + 1
+    keys = [('token', token) for token in tokens[:prefix]]
+    if key.domain:
+        keys.append(('domain', key.domain))
+    return keys
+
+
+def _empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+def _completeness(record):
+    return sum(1 for value in record.values() if not _empty(value))
+
+
+def best_value(values):
+    """Best of a field's non-empty values, given in order of record completeness"""
+    if all(isinstance(value, list) for value in values):
+        merged = []
+        for value in values:
+            merged.extend(v for v in value if v not in merged)
+        return merged
+    if all(isinstance(value, dict) for value in values):
+        merged = {}
+        for value in reversed(values):
+            merged.update(value)  # The most complete record wins conflicts
+        return merged
+    hashable = [value if isinstance(value, (str, int, float)) else repr(value) for value in values]
+    counts = Counter(hashable)
+    # Most common value; ties go to the most complete record
+    best = max(range(len(values)), key=lambda i: (counts[hashable[i]], -i))
+    return values[best]
+
+
+def merge_records(records):
+    """Canonical record of a cluster: the best value of every field"""
+    if len(records) == 1:
+        return records[0]
+    ranked = sorted(records, key=_completeness, reverse=True)
+    merged = {}
+    for record in ranked:
+        for field in record:
+            if field in merged:
+                continue
+            values = [r[field] for r in ranked if field in r and not _empty(r[field])]
+            merged[field] = best_value(values) if values else record[field]
+    if _empty(merged.get('type')) and not _empty(merged.get('designation')):
+        merged['type'] = merged['designation']
+    return merged
+
+
+def resolve(records, threshold=0.75, max_block=200):
+    """
+    Merge records of the same school and return one record per school.
+
+    Records with the same name tokens, type, state and domain are merged
+    outright, and only these distinct keys are compared, within blocks of a
+    rare name token or a shared website domain. The work therefore grows
+    with the number of distinct spellings, not with how many times each
+    school was scraped. A cluster never holds two states or two types, even
+    through records that leave them blank. Blocks of more than max_block distinct keys (a
+    token like 'california', or a directory site linked from every record)
+    carry no identifying signal and are skipped.
+    """
+    records = list(records)
+    names = {}  # The same name usually arrives from several sources
+    keys = []  # Distinct comparison keys
+    key_ids = {}
+    record_keys = []  # Index in keys of each record
+    for record in records:
+        name = record.get('name') or ''
+        tokens = names.get(name)
+        if tokens is None:
+            tokens = names[name] = name_tokens(name)
+        key = _Key(record, tokens)
+        if tokens:
+            identity = (tokens, key.type, key.state, key.domain)
+            index = key_ids.setdefault(identity, len(keys))
+        else:
+            index = len(keys)  # A record without a name matches nothing, not even its twin
+        if index == len(keys):
+            keys.append(key)
+        record_keys.append(index)
+    frequency = Counter(token for key in keys for token in key.tokens)
+
+    blocks = defaultdict(list)
+    for i, key in enumerate(keys):
+        for block in blocking_keys(key, frequency, threshold):
+            blocks[block].append(i)
+
+    clusters = UnionFind(len(keys))
+    # States and types of each cluster, by root: a record without a state
+    # must not bridge two schools of different states (or types)
+    states = [{key.state} - {''} for key in keys]
+    types = [{key.type} - {''} for key in keys]
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > max_block:
+            continue
+        for n, i in enumerate(members):
+            for j in members[n + 1:]:
+                a, b = clusters.find(i), clusters.find(j)
+                if a == b or not same_school(keys[i], keys[j], threshold):
+                    continue
+                if len(states[a] | states[b]) > 1 or len(types[a] | types[b]) > 1:
+                    continue
+                root = clusters.union(a, b)
+                states[root] = states[a] | states[b]
+                types[root] = types[a] | types[b]
+
+    groups = defaultdict(list)
+    for record, index in zip(records, record_keys):
+        groups[clusters.find(index)].append(record)
+    return [merge_records(group) for group in groups.values()]
@@ -0,0 +1,393 @@
+# Shared crawl frontier: worker processes split the requests by host
+import json
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+from time import time
+from urllib.parse import urlparse
+
+from itemadapter import ItemAdapter
+from scrapy import Request, signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest, NotConfigured
+from scrapy.utils.request import request_from_dict
+from twisted.internet import task
+
+from scraper.checkpoint import completed_key
+
+logger = logging.getLogger(__name__)
+
+
+def request_host(url):
+    """Lease unit of a URL: its hostname, the key of Scrapy's download slots"""
+    return (urlparse(url).hostname or '').lower()
+
+
+class Frontier:
+    """
+    Start requests, host leases and scraped items of a crawl shared by
+    several worker processes, in one SQLite file.
+
+    Requests are grouped by host and leased a whole host at a time, so two
+    workers never crawl the same host at once. A worker renews its leases
+    while it works; the hosts of a worker that stops renewing are leased by
+    another one once lease_expires has passed, and their requests that were
+    not done are crawled again. Items are stored under their school URL and
+    the first one stored wins, so a school crawled twice is kept once.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS requests (
+            url TEXT PRIMARY KEY,
+            host TEXT NOT NULL,
+            data BLOB NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_requests_host ON requests (host, done);
+        CREATE TABLE IF NOT EXISTS hosts (
+            host TEXT PRIMARY KEY,
+            pending INTEGER NOT NULL,
+            worker TEXT,
+            lease_expires REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_hosts_pending ON hosts (pending, lease_expires);
+        CREATE TABLE IF NOT EXISTS items (
+            key TEXT PRIMARY KEY,
+            worker TEXT NOT NULL,
+            scraped_at REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS info (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path, wal=True, timeout=30.0):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Waits up to timeout seconds for the write lock of another worker
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        if wal:
+            self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(self.SCHEMA)
+
+    def close(self):
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    def _write(self, statements):
+        """Run statements(db) in one write transaction, taking the lock up front"""
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(self.db)
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+        return result
+
+    def get_info(self, name):
+        row = self.db.execute('SELECT value FROM info WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, name, value):
+        self.db.execute('INSERT OR REPLACE INTO info (name, value) VALUES (?, ?)', (name, value))
+
+    def add(self, entries):
+        """Add (url, host, data) requests, skipping known URLs; returns how many were new"""
+        entries = list(entries)
+
+        def statements(db):
+            before = db.total_changes
+            db.executemany(
+                'INSERT OR IGNORE INTO requests (url, host, data) VALUES (?, ?, ?)', entries
+            )
+            added = db.total_changes - before
+            hosts = sorted({host for _, host, _ in entries})
+            marks = ', '.join('?' for _ in hosts)
+            db.execute(
+                f'INSERT INTO hosts (host, pending) SELECT host, COUNT(*) FROM requests'
+                f' WHERE done = 0 AND host IN ({marks}) GROUP BY host'
+                f' ON CONFLICT (host) DO UPDATE SET pending = excluded.pending',
+                hosts,
+            )
+            return added
+
+        return self._write(statements) if entries else 0
+
+    def lease(self, worker, count, ttl):
+        """Lease up to count free hosts; returns {host: [(url, data), ...]} of their pending requests"""
+        now = time()
+
+        def statements(db):
+            hosts = [row[0] for row in db.execute(
+                'SELECT host FROM hosts WHERE pending > 0 AND lease_expires < ? LIMIT ?', (now, count)
+            )]
+            if not hosts:
+                return {}
+            db.executemany(
+                'UPDATE hosts SET worker = ?, lease_expires = ? WHERE host = ?',
+                [(worker, now + ttl, host) for host in hosts],
+            )
+            marks = ', '.join('?' for _ in hosts)
+            leased = {host: [] for host in hosts}
+            for host, url, data in db.execute(
+                f'SELECT host, url, data FROM requests WHERE done = 0 AND host IN ({marks})', hosts
+            ):
+                leased[host].append((url, data))
+            return leased
+
+        return self._write(statements)
+
+    def renew(self, worker, ttl):
+        """Extend the worker's leases; returns the hosts it still holds"""
+        self.db.execute('UPDATE hosts SET lease_expires = ? WHERE worker = ?', (time() + ttl, worker))
+        return {row[0] for row in self.db.execute('SELECT host FROM hosts WHERE worker = ?', (worker,))}
+
+    def release(self, worker, hosts):
+        """Give up leases, e.g. of finished hosts or on shutdown"""
+        self.db.executemany(
+            'UPDATE hosts SET worker = NULL, lease_expires = 0 WHERE host = ? AND worker = ?',
+            [(host, worker) for host in hosts],
+        )
+
+    def complete(self, urls):
+        """Mark requests done so that they are never leased again"""
+        def statements(db):
+            for url in urls:
+                changed = db.execute(
+                    'UPDATE requests SET done = 1 WHERE url = ? AND done = 0', (url,)
+                ).rowcount
+                if changed:
+                    db.execute(
+                        'UPDATE hosts SET pending = pending - 1 WHERE host = ?', (request_host(url),)
+                    )
+
+        self._write(statements)
+
+    def store_item(self, key, worker, item):
+        """Store an item unless one was already stored for key; returns whether it was"""
+        return self.db.execute(
+            'INSERT OR IGNORE INTO items (key, worker, scraped_at, data) VALUES (?, ?, ?, ?)',
+            (key, worker, time(), json.dumps(ItemAdapter(item).asdict(), ensure_ascii=False)),
+        ).rowcount > 0
+
+    def remaining(self):
+        """Requests not done yet, including those leased by other workers"""
+        return self.db.execute('SELECT COALESCE(SUM(pending), 0) FROM hosts').fetchone()[0]
+
+    def status(self):
+        now = time()
+        requests, done = self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(done), 0) FROM requests'
+        ).fetchone()
+        hosts, leased, workers = self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(lease_expires >= ?), 0),'
+            ' COUNT(DISTINCT CASE WHEN lease_expires >= ? THEN worker END) FROM hosts',
+            (now, now),
+        ).fetchone()
+        items = self.db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        return {
+            'spider': self.get_info('spider'),
+            'requests': requests,
+            'done': done,
+            'hosts': hosts,
+            'leased_hosts': leased,
+            'workers': workers,
+            'items': items,
+        }
+
+    def iter_items(self):
+        """Stored items as dicts, in the order they were scraped"""
+        for (data,) in self.db.execute('SELECT data FROM items ORDER BY rowid'):
+            yield json.loads(data)
+
+
+class FrontierMiddleware:
+    """
+    Makes a crawl one worker of a crawl shared through the FRONTIER_PATH file.
+
+    The spider's start requests are added to the frontier (by the first
+    worker; later ones find it seeded and skip start_requests()). Each worker
+    then leases up to FRONTIER_HOSTS hosts at a time and crawls their
+    requests, leasing more as schools are scraped and whenever the spider
+    goes idle. Leases last FRONTIER_LEASE_TTL seconds and are renewed every
+    third of that. Items are stored in the frontier rather than in the
+    export files; `scrapy frontier merge` writes those once all is done.
+    Requests yielded by callbacks stay with the worker when it holds the host
+    of their school (a focused crawl's subpages, a listing's next page);
+    the others are added to the frontier and crawled by whichever worker
+    leases their host. A worker stops when no requests are left, or keeps
+    waiting while other workers hold some, in case one of them dies.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        path = settings.get('FRONTIER_PATH')
+        if not path:
+            raise NotConfigured
+        self.crawler = crawler
+        self.frontier = Frontier(path, wal=settings.getbool('FRONTIER_WAL', True))
+        spider_name = self.frontier.get_info('spider')
+        if spider_name and spider_name != crawler.spidercls.name:
+            raise ValueError(f'{path} is the frontier of the {spider_name} spider')
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.ttl = settings.getfloat('FRONTIER_LEASE_TTL', 300.0)
+        self.max_hosts = settings.getint('FRONTIER_HOSTS') or settings.getint('CONCURRENT_REQUESTS')
+        self.held = {}  # host -> URLs of its leased requests not done yet
+        self.spider = None
+        self.heartbeat = None
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(self.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        self.heartbeat = task.LoopingCall(self.renew)
+        self.heartbeat.start(self.ttl / 3, now=False)
+        logger.info(f'Worker {self.worker} joined frontier {self.frontier.path}')
+
+    def spider_closed(self, spider, reason):
+        if self.heartbeat and self.heartbeat.running:
+            self.heartbeat.stop()
+        # Requests not done are leased by other workers (or this one, restarted)
+        self.frontier.release(self.worker, list(self.held))
+        self.held.clear()
+        self.frontier.close()
+
+    def process_start_requests(self, start_requests, spider):
+        if self.frontier.get_info('seeded'):
+            return
+        added = 0
+        batch = []
+        for request in start_requests:
+            if not isinstance(request, Request):
+                yield request
+                continue
+            batch.append(self._entry(request, spider))
+            if len(batch) >= 1000:
+                added += self.frontier.add(batch)
+                batch = []
+        added += self.frontier.add(batch)
+        self.frontier.set_info('spider', spider.name)
+        self.frontier.set_info('seeded', str(time()))
+        self.crawler.stats.set_value('frontier/seeded', added)
+        logger.info(f'Seeded frontier {self.frontier.path} with {added} requests')
+
+    def process_spider_output(self, response, result, spider):
+        # Requests for hosts leased by another worker (or by none) go through
+        # the frontier, so that only the worker holding a host crawls it
+        entries = []
+        for request in result:
+            if isinstance(request, Request) and request_host(self._school_url(request)) not in self.held:
+                try:
+                    entries.append(self._entry(request, spider))
+                    continue
+                except (ValueError, TypeError, pickle.PicklingError):
+                    pass  # Callback not a spider method, or meta not picklable: crawl it here
+            yield request
+        if entries:
+            added = self.frontier.add(entries)
+            self.crawler.stats.inc_value('frontier/shared', added)
+            self.lease()
+
+    @staticmethod
+    def _school_url(request):
+        # Like completed_key: a school's subpages belong to the host of its URL
+        return request.meta.get('school', {}).get('url') or request.url
+
+    def _entry(self, request, spider):
+        data = request.to_dict(spider=spider)
+        # The run id ties a request to the process that made it (see
+        # SchoolWebsitesSpider._stale); a frontier request belongs to
+        # whichever worker leases it
+        data['meta'] = {key: value for key, value in data['meta'].items() if key != 'run'}
+        return request.url, request_host(request.url), pickle.dumps(data, protocol=4)
+
+    def lease(self):
+        """Top the leased hosts up to max_hosts and schedule their requests; returns how many"""
+        count = self.max_hosts - len(self.held)
+        if count <= 0:
+            return 0
+        scheduled = 0
+        for host, entries in self.frontier.lease(self.worker, count, self.ttl).items():
+            self.held[host] = {url for url, _ in entries}
+            for url, data in entries:
+                request = request_from_dict(pickle.loads(data), spider=self.spider)
+                if request.errback is None:
+                    request = request.replace(errback=self.request_failed)
+                self.crawler.engine.crawl(request)
+                scheduled += 1
+            self.crawler.stats.inc_value('frontier/hosts_leased')
+        self.crawler.stats.inc_value('frontier/requests_leased', scheduled)
+        return scheduled
+
+    def renew(self):
+        held = self.frontier.renew(self.worker, self.ttl)
+        for host in set(self.held) - held:
+            # Expired while the reactor was busy and leased by another worker
+            logger.warning(f'Lost the lease of {host}')
+            self.crawler.stats.inc_value('frontier/leases_lost')
+            del self.held[host]
+
+    def complete(self, urls):
+        """Mark leased requests done and release hosts with nothing left"""
+        done = []
+        finished = []
+        for url in urls:
+            host = request_host(url)
+            pending = self.held.get(host)
+            if pending is None or url not in pending:
+                continue
+            pending.discard(url)
+            done.append(url)
+            if not pending:
+                del self.held[host]
+                finished.append(host)
+        if done:
+            self.frontier.complete(done)
+            self.frontier.release(self.worker, finished)
+            self.crawler.stats.inc_value('frontier/done', len(done))
+
+    def item_scraped(self, item, response, spider):
+        key = completed_key(response)
+        if key is None:
+            return
+        if self.frontier.store_item(key, self.worker, item):
+            self.crawler.stats.inc_value('frontier/items')
+        else:
+            self.crawler.stats.inc_value('frontier/duplicate_items')
+        self.complete([key])
+        self.lease()
+
+    def request_failed(self, failure):
+        """Errback of leased requests: a school that cannot be fetched is done too"""
+        request = failure.request
+        if not failure.check(IgnoreRequest):
+            logger.error(f'Error downloading {request}: {failure.getErrorMessage()}')
+        self.crawler.stats.inc_value('frontier/failed')
+        # Keyed like items, so a school that failed after a redirect still counts
+        self.complete([completed_key(failure)])
+        self.lease()
+
+    def spider_idle(self, spider):
+        # Nothing is in progress, so whatever is still leased has been
+        # crawled, without an item (e.g. a listing page or a callback error)
+        self.complete([url for pending in list(self.held.values()) for url in pending])
+        if self.lease():
+            raise DontCloseSpider
+        if self.frontier.remaining():
+            # Held by other workers: take them over if their leases expire
+            raise DontCloseSpider
@@ -0,0 +1,212 @@
+# Persistent robots.txt and DNS cache shared by every run of the crawler
+import os
+import sqlite3
+from collections import deque
+from time import time
+
+from scrapy import Request, signals
+from scrapy.downloadermiddlewares.robotstxt import RobotsTxtMiddleware
+from scrapy.resolver import CachingThreadedResolver, dnscache
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.project import data_path
+from twisted.internet import defer
+
+# Sent by spiders for URLs they are about to request, so their host's
+# robots.txt and address can be looked up while other downloads run
+prefetch_host = object()
+
+
+class HostCache:
+    """
+    robots.txt bodies and resolved addresses in one SQLite file, with expiry.
+
+    Every entry carries its own expiry time; expired entries are treated as
+    missing and purged when the file is opened. The file lives in the project
+    data directory (.scrapy/ by default) so it outlasts a single crawl.
+    """
+
+    def __init__(self, path):
+        self.path = data_path(path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS robots ('
+            ' netloc TEXT PRIMARY KEY,'
+            ' status INTEGER NOT NULL,'
+            ' body BLOB NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS addresses ('
+            ' host TEXT PRIMARY KEY,'
+            ' address TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        now = time()
+        self.db.execute('DELETE FROM robots WHERE expires_at < ?', (now,))
+        self.db.execute('DELETE FROM addresses WHERE expires_at < ?', (now,))
+
+    def robots(self, netloc):
+        """(status, body) of a cached robots.txt, or None"""
+        return self.db.execute(
+            'SELECT status, body FROM robots WHERE netloc = ? AND expires_at >= ?',
+            (netloc, time()),
+        ).fetchone()
+
+    def store_robots(self, netloc, status, body, ttl):
+        self.db.execute(
+            'INSERT OR REPLACE INTO robots (netloc, status, body, expires_at) VALUES (?, ?, ?, ?)',
+            (netloc, status, body, time() + ttl),
+        )
+
+    def address(self, host):
+        """(address, expires_at) of a cached lookup, or None"""
+        return self.db.execute(
+            'SELECT address, expires_at FROM addresses WHERE host = ? AND expires_at >= ?',
+            (host, time()),
+        ).fetchone()
+
+    def store_address(self, host, address, ttl):
+        self.db.execute(
+            'INSERT OR REPLACE INTO addresses (host, address, expires_at) VALUES (?, ?, ?)',
+            (host, address, time() + ttl),
+        )
+
+    def close(self):
+        if self.db:
+            self.db.close()
+            self.db = None
+
+
+class CachedRobotsTxtMiddleware(RobotsTxtMiddleware):
+    """
+    RobotsTxtMiddleware that reuses robots.txt rules across runs.
+
+    Rules fetched within HOSTCACHE_ROBOTS_TTL seconds (24 hours by default,
+    the longest RFC 9309 recommends) are read from the host cache instead of
+    being downloaded again. A 4xx answer means "allow everything", in the
+    run that fetched it and in the runs reading it from the cache; 5xx
+    answers and network errors are not cached, so they are retried next
+    run. Hosts announced with the prefetch_host signal get their robots.txt
+    (and with it their DNS lookup) fetched ahead of their first request, at
+    most HOSTCACHE_PREFETCH_CONCURRENCY at a time.
+
+    This overrides internals of Scrapy's middleware (robot_parser,
+    _parse_robots, _parsers, _parserimpl) that later releases changed, which
+    is why requirements.txt caps the Scrapy version.
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        settings = crawler.settings
+        self.cache = HostCache(settings.get('HOSTCACHE_PATH', 'hostcache.sqlite'))
+        self.ttl = settings.getfloat('HOSTCACHE_ROBOTS_TTL', 86400.0)
+        self.prefetch_concurrency = settings.getint('HOSTCACHE_PREFETCH_CONCURRENCY', 16)
+        self.upcoming = deque()
+        self.prefetching = 0
+        crawler.signals.connect(self.prefetch, signal=prefetch_host)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    def robot_parser(self, request, spider):
+        netloc = urlparse_cached(request).netloc
+        if netloc not in self._parsers:
+            cached = self.cache.robots(netloc)
+            if cached is not None:
+                self._parsers[netloc] = self._parserimpl.from_crawler(self.crawler, cached[1])
+                self.crawler.stats.inc_value('hostcache/robots_hit')
+            else:
+                self.crawler.stats.inc_value('hostcache/robots_miss')
+        return super().robot_parser(request, spider)
+
+    def _parse_robots(self, response, netloc, spider):
+        if 400 <= response.status < 500:
+            # 4xx means there are no rules (RFC 9309), whatever the error page says
+            response = response.replace(body=b'')
+        if response.status < 500:
+            self.cache.store_robots(netloc, response.status, response.body, self.ttl)
+        return super()._parse_robots(response, netloc, spider)
+
+    def prefetch(self, url):
+        self.upcoming.append(url)
+        self._prefetch_next()
+
+    def _prefetch_next(self):
+        from twisted.internet import reactor
+        while self.upcoming and self.prefetching < self.prefetch_concurrency:
+            url = self.upcoming.popleft()
+            request = Request(url)
+            parsed = urlparse_cached(request)
+            if not parsed.hostname:
+                continue
+            if parsed.netloc in self._parsers or self.cache.robots(parsed.netloc):
+                # Rules are known: only warm the resolver
+                d = reactor.resolve(parsed.hostname)
+            else:
+                d = defer.maybeDeferred(self.robot_parser, request, self.crawler.spider)
+            self.prefetching += 1
+            self.crawler.stats.inc_value('hostcache/prefetch')
+            d.addErrback(lambda failure: None)
+            d.addBoth(self._prefetched)
+
+    def _prefetched(self, result):
+        self.prefetching -= 1
+        self._prefetch_next()
+
+    def spider_closed(self, spider):
+        self.upcoming.clear()
+        self.cache.close()
+
+
+class PersistentCachingResolver(CachingThreadedResolver):
+    """
+    Scrapy's caching resolver, backed by the host cache between runs.
+
+    The threaded resolver cannot see record TTLs, so every address is kept
+    for HOSTCACHE_DNS_TTL seconds, in memory and on disk. Only successful
+    lookups are cached.
+    """
+
+    def __init__(self, reactor, cache_size, timeout, path, ttl):
+        super().__init__(reactor, cache_size, timeout)
+        self.cache = HostCache(path)
+        self.ttl = ttl
+        self.expires = {}  # host -> expiry of its entry in dnscache
+        reactor.addSystemEventTrigger('before', 'shutdown', self.cache.close)
+
+    @classmethod
+    def from_crawler(cls, crawler, reactor):
+        # Built from the CrawlerProcess, which only provides the settings
+        settings = crawler.settings
+        cache_size = settings.getint('DNSCACHE_SIZE') if settings.getbool('DNSCACHE_ENABLED') else 0
+        return cls(
+            reactor,
+            cache_size,
+            settings.getfloat('DNS_TIMEOUT'),
+            settings.get('HOSTCACHE_PATH', 'hostcache.sqlite'),
+            settings.getfloat('HOSTCACHE_DNS_TTL', 3600.0),
+        )
+
+    def getHostByName(self, name, timeout=()):
+        if name in dnscache:
+            if self.expires.get(name, 0) >= time():
+                return defer.succeed(dnscache[name])
+            del dnscache[name]
+        cached = self.cache.address(name) if self.cache.db else None
+        if cached is not None:
+            address, expires_at = cached
+            if dnscache.limit:
+                dnscache[name] = address
+                self.expires[name] = expires_at
+            return defer.succeed(address)
+        d = super().getHostByName(name, timeout)
+        d.addCallback(self._store_result, name)
+        return d
+
+    def _store_result(self, address, name):
+        if self.cache.db:
+            self.cache.store_address(name, address, self.ttl)
+        self.expires[name] = time() + self.ttl
+        return address
+
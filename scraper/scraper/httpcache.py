@@ -0,0 +1,141 @@
+# HTTP cache storage backed by a single SQLite file
+import os
+import pickle
+import sqlite3
+import zlib
+from time import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+
+class SqliteCacheStorage:
+    """
+    Stores cached responses zlib-compressed in one SQLite database per spider.
+
+    The cache is bounded by HTTPCACHE_SQLITE_MAX_BYTES (compressed size):
+    when it grows past that, the least recently used entries are evicted.
+    Pair it with RFC2616Policy so stale entries are revalidated with
+    If-None-Match / If-Modified-Since instead of being downloaded again.
+
+    With HTTPCACHE_SQLITE_READ_ONLY the database is only read (no access
+    times, stores or evictions), so several processes can share it, as the
+    shards of ``scrapy replay`` do.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_SQLITE_MAX_BYTES')
+        self.compression_level = settings.getint('HTTPCACHE_SQLITE_COMPRESSION_LEVEL', 6)
+        self.read_only = settings.getbool('HTTPCACHE_SQLITE_READ_ONLY')
+        self.db = None
+        self.total_bytes = 0
+        self._fingerprinter = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f'{spider.name}.sqlite')
+        if self.read_only:
+            self.db = sqlite3.connect(f'file:{path}?mode=ro', uri=True, isolation_level=None)
+            self._fingerprinter = spider.crawler.request_fingerprinter
+            spider.logger.debug(f'Reading SQLite cache storage in {path}')
+            return
+        self.db = sqlite3.connect(path, isolation_level=None)
+        # Lets evictions give pages back to the filesystem (new databases only)
+        self.db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' fingerprint BLOB PRIMARY KEY,'
+            ' url TEXT NOT NULL,'
+            ' stored_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' data BLOB NOT NULL)'
+        )
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)'
+        )
+        self.total_bytes = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        spider.logger.debug(f'Using SQLite cache storage in {path}')
+
+    def close_spider(self, spider):
+        if self.db:
+            if not self.read_only:
+                self._evict()
+            self.db.close()
+            self.db = None
+
+    def retrieve_response(self, spider, request):
+        key = self._fingerprinter.fingerprint(request)
+        row = self.db.execute(
+            'SELECT stored_at, data FROM responses WHERE fingerprint = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        stored_at, blob = row
+        if 0 < self.expiration_secs < time() - stored_at:
+            return None
+        if not self.read_only:
+            self.db.execute(
+                'UPDATE responses SET accessed_at = ? WHERE fingerprint = ?', (time(), key)
+            )
+
+        data = pickle.loads(zlib.decompress(blob))
+        url = data['url']
+        status = data['status']
+        headers = Headers(data['headers'])
+        body = data['body']
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        if self.read_only:
+            return
+        key = self._fingerprinter.fingerprint(request)
+        data = {
+            'status': response.status,
+            'url': response.url,
+            'headers': dict(response.headers),
+            'body': response.body,
+        }
+        blob = zlib.compress(pickle.dumps(data, protocol=4), self.compression_level)
+        now = time()
+
+        old = self.db.execute(
+            'SELECT size FROM responses WHERE fingerprint = ?', (key,)
+        ).fetchone()
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses'
+            ' (fingerprint, url, stored_at, accessed_at, size, data)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (key, response.url, now, now, len(blob), blob),
+        )
+        self.total_bytes += len(blob) - (old[0] if old else 0)
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit"""
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return
+        target = self.total_bytes - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in self.db.execute(
+            'SELECT fingerprint, size FROM responses ORDER BY accessed_at'
+        ):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self.db.execute('BEGIN')
+        self.db.executemany('DELETE FROM responses WHERE fingerprint = ?', victims)
+        self.db.execute('COMMIT')
+        self.db.execute('PRAGMA incremental_vacuum')
+        self.total_bytes -= freed
@@ -0,0 +1,82 @@
+# Scoring of candidate subpages for focused crawling
+import heapq
+import re
+from urllib.parse import urlparse
+
+from scraper.matchers import KeywordAutomaton
+
+
+# Words in a link's URL or anchor text that point at the pages holding
+# tuition, MCAT/GPA, class profile and deadline data (and ones that don't)
+LINK_WEIGHTS = {
+    'tuition': 6,
+    'cost of attendance': 6,
+    'class profile': 6,
+    'entering class': 5,
+    'admission': 5,
+    'requirement': 5,
+    'prerequisite': 5,
+    'mcat': 4,
+    'gpa': 4,
+    'deadline': 4,
+    'statistic': 3,
+    'financial aid': 3,
+    'md program': 3,
+    'do program': 3,
+    'how to apply': 3,
+    'apply': 2,
+    'mission': 2,
+    'about': 1,
+    'news': -4,
+    'event': -4,
+    'calendar': -4,
+    'login': -6,
+    'sign in': -6,
+    'donate': -6,
+    'giving': -5,
+    'alumni': -3,
+    'career': -3,
+    'job': -3,
+}
+
+LINK_KEYWORDS = KeywordAutomaton(
+    (keyword, (keyword, weight), False) for keyword, weight in LINK_WEIGHTS.items()
+)
+
+SKIP_EXTENSIONS = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.zip', '.doc', '.docx',
+    '.xls', '.xlsx', '.ppt', '.pptx', '.mp3', '.mp4', '.mov', '.ics',
+)
+
+URL_SEPARATORS_RE = re.compile(r'[-_/.%+=?&]+')
+
+
+def site_key(url):
+    """Registrable part of a URL's host (hms.harvard.edu -> harvard.edu)"""
+    host = urlparse(url).netloc.lower().split(':')[0]
+    labels = host.split('.')
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in ('ac', 'co', 'edu', 'org', 'gov'):
+        # Country domains such as med.example.ac.uk
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def score_link(url, text=''):
+    """Score a candidate subpage from its URL and anchor text (higher is better)"""
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+    if parsed.scheme not in ('http', 'https') or path.endswith(SKIP_EXTENSIONS):
+        return None
+
+    url_words = URL_SEPARATORS_RE.sub(' ', path + ' ' + parsed.query.lower())
+    score = sum(weight for _, weight in LINK_KEYWORDS.scan(url_words))
+    if text:
+        # Anchor text is a stronger hint than the URL
+        score += 2 * sum(weight for _, weight in LINK_KEYWORDS.scan(text.lower()))
+    # Prefer shallow pages when scores tie
+    return score - 0.1 * path.count('/')
+
+
+def top_links(candidates, n):
+    """The n best (score, url) pairs with a positive score"""
+    return heapq.nlargest(n, ((score, url) for score, url in candidates if score and score > 0))
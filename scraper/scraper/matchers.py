@@ -0,0 +1,168 @@
+# Precompiled field patterns and keyword matching for the extractors
+import re
+
+
+# Upper bound on how many characters of a page any pattern may scan.
+# Together with the bounded windows below this caps the work per page.
+MAX_SCAN_CHARS = 200000
+
+# Longest gap allowed between the parts of a pattern (e.g. "average ... gpa").
+# Replaces unbounded lazy '.*?' spans, which can backtrack across a whole page.
+WINDOW = 80
+
+
+def _compile(patterns):
+    """Compile a pattern list, expanding {w} to the bounded window"""
+    return [
+        re.compile(pattern.replace('{w}', '{0,%d}' % WINDOW), re.IGNORECASE)
+        for pattern in patterns
+    ]
+
+
+# Patterns per field, in priority order. Group 1 holds the value.
+# They search text blocks joined by newlines (PageAnalysis.section_text), so no
+# part may match '\n' and run into the next block: '.' never does, separators
+# are [: \t] and gaps [^\d\n] rather than \s and \D.
+FIELD_PATTERNS = {
+    'tuition': _compile([
+        r'tuition[: \t]*\$?([\d,]+)',
+        r'\$([\d,]+)[ \t]*tuition',
+        r'tuition.{w}?(\$[\d,]+)',
+    ]),
+    'gpa': _compile([
+        r'gpa[: \t]*(\d+\.\d+)',
+        r'average.{w}?gpa[: \t]*(\d+\.\d+)',
+        r'gpa.{w}?(\d+\.\d+)',
+    ]),
+    'mcat': _compile([
+        r'mcat[: \t]*(\d{3})',
+        r'average.{w}?mcat[: \t]*(\d{3})',
+        r'mcat.{w}?score[: \t]*(\d{3})',
+    ]),
+    'class_size': _compile([
+        r'class.{w}?size[: \t]*(\d+)',
+        r'(?<!\d)(\d+)[^\d\n]{w}?students.{w}?class',
+        r'enrollment[: \t]*(\d+)',
+    ]),
+    'acceptance_rate': _compile([
+        r'acceptance.{w}?rate[: \t]*(\d+\.?\d*)%',
+        r'(\d+\.?\d*)%.{w}?acceptance',
+    ]),
+    'primary_deadline': _compile([
+        r'primary.{w}?deadline[: \t]*([A-Z][a-z]+[ \t]+\d{1,2})',
+    ]),
+    'secondary_deadline': _compile([
+        r'secondary.{w}?deadline[: \t]*([A-Z][a-z]+[ \t]+\d{1,2})',
+    ]),
+}
+
+
+# Words that mark the text blocks each field's patterns can match in: every
+# pattern contains one of them, so other blocks are skipped (see PageAnalysis)
+FIELD_KEYWORDS = {
+    'tuition': ('tuition',),
+    'gpa': ('gpa',),
+    'mcat': ('mcat',),
+    'class_size': ('class', 'enrollment'),
+    'acceptance_rate': ('acceptance',),
+    'primary_deadline': ('deadline',),
+    'secondary_deadline': ('deadline',),
+}
+
+
+def iter_field_matches(field, text):
+    """Yield the first match of each of the field's patterns, in priority order"""
+    for pattern in FIELD_PATTERNS[field]:
+        match = pattern.search(text, 0, MAX_SCAN_CHARS)
+        if match:
+            yield match
+
+
+def _trie_regex(words):
+    """Build a regex that walks a trie of the words (shared prefixes are merged)"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def render(node):
+        terminal = '' in node
+        branches = [re.escape(char) + render(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            # Prefer the longer keyword, fall back to the shorter one
+            body = '(?:' + body + ')?'
+        return body
+
+    return render(trie)
+
+
+class KeywordAutomaton:
+    """
+    Finds a whole set of keywords in a single pass over the text.
+
+    Keywords are merged into a trie that is compiled to one regex, so the scan
+    runs inside the regex engine instead of once per keyword. As with
+    Aho-Corasick output links, a hit on a longer keyword also reports the
+    keywords it contains ("organic chemistry" -> "chemistry").
+    """
+
+    def __init__(self, entries):
+        # entries: iterable of (keyword, label, whole_word)
+        self.labels = {}
+        whole, partial = [], []
+        for keyword, label, whole_word in entries:
+            keyword = keyword.lower()
+            self.labels.setdefault(keyword, set()).add(label)
+            (whole if whole_word else partial).append((keyword, whole_word))
+
+        alternatives = []
+        if whole:
+            alternatives.append(r'(?<![\w.@/])' + _trie_regex([k for k, _ in whole]) + r'(?!\w)')
+        if partial:
+            alternatives.append(_trie_regex([k for k, _ in partial]))
+        self.regex = re.compile('|'.join(alternatives) or r'(?!)')
+
+        # Output links: labels of every keyword contained in a longer one
+        everything = whole + partial
+        self.outputs = {}
+        for keyword, _ in everything:
+            found = set(self.labels[keyword])
+            for other, other_whole in everything:
+                if other == keyword or other not in keyword:
+                    continue
+                if other_whole:
+                    if not re.search(r'(?<!\w)' + re.escape(other) + r'(?!\w)', keyword):
+                        continue
+                found |= self.labels[other]
+            self.outputs[keyword] = found
+
+    def scan(self, text):
+        """Return the labels of all keywords found in lowercased text"""
+        found = set()
+        for match in self.regex.finditer(text, 0, MAX_SCAN_CHARS):
+            found |= self.outputs[match.group()]
+        return found
+
+
+COMMON_COURSES = [
+    'Biology', 'Chemistry', 'Organic Chemistry', 'Physics',
+    'Mathematics', 'English', 'Biochemistry', 'Psychology',
+    'Sociology', 'Calculus', 'Statistics'
+]
+
+# Every keyword the extractors look for, found together in one pass per page
+PAGE_KEYWORDS = KeywordAutomaton(
+    [(course, ('course', course), True) for course in COMMON_COURSES]
+    + [(term, ('type', 'DO'), True) for term in ['osteopathic', 'do school', 'd.o.', 'com']]
+    + [
+        ('lcme', ('accreditation', 'LCME'), False),
+        ('lcma', ('accreditation', 'LCME'), False),
+        ('aacom', ('accreditation', 'AACOM'), False),
+    ]
+)
@@ -0,0 +1,82 @@
+# Normalization of scraped rows into records of the Supabase schools table
+import json
+
+
+def parse_value(value, field_type):
+    """Parse CSV value based on field type (JSON Lines values arrive already typed)"""
+    if not value or value == '':
+        return None
+    
+    if isinstance(value, (list, dict)):
+        return value
+    if not isinstance(value, str) and field_type == 'str':
+        value = str(value)
+    
+    if field_type == 'int':
+        try:
+            return int(value)
+        except:
+            return None
+    elif field_type == 'float':
+        try:
+            return float(value)
+        except:
+            return None
+    elif field_type == 'list':
+        try:
+            return json.loads(value) if value else []
+        except:
+            return []
+    elif field_type == 'dict':
+        try:
+            return json.loads(value) if value else None
+        except:
+            return None
+    return value.strip() if value else None
+
+
+def build_school_data(row):
+    """Normalize one scraped row into a schools table record"""
+    # Parse required_courses - handle both JSON string and comma-separated string
+    courses_str = row.get('required_courses', '')
+    required_courses = []
+    if isinstance(courses_str, list):
+        required_courses = courses_str
+    elif courses_str:
+        try:
+            # Try parsing as JSON first
+            required_courses = json.loads(courses_str) if courses_str.startswith('[') else []
+        except:
+            # If not JSON, try splitting by comma
+            if courses_str:
+                required_courses = [c.strip() for c in courses_str.split(',') if c.strip()]
+    
+    # Construct location from available fields
+    location = parse_value(row.get('location'), 'str')
+    if not location:
+        # Try to construct from city and state
+        city = parse_value(row.get('city'), 'str')
+        state = parse_value(row.get('state'), 'str')
+        if city and state:
+            location = f"{city}, {state}"
+        elif city:
+            location = city
+        elif state:
+            location = state
+        else:
+            location = "Not specified"  # Required field, use default
+    
+    # Prepare data for Supabase
+    return {
+        'name': parse_value(row.get('name'), 'str'),
+        # MSAR rows call the type 'designation'
+        'type': parse_value(row.get('type') or row.get('designation'), 'str') or 'MD',  # Default to MD
+        'location': location,
+        'tuition': parse_value(row.get('tuition'), 'int'),
+        'avg_gpa': parse_value(row.get('avg_gpa'), 'float'),
+        'avg_mcat': parse_value(row.get('avg_mcat'), 'int'),
+        'required_courses': required_courses if required_courses else [],
+        'mission': parse_value(row.get('mission'), 'str'),
+        'deadlines': parse_value(row.get('deadlines'), 'dict'),
+        'link': parse_value(row.get('link') or row.get('website'), 'str'),
+    }
@@ -0,0 +1,189 @@
+# Per-response analysis shared by the extractors of a single page
+import re
+
+from scraper.structured import structured_fields
+
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+# Menus, footers, code and widgets: never where a school states its numbers
+BOILERPLATE_TAGS = {
+    'nav', 'footer', 'aside', 'script', 'style', 'noscript', 'template',
+    'form', 'select', 'button', 'svg', 'iframe',
+}
+BOILERPLATE_ROLES = {'navigation', 'contentinfo', 'search', 'menu', 'menubar'}
+
+# Elements that end a run of text; anything else (a, span, td...) continues it
+BLOCK_TAGS = {
+    'p', 'div', 'li', 'tr', 'dl', 'section', 'article', 'main', 'header',
+    'blockquote', 'pre', 'address', 'table', 'ul', 'ol', 'figure', 'br', 'hr',
+}
+
+
+class PageAnalysis:
+    """
+    Wraps a response and computes the expensive views of it once.
+
+    Extractors read the tag-stripped body text, its lowercased copy and
+    selector results from here instead of re-serializing the body each time.
+
+    Field extractors scan section_text() instead of the whole text: the body
+    without boilerplate, split by heading into sections of text blocks, of
+    which only the blocks mentioning the field (or everything under a
+    heading that does) are returned.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.url = response.url
+        self._css = {}
+        self._memo = {}
+        self._text = None
+        self._lower = None
+        self._structured = None
+        self._sections = None
+        self._sections_lower = None
+
+    @property
+    def text(self):
+        """Body text with tags and boilerplate (menus, footers, scripts, styles) stripped"""
+        if self._text is None:
+            self._text = ' '.join(
+                ' '.join([heading] + blocks) if heading else ' '.join(blocks)
+                for heading, blocks in self.sections
+            )
+        return self._text
+
+    @property
+    def lower(self):
+        """Lowercased copy of the body text"""
+        if self._lower is None:
+            self._lower = self.text.lower()
+        return self._lower
+
+    @property
+    def sections(self):
+        """(heading, [text blocks]) pairs of the content, boilerplate removed"""
+        if self._sections is None:
+            body = self.response.xpath('//body')
+            sections = [['', []]]
+            if body:
+                block = []
+                _collect_sections(body[0].root, sections, block)
+                _end_block(sections, block)
+            self._sections = [(heading, blocks) for heading, blocks in sections if heading or blocks]
+        return self._sections
+
+    def section_text(self, keywords):
+        """
+        Text of the blocks that mention any of keywords, plus every block of
+        a section whose heading does. Blocks are separated by newlines so
+        that bounded patterns do not run from one block into the next.
+        """
+        keywords = tuple(keywords)
+        return self.memo(('sections', keywords), lambda: self._select_blocks(keywords))
+
+    def _select_blocks(self, keywords):
+        if self._sections_lower is None:
+            self._sections_lower = [
+                (heading.lower(), [block.lower() for block in blocks])
+                for heading, blocks in self.sections
+            ]
+        selected = []
+        for (heading, blocks), (heading_lower, blocks_lower) in zip(self.sections, self._sections_lower):
+            if heading and any(keyword in heading_lower for keyword in keywords):
+                selected.append(heading)
+                selected.extend(blocks)
+                continue
+            selected.extend(
+                block for block, lower in zip(blocks, blocks_lower)
+                if any(keyword in lower for keyword in keywords)
+            )
+        return '\n'.join(selected)
+
+    @property
+    def structured(self):
+        """Item fields marked up with schema.org JSON-LD or microdata"""
+        if self._structured is None:
+            self._structured = structured_fields(self.response)
+        return self._structured
+
+    def css(self, selector):
+        """Cached response.css(selector)"""
+        result = self._css.get(selector)
+        if result is None:
+            result = self._css[selector] = self.response.css(selector)
+        return result
+
+    def css_first(self, selector):
+        """First match of a selector, or None"""
+        return self.css(selector).get()
+
+    def css_all(self, selector):
+        """All matches of a selector"""
+        return self.css(selector).getall()
+
+    def memo(self, key, compute):
+        """Return compute() for key, computing it at most once per page"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+
+def _is_boilerplate(element, tag):
+    if tag in BOILERPLATE_TAGS:
+        return True
+    if element.get('hidden') is not None or element.get('aria-hidden') == 'true':
+        return True
+    return (element.get('role') or '').lower() in BOILERPLATE_ROLES
+
+
+def _end_block(sections, block):
+    """Close the run of text in block, adding it to the current section"""
+    text = WHITESPACE_RE.sub(' ', ''.join(block)).strip()
+    if text:
+        sections[-1][1].append(text)
+    block.clear()
+
+
+def _collect_sections(element, sections, block):
+    """
+    Walk an lxml element in document order, splitting text at headings and
+    block elements. The walk keeps its own stack, so arbitrarily deep
+    nesting cannot exhaust the Python stack.
+    """
+    if element.text:
+        block.append(element.text)
+    # (children left to visit, element, whether it is a block element)
+    stack = [(iter(element), None, False)]
+    while stack:
+        children, parent, is_block = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if parent is not None:
+                if is_block:
+                    _end_block(sections, block)
+                else:
+                    block.append(' ')
+                if parent.tail:
+                    block.append(parent.tail)
+            continue
+        tag = child.tag.lower() if isinstance(child.tag, str) else None
+        if tag in HEADING_TAGS:
+            _end_block(sections, block)
+            heading = WHITESPACE_RE.sub(' ', ''.join(child.itertext())).strip()
+            sections.append([heading, []])
+        elif tag is not None and not _is_boilerplate(child, tag):
+            if tag in BLOCK_TAGS:
+                _end_block(sections, block)
+            else:
+                block.append(' ')
+            if child.text:
+                block.append(child.text)
+            stack.append((iter(child), child, tag in BLOCK_TAGS))
+            continue  # Its tail follows its children
+        if child.tail:
+            block.append(child.tail)
@@ -1,27 +1,119 @@
 # Define your item pipelines here
 import json
 import csv
+import gzip
+import logging
+import os
+import sqlite3
+import time
+import numpy as np
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.conf import build_component_list
+from scrapy.utils.misc import build_from_crawler, load_object
+from twisted.internet import defer, task, threads
+
+from scraper.checkpoint import checkpoint_requested, checkpoint_saving, load_checkpoint
+from scraper.normalize import build_school_data
+from scraper.postgrest import PostgrestClient, upsert_batch
+from scraper.validation import FIELDS as VALIDATED_FIELDS, BatchValidator
+
+logger = logging.getLogger(__name__)
+
+# Pipelines writing the export files. Processes that share a crawl (replay
+# shards, frontier workers) leave these to a single export_items() call.
+EXPORT_PIPELINES = (
+    'scraper.pipelines.CsvExportPipeline',
+    'scraper.pipelines.JsonLinesExportPipeline',
+    'scraper.pipelines.SqliteExportPipeline',
+)
+
+
+def component_path(component):
+    """Import path of an ITEM_PIPELINES key, which may be a class"""
+    if isinstance(component, str):
+        return component
+    return f'{component.__module__}.{component.__qualname__}'
+
+
+def export_items(crawler, items):
+    """
+    Write items through the export pipelines enabled in the crawler's
+    ITEM_PIPELINES, in their order, and return how many were written.
+    """
+    pipelines = []
+    for component in build_component_list(crawler.settings.getwithbase('ITEM_PIPELINES')):
+        if component_path(component) not in EXPORT_PIPELINES:
+            continue
+        try:
+            pipelines.append(build_from_crawler(load_object(component), crawler))
+        except NotConfigured:
+            continue
+    for pipeline in pipelines:
+        pipeline.open_spider(None)
+    count = 0
+    try:
+        for item in items:
+            for pipeline in pipelines:
+                item = pipeline.process_item(item, None)
+            count += 1
+    finally:
+        for pipeline in pipelines:
+            pipeline.close_spider(None)
+    return count
 
 
 class CsvExportPipeline:
-    def __init__(self):
+    def __init__(self, path='medical_schools.csv', resume=None):
+        self.path = path
+        # Offset saved by the last checkpoint of a resumed JOBDIR crawl
+        self.resume = resume or {}
+        self.offset = None
         self.file = None
         self.writer = None
 
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.get('FRONTIER_PATH'):
+            # Workers of a shared frontier store their items there instead,
+            # for `scrapy frontier merge` to export without duplicates
+            raise NotConfigured
+        resume = load_checkpoint(crawler.settings.get('JOBDIR')).get('csv')
+        pipeline = cls(path=crawler.settings.get('CSV_EXPORT_PATH', 'medical_schools.csv'),
+                       resume=resume)
+        crawler.signals.connect(pipeline.checkpoint_saving, signal=checkpoint_saving)
+        return pipeline
+
     def open_spider(self, spider):
-        self.file = open('medical_schools.csv', 'w', newline='', encoding='utf-8')
         fieldnames = [
             'name', 'type', 'location', 'city', 'state', 'tuition', 'avg_gpa',
             'avg_mcat', 'required_courses', 'mission', 'deadlines', 'link',
             'website', 'accreditation', 'class_size', 'acceptance_rate'
         ]
+        if self.resume.get('path') == self.path and os.path.exists(self.path):
+            # Drop rows written after the checkpoint; their schools are scraped again
+            self.file = open(self.path, 'r+', newline='', encoding='utf-8')
+            self.file.truncate(self.resume['offset'])
+            self.file.seek(self.resume['offset'])
+            self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+            return
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
         self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
         self.writer.writeheader()
 
     def close_spider(self, spider):
         if self.file:
+            self.file.flush()
+            self.offset = self.file.tell()
             self.file.close()
+            self.file = None
+
+    def checkpoint_saving(self, state):
+        if self.file:
+            self.file.flush()
+            self.offset = self.file.tell()
+        if self.offset is not None:
+            state['csv'] = {'path': self.path, 'offset': self.offset}
 
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
@@ -37,20 +129,506 @@ class CsvExportPipeline:
         return item
 
 
-class JsonExportPipeline:
-    def __init__(self):
+class JsonLinesExportPipeline:
+    """
+    Streams items to JSON Lines as they arrive (optionally gzipped).
+
+    Each item is written to the ``.tmp`` file as it arrives, so memory stays
+    flat and a crash keeps what was exported so far. A gzip stream is only
+    flushed on checkpoints and on close: flushing it per item ends a deflate
+    block every line and loses most of the compression. Files are
+    rotated once they reach JSONL_EXPORT_MAX_BYTES and renamed into place
+    atomically when complete.
+    """
+
+    def __init__(self, path='medical_schools.jsonl', use_gzip=False, max_bytes=0, resume=None):
+        self.path = path
+        self.use_gzip = use_gzip
+        self.max_bytes = max_bytes
+        # Part and offset saved by the last checkpoint of a resumed JOBDIR crawl
+        self.resume = resume or {}
+        self.part = 0
+        self.raw = None
         self.file = None
-        self.items = []
+        self.current_path = None
+        self.part_items = 0
+        self.position = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if settings.get('FRONTIER_PATH'):
+            raise NotConfigured  # Exported by `scrapy frontier merge`
+        pipeline = cls(
+            path=settings.get('JSONL_EXPORT_PATH', 'medical_schools.jsonl'),
+            use_gzip=settings.getbool('JSONL_EXPORT_GZIP'),
+            max_bytes=settings.getint('JSONL_EXPORT_MAX_BYTES'),
+            resume=load_checkpoint(settings.get('JOBDIR')).get('jsonl'),
+        )
+        crawler.signals.connect(pipeline.checkpoint_saving, signal=checkpoint_saving)
+        return pipeline
 
     def open_spider(self, spider):
-        self.file = open('medical_schools.json', 'w', encoding='utf-8')
+        if self.resume.get('path') == self.path:
+            self.part = self.resume['part']
+            self._open_part(self.resume['offset'], self.resume['items'])
+        else:
+            self._open_part()
 
     def close_spider(self, spider):
-        if self.file:
-            json.dump(self.items, self.file, indent=2, ensure_ascii=False)
+        self._close_part()
+
+    def checkpoint_saving(self, state):
+        if self.raw:
+            if self.file is not self.raw:
+                # End the gzip member so the file is valid up to this offset
+                self.file.close()
+            self.raw.flush()
+            self.position = {'part': self.part, 'offset': self.raw.tell(), 'items': self.part_items}
+            if self.file is not self.raw:
+                self.file = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        if self.position is not None:
+            state['jsonl'] = dict(self.position, path=self.path)
+
+    def process_item(self, item, spider):
+        line = json.dumps(ItemAdapter(item).asdict(), ensure_ascii=False) + '\n'
+        self.file.write(line.encode('utf-8'))
+        # Hands what is already compressed to the OS, without ending a deflate block
+        self.raw.flush()
+        self.part_items += 1
+        if self.max_bytes and self.raw.tell() >= self.max_bytes:
+            self._close_part()
+            self.part += 1
+            self._open_part()
+        return item
+
+    def _part_path(self):
+        """medical_schools.jsonl, or medical_schools-0001.jsonl when rotating"""
+        path = self.path
+        if self.max_bytes:
+            stem, ext = os.path.splitext(path)
+            path = f'{stem}-{self.part:04d}{ext}'
+        if self.use_gzip:
+            path += '.gz'
+        return path
+
+    def _open_part(self, offset=None, items=0):
+        self.current_path = self._part_path()
+        self.part_items = items
+        tmp_path = self.current_path + '.tmp'
+        if offset is not None and os.path.exists(self.current_path) and not os.path.exists(tmp_path):
+            # The previous run finished this part: reopen it to append
+            os.replace(self.current_path, tmp_path)
+        if offset is not None and os.path.exists(tmp_path):
+            self.raw = open(tmp_path, 'r+b')
+            self.raw.truncate(offset)
+            self.raw.seek(offset)
+        else:
+            self.raw = open(tmp_path, 'wb')
+        if self.use_gzip:
+            self.file = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        else:
+            self.file = self.raw
+
+    def _close_part(self):
+        if not self.raw:
+            return
+        if self.file is not self.raw:
             self.file.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.position = {'part': self.part, 'offset': self.raw.tell(), 'items': self.part_items}
+        self.raw.close()
+        if self.part_items or not self.part:
+            os.replace(self.current_path + '.tmp', self.current_path)
+        else:
+            # Rotation opened a part that never received an item
+            os.remove(self.current_path + '.tmp')
+        self.raw = self.file = None
+
+
+class SqliteExportPipeline:
+    """
+    Writes items into an indexed SQLite database, upserting on school name.
+
+    Scalar fields go into the schools table (indexed on type, state,
+    tuition, avg_gpa and avg_mcat); required_courses and deadlines are
+    normalized into the school_courses and school_deadlines side tables.
+    Writes are committed in batches of SQLITE_EXPORT_BATCH_SIZE items.
+    """
+
+    COLUMNS = [
+        'name', 'type', 'location', 'city', 'state', 'tuition', 'avg_gpa',
+        'avg_mcat', 'mission', 'link', 'website', 'accreditation', 'class_size',
+        'acceptance_rate'
+    ]
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS schools (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            type TEXT,
+            location TEXT,
+            city TEXT,
+            state TEXT,
+            tuition INTEGER,
+            avg_gpa REAL,
+            avg_mcat INTEGER,
+            mission TEXT,
+            link TEXT,
+            website TEXT,
+            accreditation TEXT,
+            class_size INTEGER,
+            acceptance_rate REAL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS school_courses (
+            school_id INTEGER NOT NULL REFERENCES schools (id) ON DELETE CASCADE,
+            course TEXT NOT NULL,
+            PRIMARY KEY (school_id, course)
+        );
+        CREATE TABLE IF NOT EXISTS school_deadlines (
+            school_id INTEGER NOT NULL REFERENCES schools (id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            deadline TEXT,
+            PRIMARY KEY (school_id, kind)
+        );
+        CREATE INDEX IF NOT EXISTS idx_schools_type ON schools (type);
+        CREATE INDEX IF NOT EXISTS idx_schools_state ON schools (state);
+        CREATE INDEX IF NOT EXISTS idx_schools_tuition ON schools (tuition);
+        CREATE INDEX IF NOT EXISTS idx_schools_avg_gpa ON schools (avg_gpa);
+        CREATE INDEX IF NOT EXISTS idx_schools_avg_mcat ON schools (avg_mcat);
+        CREATE INDEX IF NOT EXISTS idx_school_courses_course ON school_courses (course);
+    """
+
+    def __init__(self, path='medical_schools.sqlite', batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.db = None
+        self.pending = 0
+        columns = ', '.join(self.COLUMNS)
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        updates = ', '.join(f'{c} = excluded.{c}' for c in self.COLUMNS if c != 'name')
+        self.upsert_sql = (
+            f'INSERT INTO schools ({columns}, updated_at) VALUES ({placeholders}, ?) '
+            f'ON CONFLICT (name) DO UPDATE SET {updates}, updated_at = excluded.updated_at'
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if settings.get('FRONTIER_PATH'):
+            raise NotConfigured  # Exported by `scrapy frontier merge`
+        pipeline = cls(
+            path=settings.get('SQLITE_EXPORT_PATH', 'medical_schools.sqlite'),
+            batch_size=settings.getint('SQLITE_EXPORT_BATCH_SIZE', 500),
+        )
+        crawler.signals.connect(pipeline.checkpoint_saving, signal=checkpoint_saving)
+        return pipeline
+
+    def checkpoint_saving(self, state):
+        # Items of schools marked complete must survive a crash
+        if self.db:
+            self.db.commit()
+            self.pending = 0
+
+    def open_spider(self, spider):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA foreign_keys=ON')
+        self.db.executescript(self.SCHEMA)
+
+    def close_spider(self, spider):
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db = None
 
     def process_item(self, item, spider):
-        self.items.append(dict(item))
+        adapter = ItemAdapter(item)
+        name = adapter.get('name')
+        if not name:
+            return item
+
+        values = [adapter.get(column) for column in self.COLUMNS]
+        values = [None if value == '' else value for value in values]
+        self.db.execute(self.upsert_sql, values + [time.time()])
+        school_id = self.db.execute('SELECT id FROM schools WHERE name = ?', (name,)).fetchone()[0]
+
+        # Replace the school's list fields in the side tables
+        self.db.execute('DELETE FROM school_courses WHERE school_id = ?', (school_id,))
+        self.db.execute('DELETE FROM school_deadlines WHERE school_id = ?', (school_id,))
+        courses = adapter.get('required_courses') or []
+        self.db.executemany(
+            'INSERT OR IGNORE INTO school_courses (school_id, course) VALUES (?, ?)',
+            [(school_id, course) for course in courses],
+        )
+        deadlines = adapter.get('deadlines') or {}
+        self.db.executemany(
+            'INSERT INTO school_deadlines (school_id, kind, deadline) VALUES (?, ?, ?)',
+            [(school_id, kind, deadline) for kind, deadline in deadlines.items()],
+        )
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.db.commit()
+            self.pending = 0
         return item
 
+
+class SupabaseSinkPipeline:
+    """
+    Upserts items into the Supabase schools table while the crawl runs.
+
+    Items are normalized like import_to_supabase.py does (build_school_data)
+    and sent in micro-batches: as soon as SUPABASE_SINK_BATCH_SIZE schools
+    are buffered, or every SUPABASE_SINK_FLUSH_INTERVAL seconds. Batches are
+    sent from a thread, so the reactor never waits on the network. When
+    SUPABASE_SINK_IN_FLIGHT batches are already being sent and the buffer is
+    full, process_item returns a Deferred that fires once a batch finishes,
+    which slows the crawl down to what the database accepts. Rows not yet
+    written are saved with each JOBDIR checkpoint and sent again on resume.
+    """
+
+    def __init__(self, url, api_key='', rest_path='/rest/v1', table='schools', batch_size=200,
+                 flush_interval=5.0, max_in_flight=2, stats=None, resume=None):
+        self.url = url
+        self.api_key = api_key
+        self.rest_path = rest_path
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_in_flight = max_in_flight
+        self.stats = stats
+        self.resume = resume or {}
+        self.client = None
+        self.task = None
+        self.buffer = {}  # name -> record, the latest item of a school wins
+        self.in_flight = {}  # Deferred -> batch being sent
+        self.waiting = []  # Deferreds of items held back by a full buffer
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('SUPABASE_SINK_ENABLED'):
+            raise NotConfigured
+        url = settings.get('SUPABASE_SINK_URL') or os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+        if not url:
+            raise NotConfigured('Set SUPABASE_SINK_URL or NEXT_PUBLIC_SUPABASE_URL')
+        pipeline = cls(
+            url,
+            api_key=settings.get('SUPABASE_SINK_KEY') or os.getenv('SUPABASE_SERVICE_ROLE_KEY') or '',
+            rest_path=settings.get('SUPABASE_SINK_REST_PATH', '/rest/v1'),
+            table=settings.get('SUPABASE_SINK_TABLE', 'schools'),
+            batch_size=settings.getint('SUPABASE_SINK_BATCH_SIZE', 200),
+            flush_interval=settings.getfloat('SUPABASE_SINK_FLUSH_INTERVAL', 5.0),
+            max_in_flight=settings.getint('SUPABASE_SINK_IN_FLIGHT', 2),
+            stats=crawler.stats,
+            resume=load_checkpoint(settings.get('JOBDIR')).get('supabase_sink'),
+        )
+        crawler.signals.connect(pipeline.checkpoint_saving, signal=checkpoint_saving)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.client = PostgrestClient(self.url, self.api_key, max_connections=self.max_in_flight,
+                                      rest_path=self.rest_path)
+        for record in self.resume.get('pending', []):
+            self.buffer[record['name']] = record
+        self.task = task.LoopingCall(self._flush)
+        self.task.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider):
+        if self.task and self.task.running:
+            self.task.stop()
+        d = self._drain()
+        d.addBoth(lambda _: self.client.close())
+        return d
+
+    def checkpoint_saving(self, state):
+        # Schools marked complete must still reach the database after a crash
+        pending = [record for batch in self.in_flight.values() for record in batch]
+        pending.extend(self.buffer.values())
+        state['supabase_sink'] = {'pending': pending}
+
+    def process_item(self, item, spider):
+        record = build_school_data(ItemAdapter(item).asdict())
+        if not record['name'] or not record['type']:
+            self.stats.inc_value('supabase_sink/skipped')
+            return item
+        self.buffer[record['name']] = record
+        if len(self.buffer) < self.batch_size:
+            return item
+        if len(self.in_flight) < self.max_in_flight:
+            self._send()
+            return item
+        # Every batch slot is busy: hold the item, and with it the scraper
+        self.stats.inc_value('supabase_sink/backpressure')
+        d = defer.Deferred()
+        d.addCallback(lambda _: item)
+        self.waiting.append(d)
+        return d
+
+    def _flush(self):
+        """Send whatever is buffered, as far as free batch slots allow"""
+        while self.buffer and len(self.in_flight) < self.max_in_flight:
+            self._send()
+
+    def _send(self):
+        names = list(self.buffer)[:self.batch_size]
+        batch = [self.buffer.pop(name) for name in names]
+        d = threads.deferToThread(upsert_batch, self.client, self.table, batch)
+        self.in_flight[d] = batch
+        d.addCallback(self._batch_sent)
+        d.addErrback(self._batch_failed, batch)
+        d.addBoth(self._batch_done, d)
+        return d
+
+    def _batch_sent(self, result):
+        succeeded, failed, requests = result
+        self.stats.inc_value('supabase_sink/batches')
+        self.stats.inc_value('supabase_sink/requests', requests)
+        self.stats.inc_value('supabase_sink/rows', len(succeeded))
+        if failed:
+            self.stats.inc_value('supabase_sink/failed', len(failed))
+        for record, error in failed:
+            logger.error(f'Could not upsert {record["name"]}: {error}')
+
+    def _batch_failed(self, failure, batch):
+        self.stats.inc_value('supabase_sink/failed', len(batch))
+        logger.error(f'Could not upsert a batch of {len(batch)} schools: {failure.getErrorMessage()}')
+
+    def _batch_done(self, _, d):
+        del self.in_flight[d]
+        while len(self.buffer) >= self.batch_size and len(self.in_flight) < self.max_in_flight:
+            self._send()
+        if len(self.buffer) < self.batch_size:
+            # The held items are in a batch (or below the size limit): let them go
+            waiting, self.waiting = self.waiting, []
+            for waiter in waiting:
+                waiter.callback(None)
+
+    @defer.inlineCallbacks
+    def _drain(self):
+        while self.buffer or self.in_flight:
+            self._flush()
+            if self.in_flight:
+                yield defer.DeferredList(list(self.in_flight), consumeErrors=True)
+
+
+def _as_float(value):
+    """Item value as a float, NaN when missing or not a number"""
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ValidationPipeline:
+    """
+    Checks tuition, avg_gpa, avg_mcat, class_size and acceptance_rate in
+    batches, before the items are exported (see scraper/validation.py).
+
+    Items are held until VALIDATION_BATCH_SIZE are buffered, or for at most
+    VALIDATION_FLUSH_INTERVAL seconds, and validated together. Flagged values
+    are removed from the item, which carries on with its other fields; the
+    item as scraped and the reasons are appended to the JSON Lines file
+    VALIDATION_QUARANTINE_PATH. With VALIDATION_DROP flagged items are
+    dropped instead. The buffer is also validated when a JOBDIR checkpoint
+    is due, since checkpoints wait for the pipelines to empty.
+    """
+
+    def __init__(self, validator, quarantine_path='quarantine.jsonl', batch_size=256,
+                 flush_interval=2.0, drop=False, stats=None):
+        self.validator = validator
+        self.quarantine_path = quarantine_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop = drop
+        self.stats = stats
+        self.file = None
+        self.task = None
+        self.buffer = []  # (item, Deferred) waiting for their batch
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('VALIDATION_ENABLED'):
+            raise NotConfigured
+        validator = BatchValidator(
+            threshold=settings.getfloat('VALIDATION_MAD_THRESHOLD', 3.5),
+            pair_threshold=settings.getfloat('VALIDATION_PAIR_THRESHOLD', 6.0),
+            min_samples=settings.getint('VALIDATION_MIN_SAMPLES', 20),
+            history_size=settings.getint('VALIDATION_HISTORY', 1000),
+        )
+        pipeline = cls(
+            validator,
+            quarantine_path=settings.get('VALIDATION_QUARANTINE_PATH', 'quarantine.jsonl'),
+            batch_size=settings.getint('VALIDATION_BATCH_SIZE', 256),
+            flush_interval=settings.getfloat('VALIDATION_FLUSH_INTERVAL', 2.0),
+            drop=settings.getbool('VALIDATION_DROP'),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(pipeline.checkpoint_requested, signal=checkpoint_requested)
+        return pipeline
+
+    def open_spider(self, spider):
+        # Appended line by line, so processes sharing a crawl can share the file
+        self.file = open(self.quarantine_path, 'a', encoding='utf-8', buffering=1)
+        self.task = task.LoopingCall(self._flush)
+        self.task.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider):
+        if self.task and self.task.running:
+            self.task.stop()
+        self._flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def checkpoint_requested(self):
+        self._flush()
+
+    def process_item(self, item, spider):
+        d = defer.Deferred()
+        self.buffer.append((item, d))
+        if len(self.buffer) >= self.batch_size:
+            self._flush()
+        return d
+
+    def _flush(self):
+        """Validate the buffered items and release them"""
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        adapters = [ItemAdapter(item) for item, _ in batch]
+        values = np.array(
+            [[_as_float(adapter.get(field)) for field in VALIDATED_FIELDS] for adapter in adapters],
+            dtype=float,
+        ).reshape(len(batch), len(VALIDATED_FIELDS))
+        types = [str(adapter.get('type') or '').upper() for adapter in adapters]
+        reasons, flagged = self.validator.validate(types, values)
+        self.stats.inc_value('validation/batches')
+        self.stats.inc_value('validation/items', len(batch))
+
+        by_row = {}
+        for row, field, check, detail in reasons:
+            by_row.setdefault(int(row), []).append({'field': field, 'check': check, 'detail': detail})
+            self.stats.inc_value(f'validation/flagged/{check}')
+        for row, row_reasons in sorted(by_row.items()):
+            adapter = adapters[row]
+            record = {'quarantined_at': time.time(), 'reasons': row_reasons, 'item': adapter.asdict()}
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if not self.drop:
+                for column in np.nonzero(flagged[row])[0]:
+                    adapter[VALIDATED_FIELDS[column]] = None
+        self.stats.inc_value('validation/quarantined', len(by_row))
+
+        for row, (item, d) in enumerate(batch):
+            if self.drop and row in by_row:
+                reasons = '; '.join(f'{r["field"]}: {r["detail"]}' for r in by_row[row])
+                d.errback(DropItem(f'Failed validation: {reasons}'))
+            else:
+                d.callback(item)
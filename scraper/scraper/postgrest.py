@@ -0,0 +1,168 @@
+# Bulk writes to the Supabase REST (PostgREST) API
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+
+
+# Responses worth retrying as-is
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+# Responses caused by the rows themselves (bad values, constraint violations):
+# any other error (bad key, unknown table...) fails every row alike
+ROW_REJECTED_STATUSES = {400, 409, 422}
+
+
+class PostgrestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+        self.transient = status in TRANSIENT_STATUSES
+        self.rows_rejected = status in ROW_REJECTED_STATUSES
+
+
+class PostgrestClient:
+    """
+    Minimal PostgREST client over one pooled HTTP connection set.
+
+    base_url is the Supabase project URL (the REST API lives under /rest/v1),
+    or any PostgREST-compatible endpoint such as a local fake for testing.
+    """
+
+    def __init__(self, base_url, api_key='', max_connections=4, timeout=30.0,
+                 rest_path='/rest/v1'):
+        headers = {'Content-Type': 'application/json'}
+        if api_key:
+            headers['apikey'] = api_key
+            headers['Authorization'] = f'Bearer {api_key}'
+        self.http = httpx.Client(
+            base_url=base_url.rstrip('/') + rest_path,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    def upsert(self, table, rows, on_conflict='name'):
+        """Insert or merge rows in one request"""
+        response = self.http.post(
+            f'/{table}',
+            params={'on_conflict': on_conflict},
+            json=rows,
+            headers={'Prefer': 'resolution=merge-duplicates,return=minimal'},
+        )
+        self._check(response)
+
+    def delete_in(self, table, column, values):
+        """Delete rows whose column is one of values"""
+        quoted = ','.join('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+        response = self.http.delete(
+            f'/{table}',
+            params={column: f'in.({quoted})'},
+            headers={'Prefer': 'return=minimal'},
+        )
+        self._check(response)
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            raise PostgrestError(response.status_code, response.text[:500])
+
+    def close(self):
+        self.http.close()
+
+
+class BulkUpsertResult:
+    def __init__(self):
+        # Counts only: the rows themselves are handed to on_batch
+        self.succeeded = 0
+        self.failed = 0
+        self.requests = 0
+
+
+def _batches(rows, batch_size, key):
+    """Group rows into batches, keeping only the last row per conflict key in each"""
+    batch = {}
+    for row in rows:
+        batch[row.get(key)] = row
+        if len(batch) >= batch_size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+def upsert_batch(client, table, batch, on_conflict='name', retries=3, backoff=1.0):
+    """
+    Upsert one batch, retrying transient failures with exponential backoff.
+
+    A batch the server rejects for its rows (400, 409, 422) is split in half
+    until the bad rows are isolated, so one invalid row only fails itself.
+    Any other error fails the whole batch in one request. Returns (succeeded,
+    failed, requests) where failed holds (row, error) pairs.
+    """
+    requests = 0
+
+    def send(batch):
+        nonlocal requests
+        for attempt in range(retries + 1):
+            try:
+                requests += 1
+                client.upsert(table, batch, on_conflict=on_conflict)
+                return batch, []
+            except httpx.TransportError as e:
+                error = e
+            except PostgrestError as e:
+                if e.rows_rejected:
+                    return reject(batch, e)
+                if not e.transient:
+                    return [], [(row, str(e)) for row in batch]
+                error = e
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+        return [], [(row, str(error)) for row in batch]
+
+    def reject(batch, error):
+        if len(batch) == 1:
+            return [], [(batch[0], str(error))]
+        middle = len(batch) // 2
+        ok_left, failed_left = send(batch[:middle])
+        ok_right, failed_right = send(batch[middle:])
+        return ok_left + ok_right, failed_left + failed_right
+
+    succeeded, failed = send(batch)
+    return succeeded, failed, requests
+
+
+def bulk_upsert(client, table, rows, on_conflict='name', batch_size=500,
+                max_in_flight=4, retries=3, backoff=1.0, on_batch=None):
+    """
+    Upsert an iterable of rows in batches, with a bounded number in flight.
+
+    Each batch goes through upsert_batch(), so transient failures are
+    retried and rejected rows are isolated. on_batch(succeeded, failed) is
+    called as each batch finishes; the result only keeps counts, so memory
+    does not grow with the number of rows.
+    """
+    result = BulkUpsertResult()
+
+    def send(batch):
+        return upsert_batch(client, table, batch, on_conflict, retries, backoff)
+
+    def collect(futures):
+        for future in futures:
+            succeeded, failed, requests = future.result()
+            result.succeeded += len(succeeded)
+            result.failed += len(failed)
+            result.requests += requests
+            if on_batch:
+                on_batch(succeeded, failed)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = set()
+        for batch in _batches(rows, batch_size, on_conflict):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(send, batch))
+        collect(pending)
+
+    return result
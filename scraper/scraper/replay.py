@@ -0,0 +1,42 @@
+# Sharding of start requests across the processes of `scrapy replay`
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+
+
+def parse_shard(value):
+    """'2/8' -> (2, 8): the third of eight shards"""
+    index, _, count = str(value).partition('/')
+    index, count = int(index), int(count or 1)
+    if not 0 <= index < count:
+        raise ValueError(f'Invalid shard {value!r}: expected INDEX/COUNT with 0 <= INDEX < COUNT')
+    return index, count
+
+
+class ReplayShardMiddleware:
+    """
+    Keeps every COUNT-th start request of the spider, from the INDEX-th on,
+    when REPLAY_SHARD is set to 'INDEX/COUNT'.
+
+    Each school (or listing page) is then handled by exactly one replay
+    process, and the requests its callbacks yield stay in that process.
+    """
+
+    def __init__(self, shard):
+        self.index, self.count = parse_shard(shard)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        shard = crawler.settings.get('REPLAY_SHARD')
+        if not shard:
+            raise NotConfigured
+        return cls(shard)
+
+    def process_start_requests(self, start_requests, spider):
+        position = 0
+        for request in start_requests:
+            if isinstance(request, Request):
+                keep = position % self.count == self.index
+                position += 1
+                if not keep:
+                    continue
+            yield request
@@ -0,0 +1,460 @@
+"""
+Compact on-disk index of scraped schools for faceted search without a database
+
+    python -m scraper.schoolindex build medical_schools.jsonl -o schools.idx
+    python -m scraper.schoolindex query schools.idx --text "rural primary care" --type MD --state CA --avg-mcat 505:515
+    python -m scraper.schoolindex serve schools.idx --port 8001
+
+The file is memory-mapped: an inverted index over name and mission tokens,
+sorted (value, school) arrays for the numeric fields and one bitset per
+type, state and required course. Filters are combined as Python integers
+used as bitsets, so a query costs a few big-integer ANDs.
+"""
+import argparse
+import bisect
+import csv
+import gzip
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from itertools import islice
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scraper.dedupe import normalize_state
+
+MAGIC = b'SCHIDX01'
+
+RANGE_FIELDS = ('tuition', 'avg_gpa', 'avg_mcat', 'class_size', 'acceptance_rate')
+
+# Fields kept in the stored documents returned by queries
+DOC_FIELDS = ('name', 'type', 'location', 'city', 'state', 'link') + RANGE_FIELDS
+
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'our', 'that', 'the', 'to', 'we', 'with',
+})
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Range indexes store about PREFIX_COUNT prefix bitsets each
+PREFIX_COUNT = 64
+PREFIX_MIN_STEP = 64
+
+
+def tokenize(text):
+    return {token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOPWORDS}
+
+
+def _number(value):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _courses(value):
+    if isinstance(value, str):
+        # CSV exports hold the list as a JSON string
+        try:
+            value = json.loads(value) if value.startswith('[') else value.split(',')
+        except ValueError:
+            return []
+    return [course.strip() for course in value or [] if course and course.strip()]
+
+
+def _index_record(row):
+    """Normalized fields of one scraped row"""
+    return {
+        'name': (row.get('name') or '').strip(),
+        'type': (row.get('type') or row.get('designation') or '').strip().upper(),
+        'location': row.get('location') or '',
+        'city': row.get('city') or '',
+        'state': normalize_state(row.get('state')),
+        'link': row.get('link') or row.get('website') or '',
+        'mission': row.get('mission') or '',
+        'courses': _courses(row.get('required_courses')),
+        **{field: _number(row.get(field)) for field in RANGE_FIELDS},
+    }
+
+
+def _bitset_bytes(ids, size):
+    bits = bytearray(size)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+def _iter_bits(bits):
+    """Positions of the set bits of an integer bitset, lowest first"""
+    position = 0
+    while bits:
+        chunk = bits & 0xFFFFFFFFFFFFFFFF
+        while chunk:
+            low = chunk & -chunk
+            yield position + low.bit_length() - 1
+            chunk ^= low
+        bits >>= 64
+        position += 64
+
+
+def build_index(rows, path):
+    """Write the index of scraped rows to path; returns the number of schools"""
+    records = {}
+    for row in rows:
+        record = _index_record(row)
+        if record['name']:
+            records[record['name']] = record  # Later rows win, as with the name upsert
+    records = [records[name] for name in sorted(records)]
+    count = len(records)
+    bitset_size = (count + 7) // 8
+
+    sections = []
+    offset = 0
+
+    def add(data):
+        nonlocal offset
+        padding = -offset % 8  # Keep arrays aligned for memoryview casts
+        if padding:
+            sections.append(b'\0' * padding)
+            offset += padding
+        start = offset
+        sections.append(data)
+        offset += len(data)
+        return start
+
+    doc_offsets = array('Q')
+    for record in records:
+        doc_offsets.append(offset)
+        doc = {field: record[field] for field in DOC_FIELDS if record[field] not in (None, '')}
+        doc['required_courses'] = record['courses']
+        data = json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        doc_offsets.append(len(data))
+        sections.append(data)
+        offset += len(data)
+    docs = add(doc_offsets.tobytes())
+
+    postings = {}
+    for i, record in enumerate(records):
+        for token in tokenize(record['name']) | tokenize(record['mission']):
+            postings.setdefault(token, array('I')).append(i)
+    terms = {token: [add(ids.tobytes()), len(ids)] for token, ids in sorted(postings.items())}
+
+    ranges = {}
+    for field in RANGE_FIELDS:
+        pairs = sorted((record[field], i) for i, record in enumerate(records) if record[field] is not None)
+        values = array('d', (value for value, _ in pairs))
+        ids = array('I', (i for _, i in pairs))
+        by_doc = array('d', (math.nan if record[field] is None else record[field] for record in records))
+        # Bitsets of the first step, 2 * step, ... schools in value order: a range is
+        # the difference of two prefixes, with at most step ids added at each end
+        step = max(PREFIX_MIN_STEP, -(-len(ids) // PREFIX_COUNT))
+        prefixes = b''.join(_bitset_bytes(ids[:end], bitset_size) for end in range(step, len(ids) + 1, step))
+        ranges[field] = {
+            'values': add(values.tobytes()), 'ids': add(ids.tobytes()), 'n': len(ids),
+            'by_doc': add(by_doc.tobytes()), 'step': step, 'prefixes': add(prefixes),
+        }
+
+    facets = {'type': {}, 'state': {}, 'course': {}}
+    for i, record in enumerate(records):
+        if record['type']:
+            facets['type'].setdefault(record['type'], []).append(i)
+        if record['state']:
+            facets['state'].setdefault(record['state'], []).append(i)
+        for course in record['courses']:
+            facets['course'].setdefault(course.lower(), []).append(i)
+    facets = {
+        facet: {value: add(_bitset_bytes(ids, bitset_size)) for value, ids in sorted(values.items())}
+        for facet, values in facets.items()
+    }
+
+    header = json.dumps({
+        'count': count, 'bitset_size': bitset_size, 'docs': docs,
+        'terms': terms, 'ranges': ranges, 'facets': facets,
+    }, separators=(',', ':')).encode('utf-8')
+    base = len(MAGIC) + 8 + len(header)
+    base += -base % 8
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', base) + header)
+        f.write(b'\0' * (base - f.tell()))
+        for section in sections:
+            f.write(section)
+    # Replace atomically so a server can reopen the index at any time
+    os.replace(path + '.tmp', path)
+    return count
+
+
+class SchoolIndex:
+    """
+    Read-only view of an index file.
+
+    search() ANDs all given filters: text tokens (each must occur in the
+    name or mission), facet values (any of the listed types or states, all
+    of the listed courses) and numeric (low, high) ranges, either end open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a school index')
+        (base,) = struct.unpack_from('<Q', self.mm, len(MAGIC))
+        header = json.loads(self.mm[len(MAGIC) + 8:base].rstrip(b'\0'))
+        self.base = base
+        self.view = memoryview(self.mm)
+        self.count = header['count']
+        self.bitset_size = header['bitset_size']
+        self.doc_offsets = self._array(header['docs'], 'Q', self.count * 2)
+        self.terms = header['terms']
+        self.ranges = {
+            field: {
+                'values': self._array(entry['values'], 'd', entry['n']),
+                'ids': self._array(entry['ids'], 'I', entry['n']),
+                'by_doc': self._array(entry['by_doc'], 'd', self.count),
+                'step': entry['step'],
+                'prefixes': self.base + entry['prefixes'],
+            }
+            for field, entry in header['ranges'].items()
+        }
+        self.facets = header['facets']
+        self.all = (1 << self.count) - 1
+        self._cache = {}
+
+    def _array(self, offset, typecode, length):
+        start = self.base + offset
+        size = struct.calcsize(typecode)
+        return self.view[start:start + length * size].cast(typecode)
+
+    def _ids_bitset(self, ids):
+        return int.from_bytes(_bitset_bytes(ids, self.bitset_size), 'little')
+
+    def _cached(self, key, compute):
+        bits = self._cache.get(key)
+        if bits is None:
+            bits = self._cache[key] = compute()
+        return bits
+
+    def term(self, token):
+        entry = self.terms.get(token)
+        if entry is None:
+            return 0
+        return self._cached(('term', token), lambda: self._ids_bitset(self._array(entry[0], 'I', entry[1])))
+
+    def facet(self, facet, value):
+        offset = self.facets[facet].get(value)
+        if offset is None:
+            return 0
+        start = self.base + offset
+
+        def load():
+            return int.from_bytes(self.mm[start:start + self.bitset_size], 'little')
+        return self._cached(('facet', facet, value), load)
+
+    def _prefix(self, field, end):
+        """Bitset of the first end schools of a field in value order"""
+        index = self.ranges[field]
+        stored = end // index['step']
+        bits = 0
+        if stored:
+            start = index['prefixes'] + (stored - 1) * self.bitset_size
+            bits = self._cached(('prefix', field, stored),
+                                lambda: int.from_bytes(self.mm[start:start + self.bitset_size], 'little'))
+        return bits | self._ids_bitset(index['ids'][stored * index['step']:end])
+
+    def range(self, field, low=None, high=None):
+        values = self.ranges[field]['values']
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        end = len(values) if high is None else bisect.bisect_right(values, high)
+        return self._prefix(field, end) & ~self._prefix(field, start)
+
+    def match(self, text=None, types=(), states=(), courses=(), **ranges):
+        """Bitset of the schools matching every filter"""
+        bits = self.all
+        for token in tokenize(text):
+            bits &= self.term(token)
+        if types:
+            bits &= self._any('type', [value.upper() for value in types])
+        if states:
+            bits &= self._any('state', [normalize_state(value) for value in states])
+        for course in courses:
+            bits &= self.facet('course', course.strip().lower())
+        for field, bounds in ranges.items():
+            if field not in self.ranges:
+                raise ValueError(f'No range index on {field}')
+            if bounds is not None:
+                bits &= self.range(field, *bounds)
+        return bits
+
+    def _any(self, facet, values):
+        bits = 0
+        for value in values:
+            bits |= self.facet(facet, value)
+        return bits
+
+    def count_matches(self, **filters):
+        return bin(self.match(**filters)).count('1')
+
+    def document(self, i):
+        offset, length = self.doc_offsets[2 * i], self.doc_offsets[2 * i + 1]
+        return json.loads(self.mm[self.base + offset:self.base + offset + length])
+
+    def search(self, sort=None, limit=20, **filters):
+        """
+        Matching schools as dicts, in name order or by a range field
+        (sort='avg_mcat', or '-avg_mcat' for descending); schools without
+        a value for the sort field come last.
+        """
+        bits = self.match(**filters)
+        if not sort:
+            return [self.document(i) for i in islice(_iter_bits(bits), limit)]
+
+        field = sort.lstrip('-')
+        descending = sort.startswith('-')
+        index = self.ranges[field]
+        matches = bin(bits).count('1')
+        if matches * 8 > self.count:
+            # Many matches: walk the value order until enough are found
+            member = bits.to_bytes(self.bitset_size, 'little')
+            order = reversed(index['ids']) if descending else index['ids']
+            ordered = list(islice((i for i in order if member[i >> 3] >> (i & 7) & 1), limit))
+            if len(ordered) < limit:
+                rest = bits & ~self._prefix(field, len(index['ids']))
+                ordered.extend(islice(_iter_bits(rest), limit - len(ordered)))
+        else:
+            # Few matches: sort them by their values (missing values last)
+            by_doc = index['by_doc']
+            sign = -1 if descending else 1
+
+            def key(i):
+                value = by_doc[i]
+                return (True, 0) if math.isnan(value) else (False, sign * value)
+            ordered = heapq.nsmallest(limit, _iter_bits(bits), key=key)
+        return [self.document(i) for i in ordered]
+
+    def close(self):
+        self._cache.clear()
+        self.doc_offsets.release()
+        for index in self.ranges.values():
+            for name in ('values', 'ids', 'by_doc'):
+                index[name].release()
+        self.view.release()
+        self.mm.close()
+
+
+def read_rows(path):
+    """Rows of a CSV or (gzipped) JSON Lines export"""
+    if '.jsonl' in path:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+
+
+def _bounds(value):
+    """'505:515', '505:' or ':60000' -> (low, high)"""
+    if not value:
+        return None
+    low, _, high = value.partition(':')
+    return (float(low) if low else None, float(high) if high else None)
+
+
+def _query_filters(params):
+    """search() arguments from query parameters (lists of strings)"""
+    filters = {
+        'text': ' '.join(params.get('q', [])),
+        'types': params.get('type', []),
+        'states': params.get('state', []),
+        'courses': params.get('course', []),
+    }
+    for field in RANGE_FIELDS:
+        filters[field] = _bounds((params.get(field) or [''])[0])
+    return filters
+
+
+def serve(index, host='127.0.0.1', port=8001):
+    """
+    Serve GET /search?q=...&type=MD&state=CA&course=Biochemistry&avg_mcat=505:515
+    &sort=-avg_mcat&limit=20 as JSON ({"count": ..., "results": [...]})
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/search':
+                self.send_error(404)
+                return
+            params = parse_qs(url.query)
+            try:
+                filters = _query_filters(params)
+                body = {
+                    'count': index.count_matches(**filters),
+                    'results': index.search(sort=(params.get('sort') or [None])[0],
+                                            limit=int((params.get('limit') or ['20'])[0]),
+                                            **filters),
+                }
+            except (KeyError, ValueError) as e:
+                self.send_error(400, str(e))
+                return
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'Serving {index.count} schools on http://{host}:{port}/search')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and query the local school index')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Index CSV or JSON Lines exports')
+    build.add_argument('sources', nargs='+')
+    build.add_argument('-o', '--output', default='schools.idx')
+
+    query = commands.add_parser('query', help='Run one search')
+    query.add_argument('index')
+    query.add_argument('--text', default='')
+    query.add_argument('--type', action='append', default=[])
+    query.add_argument('--state', action='append', default=[])
+    query.add_argument('--course', action='append', default=[])
+    for field in RANGE_FIELDS:
+        query.add_argument(f'--{field.replace("_", "-")}', metavar='LOW:HIGH')
+    query.add_argument('--sort')
+    query.add_argument('--limit', type=int, default=20)
+
+    server = commands.add_parser('serve', help='Serve searches over HTTP')
+    server.add_argument('index')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=8001)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        rows = (row for source in args.sources for row in read_rows(source))
+        print(f'Indexed {build_index(rows, args.output)} schools into {args.output}')
+    elif args.command == 'query':
+        index = SchoolIndex(args.index)
+        filters = {'text': args.text, 'types': args.type, 'states': args.state, 'courses': args.course}
+        for field in RANGE_FIELDS:
+            filters[field] = _bounds(getattr(args, field))
+        print(f'{index.count_matches(**filters)} matches')
+        for school in index.search(sort=args.sort, limit=args.limit, **filters):
+            print(json.dumps(school, ensure_ascii=False))
+    else:
+        serve(SchoolIndex(args.index), args.host, args.port)
@@ -3,6 +3,7 @@ BOT_NAME = 'scraper'
 
 SPIDER_MODULES = ['scraper.spiders']
 NEWSPIDER_MODULE = 'scraper.spiders'
+COMMANDS_MODULE = 'scraper.commands'
 
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
@@ -16,10 +17,123 @@ USER_AGENT = 'MedIndex Scraper (+http://www.medindex.com)'
 
 # Enable pipelines
 ITEM_PIPELINES = {
+    'scraper.pipelines.ValidationPipeline': 200,
     'scraper.pipelines.CsvExportPipeline': 300,
-    'scraper.pipelines.JsonExportPipeline': 301,
+    'scraper.pipelines.JsonLinesExportPipeline': 301,
+    'scraper.pipelines.SqliteExportPipeline': 302,
+    'scraper.pipelines.SupabaseSinkPipeline': 303,
 }
 
+# Batch data-quality checks before export (ValidationPipeline, see
+# scraper/validation.py): implausible tuition, GPA, MCAT, class size and
+# acceptance rate values are removed and the items logged to the quarantine file
+VALIDATION_ENABLED = True
+VALIDATION_QUARANTINE_PATH = 'quarantine.jsonl'
+VALIDATION_BATCH_SIZE = 256  # Items validated together
+VALIDATION_FLUSH_INTERVAL = 2  # Seconds before a partial batch is validated
+VALIDATION_DROP = False  # Drop flagged items instead of removing the flagged values
+VALIDATION_MAD_THRESHOLD = 3.5  # Modified z-score of an outlier, per school type
+VALIDATION_PAIR_THRESHOLD = 6  # Z-score gap between fields that contradict each other
+VALIDATION_MIN_SAMPLES = 20  # Values of a type needed before outliers are scored
+VALIDATION_HISTORY = 1000  # Accepted values per type the scores are computed against
+
+CSV_EXPORT_PATH = 'medical_schools.csv'
+
+# Streaming JSON Lines export (JsonLinesExportPipeline)
+JSONL_EXPORT_PATH = 'medical_schools.jsonl'
+JSONL_EXPORT_GZIP = False
+JSONL_EXPORT_MAX_BYTES = 0  # Rotate files at this size (0 = single file)
+
+# Indexed SQLite export (SqliteExportPipeline)
+SQLITE_EXPORT_PATH = 'medical_schools.sqlite'
+SQLITE_EXPORT_BATCH_SIZE = 500  # Items per transaction
+
+# Streaming upserts into the Supabase schools table (SupabaseSinkPipeline)
+SUPABASE_SINK_ENABLED = False
+SUPABASE_SINK_URL = ''  # Defaults to NEXT_PUBLIC_SUPABASE_URL
+SUPABASE_SINK_KEY = ''  # Defaults to SUPABASE_SERVICE_ROLE_KEY
+SUPABASE_SINK_REST_PATH = '/rest/v1'  # '' for a plain PostgREST server
+SUPABASE_SINK_TABLE = 'schools'
+SUPABASE_SINK_BATCH_SIZE = 200  # Schools per upsert request
+SUPABASE_SINK_FLUSH_INTERVAL = 5  # Seconds before a partial batch is sent
+SUPABASE_SINK_IN_FLIGHT = 2  # Batches sent at once before the crawl is held back
+
+# Spider middlewares
+SPIDER_MIDDLEWARES = {
+    'scraper.frontier.FrontierMiddleware': 50,
+    'scraper.replay.ReplayShardMiddleware': 100,
+}
+
+# Crawls shared by several worker processes or machines (see scraper/frontier.py):
+# start every worker with -s FRONTIER_PATH=<file>, then export with
+# `scrapy frontier merge <file>`
+FRONTIER_PATH = ''
+FRONTIER_WAL = True  # Set to False when the file is on a network filesystem
+FRONTIER_LEASE_TTL = 300  # Seconds before the hosts of a silent worker are leased again
+FRONTIER_HOSTS = 0  # Hosts leased by a worker at once, 0 = CONCURRENT_REQUESTS
+
+# Offline re-extraction (`scrapy replay <spider>`, see scraper/commands/replay.py):
+# each worker process crawls the start requests of one REPLAY_SHARD ('INDEX/COUNT')
+# from the HTTP cache only; set by the replay command
+REPLAY_SHARD = ''
+
+# Downloader middlewares
+DOWNLOADER_MIDDLEWARES = {
+    'scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware': None,
+    'scraper.checkpoint.StaleRequestMiddleware': 50,  # Before robots.txt: nothing is fetched for them
+    'scraper.hostcache.CachedRobotsTxtMiddleware': 100,
+    'scraper.budget.DownloadBudgetMiddleware': 560,  # Below HttpCompression: trims decoded bodies
+    'scraper.throttle.HostThrottleMiddleware': 950,  # Below HttpCache: only sees real downloads
+}
+
+# robots.txt rules and DNS lookups cached across runs (see scraper/hostcache.py),
+# in .scrapy/hostcache.sqlite; upcoming hosts are looked up ahead of their requests
+DNS_RESOLVER = 'scraper.hostcache.PersistentCachingResolver'
+HOSTCACHE_PATH = 'hostcache.sqlite'
+HOSTCACHE_ROBOTS_TTL = 24 * 3600
+HOSTCACHE_DNS_TTL = 3600
+HOSTCACHE_PREFETCH_AHEAD = 64  # Schools looked up before their request is scheduled
+HOSTCACHE_PREFETCH_CONCURRENCY = 16  # Prefetch lookups in flight
+
+# Per-host adaptive throttling (see scraper/throttle.py), enabled per spider
+HOST_THROTTLE_ENABLED = False
+HOST_THROTTLE_MAX_DELAY = 60
+HOST_THROTTLE_TARGET_CONCURRENCY = 1.0
+HOST_THROTTLE_MAX_CONCURRENCY = 0  # Above CONCURRENT_REQUESTS_PER_DOMAIN, opt-in
+HOST_THROTTLE_DEBUG = False
+
+# Download budgets (see scraper/budget.py), enabled per spider: bodies past
+# DOWNLOAD_BUDGET_MAX_BYTES are truncated, and content types the spiders cannot
+# parse (PDFs, video...) are dropped once their headers arrive
+DOWNLOAD_BUDGET_ENABLED = False
+DOWNLOAD_BUDGET_MAX_BYTES = 2 * 1024 * 1024
+
+# Extensions
+EXTENSIONS = {
+    'scraper.telemetry.CrawlTelemetry': 500,
+    'scraper.checkpoint.CrawlCheckpoint': 510,
+}
+
+# Resumable crawls (see scraper/checkpoint.py): run with -s JOBDIR=crawls/<name>
+# and the same JOBDIR again to continue after an interruption
+CHECKPOINT_INTERVAL = 60  # Seconds between checkpoints
+DUPEFILTER_CLASS = 'scraper.checkpoint.BloomDupeFilter'
+DUPEFILTER_BLOOM_CAPACITY = 2000000  # Fingerprints before the error rate degrades
+DUPEFILTER_BLOOM_ERROR_RATE = 1e-6
+
+# Crawl telemetry (see scraper/telemetry.py): per-extractor, per-pipeline and
+# per-host timings in the stats, plus a Prometheus-format metrics file
+TELEMETRY_ENABLED = False
+TELEMETRY_INTERVAL = 15  # Seconds between metrics file snapshots
+TELEMETRY_FILE = 'crawl_metrics.prom'
+
+# Extraction in a pool of worker processes (SchoolWebsitesSpider), so large
+# pages do not block the reactor; timed-out pages yield a partial item
+EXTRACTION_POOL_ENABLED = False
+EXTRACTION_POOL_WORKERS = 0  # 0 = one per CPU core
+EXTRACTION_POOL_TIMEOUT = 10  # Seconds per page
+EXTRACTION_POOL_MAX_PENDING = 0  # Tasks in flight, 0 = twice the workers
+
 # Enable and configure the AutoThrottle extension
 AUTOTHROTTLE_ENABLED = True
 AUTOTHROTTLE_START_DELAY = 1
@@ -28,6 +142,15 @@ AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
 AUTOTHROTTLE_DEBUG = False
 
 # Enable and configure HTTP caching
+# Responses are kept compressed in one SQLite file per spider under
+# .scrapy/httpcache and never expire; stale pages are revalidated with
+# ETag/Last-Modified so an unchanged page only costs a 304.
 HTTPCACHE_ENABLED = True
-HTTPCACHE_EXPIRATION_SECS = 3600
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_POLICY = 'scrapy.extensions.httpcache.RFC2616Policy'
+HTTPCACHE_ALWAYS_STORE = True  # Keep pages sent with no-cache so they can be revalidated
+HTTPCACHE_STORAGE = 'scraper.httpcache.SqliteCacheStorage'
+HTTPCACHE_SQLITE_MAX_BYTES = 1024 * 1024 * 1024  # Evict least recently used entries past 1 GB
+HTTPCACHE_SQLITE_COMPRESSION_LEVEL = 6
+HTTPCACHE_SQLITE_READ_ONLY = False  # Never write to the cache (replay workers)
 
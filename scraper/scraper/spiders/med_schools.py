@@ -1,6 +1,7 @@
 import scrapy
 import re
 from scraper.items import MedicalSchoolItem
+from scraper.linkscore import score_link
 
 
 class MedSchoolsSpider(scrapy.Spider):
@@ -19,16 +20,24 @@ class MedSchoolsSpider(scrapy.Spider):
         This is a template - you'll need to adjust selectors based on actual page structure
         """
         # Extract school links (adjust selectors based on actual HTML)
-        school_links = response.css('a[href*="school"]::attr(href)').getall()
+        school_links = {}
+        for link in response.css('a[href*="school"]'):
+            href = link.attrib.get('href')
+            if href:
+                full_url = response.urljoin(href)
+                text = ' '.join(link.css('::text').getall())
+                score = score_link(full_url, text)
+                if score is not None:
+                    school_links[full_url] = max(score, school_links.get(full_url, score))
         
-        for link in school_links:
-            if link:
-                full_url = response.urljoin(link)
-                yield scrapy.Request(
-                    url=full_url,
-                    callback=self.parse_school,
-                    meta={'school_type': self._determine_type(response.url)}
-                )
+        # Most promising school pages (admissions, class profile...) first
+        for full_url, score in sorted(school_links.items(), key=lambda link: -link[1]):
+            yield scrapy.Request(
+                url=full_url,
+                callback=self.parse_school,
+                meta={'school_type': self._determine_type(response.url)},
+                priority=int(score),
+            )
         
         # Follow pagination if exists
         next_page = response.css('a.next::attr(href)').get()
@@ -1,91 +1,386 @@
 import scrapy
+from scrapy import signals
+from twisted.internet import defer
 import csv
+import glob
 import re
+import uuid
+from collections import deque
 from urllib.parse import urljoin, urlparse
+from scrapy.http import TextResponse
+from scrapy.utils.gz import gunzip, gzip_magic_number
+from scrapy.utils.sitemap import Sitemap
+from scraper.budget import DEFAULT_CONTENT_TYPES
+from scraper.checkpoint import completed_schools
+from scraper.hostcache import prefetch_host
 from scraper.items import MedicalSchoolItem
+from scraper.linkscore import score_link, site_key, top_links
+from scraper.matchers import COMMON_COURSES, FIELD_KEYWORDS, PAGE_KEYWORDS, iter_field_matches
+from scraper.page import PageAnalysis
+from scraper.workers import ExtractionPool
+
+SITEMAP_CONTENT_TYPES = DEFAULT_CONTENT_TYPES + ['application/octet-stream']
 
 
 class SchoolWebsitesSpider(scrapy.Spider):
     name = 'school_websites'
     
-    # This will be set from the CSV file
+    # Politeness is enforced per host: every school is its own domain, so
+    # many hosts are crawled in parallel while each one sees at most one
+    # request every DOWNLOAD_DELAY seconds (adapted by HostThrottleMiddleware)
     custom_settings = {
-        'DOWNLOAD_DELAY': 2,  # Be respectful - 2 second delay between requests
-        'RANDOMIZE_DOWNLOAD_DELAY': 0.5,
-        'CONCURRENT_REQUESTS': 1,  # One at a time to be respectful
+        'DOWNLOAD_DELAY': 2,  # Be respectful - 2 second delay between requests to a host
+        'RANDOMIZE_DOWNLOAD_DELAY': True,
+        'CONCURRENT_REQUESTS': 64,  # Hosts crawled in parallel
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 1,  # One at a time per host to be respectful
+        'REACTOR_THREADPOOL_MAXSIZE': 32,  # DNS lookups for many hosts at once
+        'AUTOTHROTTLE_ENABLED': False,  # Replaced by the per-host throttle below
+        'HOST_THROTTLE_ENABLED': True,
+        'DOWNLOAD_BUDGET_ENABLED': True,  # Skip PDFs/videos, truncate huge pages
+    }
+
+    # Fields read from page content. In focused mode any still missing after
+    # the homepage are filled from the best-scoring admissions subpages.
+    CONTENT_FIELDS = {
+        'mission': '_extract_mission',
+        'tuition': '_extract_tuition',
+        'avg_gpa': '_extract_gpa',
+        'avg_mcat': '_extract_mcat',
+        'required_courses': '_extract_courses',
+        'deadlines': '_extract_deadlines',
+        'class_size': '_extract_class_size',
+        'acceptance_rate': '_extract_acceptance_rate',
+        'accreditation': '_extract_accreditation',
     }
 
-    def __init__(self, csv_file='school_urls.csv', *args, **kwargs):
+    def __init__(self, csv_file='school_urls.csv', focused=False, max_pages=5, max_depth=2,
+                 *args, **kwargs):
         super(SchoolWebsitesSpider, self).__init__(*args, **kwargs)
+        # One or more CSV files: comma-separated, glob patterns allowed
         self.csv_file = csv_file
-        self.start_urls = []
-        self.school_data = {}  # Store name/type from CSV
-        
-        # Read URLs from CSV
-        self._load_urls_from_csv()
+        # Focused crawl: follow up to max_pages ranked subpages per school
+        self.focused = str(focused).lower() in ('1', 'true', 'yes')
+        self.max_pages = int(max_pages)
+        self.max_depth = int(max_depth)
+        # Set by from_crawler when EXTRACTION_POOL_ENABLED is on
+        self.extraction_pool = None
+        # Requests of an earlier run (restored from the JOBDIR queue) carry
+        # another run id; their schools are restarted from the homepage instead
+        self.run_id = uuid.uuid4().hex
 
-    def _load_urls_from_csv(self):
-        """Load school URLs and metadata from CSV file"""
-        try:
-            with open(self.csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Expect CSV with columns: name, website/url, type (optional), location (optional)
-                    url = row.get('website') or row.get('url') or row.get('link')
-                    if url:
+    def start_requests(self):
+        """Stream requests from the CSV file(s), carrying each row's metadata along"""
+        # Schools finished before a resumed JOBDIR crawl was interrupted
+        completed = completed_schools(self.settings)
+        # Announce schools a little before they are requested, so their
+        # robots.txt and DNS lookups are done by the time they are crawled
+        ahead = self.settings.getint('HOSTCACHE_PREFETCH_AHEAD', 0)
+        window = deque()
+        for school in self.iter_schools():
+            if school['url'] in completed:
+                self.crawler.stats.inc_value('checkpoint/skipped')
+                continue
+            self.crawler.signals.send_catch_log(prefetch_host, url=school['url'])
+            window.append(school)
+            if len(window) > ahead:
+                yield self._school_request(window.popleft())
+        while window:
+            yield self._school_request(window.popleft())
+
+    def _school_request(self, school):
+        return scrapy.Request(
+            school['url'],
+            callback=self.parse,
+            meta={'school': school, 'run': self.run_id},
+            dont_filter=True,
+        )
+
+    def csv_paths(self):
+        """CSV files named by the csv_file argument"""
+        paths = []
+        for pattern in self.csv_file.split(','):
+            pattern = pattern.strip()
+            matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            paths.extend(matches)
+        return paths
+
+    def count_schools(self):
+        """Number of school URLs in the CSV file(s), for progress reporting"""
+        return sum(1 for _ in self.iter_schools(log=False))
+
+    def iter_schools(self, log=True):
+        """Lazily yield school URLs and metadata, one CSV row at a time"""
+        for csv_file in self.csv_paths():
+            count = 0
+            try:
+                with open(csv_file, 'r', encoding='utf-8') as f:
+                    reader = csv.DictReader(f)
+                    for row in reader:
+                        # Expect CSV with columns: name, website/url, type (optional), location (optional)
+                        url = row.get('website') or row.get('url') or row.get('link')
+                        if not url:
+                            continue
+                        
                         # Clean URL
                         url = url.strip()
                         if not url.startswith('http'):
                             url = 'https://' + url
                         
-                        self.start_urls.append(url)
-                        
-                        # Store metadata
-                        self.school_data[url] = {
-                            'name': row.get('name', '').strip(),
-                            'type': row.get('type', '').strip() or 'MD',  # Default to MD
-                            'location': row.get('location', '').strip(),
-                            'city': row.get('city', '').strip(),
-                            'state': row.get('state', '').strip(),
+                        count += 1
+                        yield {
+                            'url': url,
+                            'name': (row.get('name') or '').strip(),
+                            'type': (row.get('type') or '').strip() or 'MD',  # Default to MD
+                            'location': (row.get('location') or '').strip(),
+                            'city': (row.get('city') or '').strip(),
+                            'state': (row.get('state') or '').strip(),
                         }
-            
-            self.logger.info(f'Loaded {len(self.start_urls)} school URLs from {self.csv_file}')
-        except FileNotFoundError:
-            self.logger.error(f'CSV file {self.csv_file} not found!')
-            self.logger.info('Expected CSV format: name,website,type,location (or url/link instead of website)')
-        except Exception as e:
-            self.logger.error(f'Error loading CSV: {e}')
+                
+                if log:
+                    self.logger.info(f'Loaded {count} school URLs from {csv_file}')
+            except FileNotFoundError:
+                if log:
+                    self.logger.error(f'CSV file {csv_file} not found!')
+                    self.logger.info('Expected CSV format: name,website,type,location (or url/link instead of website)')
+            except Exception as e:
+                if log:
+                    self.logger.error(f'Error loading CSV {csv_file}: {e}')
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(SchoolWebsitesSpider, cls).from_crawler(crawler, *args, **kwargs)
+        if crawler.settings.getbool('EXTRACTION_POOL_ENABLED'):
+            spider.extraction_pool = ExtractionPool.from_settings(cls, crawler.settings)
+            crawler.signals.connect(spider.extraction_pool.close, signal=signals.spider_closed)
+        return spider
 
     def parse(self, response):
         """Parse each school's website"""
+        if self._stale(response.meta.get('run')):
+            return []
+        if not isinstance(response, TextResponse):
+            # Not a web page (or skipped by the download budget)
+            self.crawler.stats.inc_value('school_websites/non_html_homepage')
+            return [self._metadata_item(response)]
+        if self.extraction_pool is None:
+            return self._parse_homepage(response, *self.extract_item(response, self.focused))
+        
+        # Extract in a worker process; on timeout fall back to the CSV metadata
+        d = self.extraction_pool.submit('extract_item', response, self.focused)
+        d.addCallback(lambda result: list(self._parse_homepage(response, *result)))
+        d.addErrback(self._extraction_failed, response)
+        return d
+
+    def extract_item(self, response, with_links=False):
+        """Extract a school's fields from its homepage; returns (item dict, links)"""
         url = response.url
-        metadata = self.school_data.get(url, {})
+        # Metadata travels with the request, so it survives redirects
+        metadata = response.meta.get('school', {})
+        page = PageAnalysis(response)
+        # schema.org markup is exact and cheap: heuristics only fill the gaps
+        structured = page.structured
         
         item = MedicalSchoolItem()
         
         # Use metadata from CSV if available
-        item['name'] = metadata.get('name') or self._extract_name(response)
-        item['type'] = metadata.get('type') or self._extract_type(response)
-        item['location'] = metadata.get('location') or self._extract_location(response)
-        item['city'] = metadata.get('city') or self._extract_city(response)
-        item['state'] = metadata.get('state') or self._extract_state(response)
+        item['name'] = metadata.get('name') or structured.get('name') or self._extract_name(page)
+        item['type'] = metadata.get('type') or structured.get('type') or self._extract_type(page)
+        item['location'] = metadata.get('location') or structured.get('location') or self._extract_location(page)
+        item['city'] = metadata.get('city') or structured.get('city') or self._extract_city(page)
+        item['state'] = metadata.get('state') or structured.get('state') or self._extract_state(page)
         item['link'] = url
         item['website'] = url
         
         # Extract other fields
-        item['mission'] = self._extract_mission(response)
-        item['tuition'] = self._extract_tuition(response)
-        item['avg_gpa'] = self._extract_gpa(response)
-        item['avg_mcat'] = self._extract_mcat(response)
-        item['required_courses'] = self._extract_courses(response)
-        item['deadlines'] = self._extract_deadlines(response)
-        item['class_size'] = self._extract_class_size(response)
-        item['acceptance_rate'] = self._extract_acceptance_rate(response)
-        item['accreditation'] = self._extract_accreditation(response)
+        self._fill_content_fields(item, page)
+        
+        links = self._page_links(page) if with_links else []
+        return dict(item), links
+
+    def extract_fields(self, response, fields, with_links=False):
+        """Extract the given content fields from a subpage; returns (values, links)"""
+        page = PageAnalysis(response)
+        values = {}
+        for field in fields:
+            value = page.structured.get(field) or getattr(self, self.CONTENT_FIELDS[field])(page)
+            if value:
+                values[field] = value
+        links = self._page_links(page) if with_links else []
+        return values, links
+
+    def _parse_homepage(self, response, fields, links):
+        item = MedicalSchoolItem(fields)
+        if not self.focused or self._is_complete(item):
+            yield item
+            return
+        
+        # Focused crawl: look for the missing fields on ranked subpages
+        url = response.url
+        focus = {
+            'item': item,
+            'school': response.meta.get('school', {}),
+            'site': site_key(url),
+            'seen': {url, response.request.url if response.request else url},
+            'candidates': {},  # url -> (score, depth)
+            'sitemaps': [response.urljoin('/sitemap.xml')],
+            'sitemaps_left': 3,
+            'pages': 0,
+            'run': self.run_id,
+        }
+        for link_url, text in links:
+            self._add_candidate(focus, link_url, text, depth=1)
+        yield from self._continue_focus(focus)
+
+    def _extraction_failed(self, failure, response):
+        """Emit what the CSV metadata alone provides when extraction fails or times out"""
+        if failure.check(defer.TimeoutError):
+            self.crawler.stats.inc_value('extraction_pool/timeout')
+        else:
+            self.logger.error(f'Extraction failed for {response.url}: {failure.getErrorMessage()}')
+            self.crawler.stats.inc_value('extraction_pool/error')
+        return [self._metadata_item(response)]
+
+    def _metadata_item(self, response):
+        """Item with only what the CSV metadata provides"""
+        metadata = response.meta.get('school', {})
+        item = MedicalSchoolItem()
+        for field in ('name', 'type', 'location', 'city', 'state'):
+            item[field] = metadata.get(field) or None
+        item['link'] = response.url
+        item['website'] = response.url
+        return item
+
+    def parse_sitemap(self, response):
+        """Add a school's sitemap entries to its focused-crawl candidates"""
+        focus = response.meta['focus']
+        if self._stale(focus.get('run')):
+            return
+        body = response.body
+        if gzip_magic_number(response):
+            body = gunzip(body)
+        
+        try:
+            sitemap = Sitemap(body)
+        except Exception:
+            sitemap = None
+        
+        if sitemap is not None and sitemap.type == 'sitemapindex':
+            # Follow the child sitemaps most likely to list admissions pages
+            children = [entry['loc'] for entry in sitemap if entry.get('loc')]
+            children.sort(key=lambda loc: score_link(loc) or 0, reverse=True)
+            focus['sitemaps'].extend(children[:2])
+        elif sitemap is not None and sitemap.type == 'urlset':
+            for i, entry in enumerate(sitemap):
+                if i >= 50000:
+                    break
+                self._add_candidate(focus, entry.get('loc'), '', depth=1)
+        
+        yield from self._continue_focus(focus)
+
+    def parse_subpage(self, response):
+        """Fill a school's missing fields from one of its subpages"""
+        focus = response.meta['focus']
+        if self._stale(focus.get('run')):
+            return []
+        if not isinstance(response, TextResponse):
+            return self._continue_focus(focus)
+        
+        missing = [field for field in self.CONTENT_FIELDS if not focus['item'].get(field)]
+        with_links = response.meta.get('focus_depth', 1) < self.max_depth
+        if self.extraction_pool is None:
+            return self._merge_subpage(response, *self.extract_fields(response, missing, with_links))
+        
+        d = self.extraction_pool.submit('extract_fields', response, missing, with_links)
+        d.addCallback(lambda result: list(self._merge_subpage(response, *result)))
+        d.addErrback(lambda failure: list(self._continue_focus(focus)))
+        return d
+
+    def _merge_subpage(self, response, values, links):
+        focus = response.meta['focus']
+        focus['item'].update(values)
+        depth = response.meta.get('focus_depth', 1)
+        for url, text in links:
+            self._add_candidate(focus, url, text, depth + 1)
+        yield from self._continue_focus(focus)
+
+    def focus_failed(self, failure):
+        """A sitemap or subpage failed: carry on with the next candidate"""
+        focus = failure.request.meta['focus']
+        if not self._stale(focus.get('run')):
+            yield from self._continue_focus(focus)
+
+    def _stale(self, run):
+        """
+        Whether a request was restored from an earlier run's queue. These are
+        dropped before download by StaleRequestMiddleware; this catches them
+        where the middleware is disabled.
+        """
+        return run is not None and run != self.run_id
+
+    def _continue_focus(self, focus):
+        """Request the next sitemap or best subpage, or emit the finished item"""
+        item = focus['item']
+        meta = {'school': focus['school'], 'focus': focus}
+        
+        if not self._is_complete(item):
+            if focus['sitemaps'] and focus['sitemaps_left'] > 0:
+                focus['sitemaps_left'] -= 1
+                # Gzipped sitemaps are often served as application/octet-stream
+                sitemap_meta = dict(meta, download_content_types=SITEMAP_CONTENT_TYPES)
+                yield scrapy.Request(focus['sitemaps'].pop(0), callback=self.parse_sitemap,
+                                     errback=self.focus_failed, meta=sitemap_meta, dont_filter=True)
+                return
+            
+            if focus['pages'] < self.max_pages:
+                candidates = ((score, url) for url, (score, _) in focus['candidates'].items())
+                best = top_links(candidates, 1)
+                if best:
+                    url = best[0][1]
+                    depth = focus['candidates'].pop(url)[1]
+                    focus['seen'].add(url)
+                    focus['pages'] += 1
+                    self.crawler.stats.inc_value('focused/subpages')
+                    # focus['seen'] dedupes per school; a request dropped by the
+                    # dupefilter (a page shared with another school) would stall it
+                    yield scrapy.Request(url, callback=self.parse_subpage, errback=self.focus_failed,
+                                         meta=dict(meta, focus_depth=depth), dont_filter=True)
+                    return
+        else:
+            self.crawler.stats.inc_value('focused/complete')
         
         yield item
 
-    def _extract_name(self, response):
+    def _page_links(self, page):
+        """(absolute url, anchor text) of every link on the page"""
+        return [
+            (page.response.urljoin(link.attrib['href']), ' '.join(link.css('::text').getall()))
+            for link in page.css('a[href]')
+        ]
+
+    def _add_candidate(self, focus, url, text, depth):
+        if not url:
+            return
+        url = url.strip().split('#')[0]
+        if url in focus['seen'] or site_key(url) != focus['site']:
+            return
+        score = score_link(url, text)
+        if score is None:
+            return
+        known = focus['candidates'].get(url)
+        if known:
+            score, depth = max(score, known[0]), min(depth, known[1])
+        focus['candidates'][url] = (score, depth)
+
+    def _fill_content_fields(self, item, page):
+        """Take fields from structured data, running the content extractors for the rest"""
+        structured = page.structured
+        for field, extractor in self.CONTENT_FIELDS.items():
+            item[field] = structured.get(field) or getattr(self, extractor)(page)
+
+    def _is_complete(self, item):
+        return all(item.get(field) for field in self.CONTENT_FIELDS)
+
+    def _extract_name(self, page):
         """Extract school name from various possible locations"""
         # Try multiple selectors
         selectors = [
@@ -98,7 +393,7 @@ class SchoolWebsitesSpider(scrapy.Spider):
         ]
         
         for selector in selectors:
-            name = response.css(selector).get()
+            name = page.css_first(selector)
             if name:
                 name = name.strip()
                 # Clean up common suffixes
@@ -108,19 +403,21 @@ class SchoolWebsitesSpider(scrapy.Spider):
                     return name
         
         # Fallback: use domain name
-        domain = urlparse(response.url).netloc
+        domain = urlparse(page.url).netloc
         return domain.replace('www.', '').split('.')[0].title()
 
-    def _extract_type(self, response):
+    def _extract_type(self, page):
         """Determine if MD or DO school"""
-        text = ' '.join(response.css('body').getall()).lower()
-        
-        if any(term in text for term in ['osteopathic', 'do school', 'd.o.', 'com']):
+        if ('type', 'DO') in self._keywords(page):
             return 'DO'
         return 'MD'
 
-    def _extract_location(self, response):
-        """Extract location"""
+    def _extract_location(self, page):
+        """Extract location (computed once per page)"""
+        return page.memo('location', lambda: self._find_location(page))
+
+    def _find_location(self, page):
+        """Look up location in address-like elements and meta tags"""
         # Try various location selectors
         selectors = [
             '[class*="location"]::text',
@@ -130,29 +427,29 @@ class SchoolWebsitesSpider(scrapy.Spider):
         ]
         
         for selector in selectors:
-            location = response.css(selector).get()
+            location = page.css_first(selector)
             if location:
                 return location.strip()
         
         # Try to extract from metadata
-        meta_location = response.css('meta[name*="location"]::attr(content)').get()
+        meta_location = page.css_first('meta[name*="location"]::attr(content)')
         if meta_location:
             return meta_location
         
         return None
 
-    def _extract_city(self, response):
+    def _extract_city(self, page):
         """Extract city from location"""
-        location = self._extract_location(response)
+        location = self._extract_location(page)
         if location:
             parts = location.split(',')
             if len(parts) > 0:
                 return parts[0].strip()
         return None
 
-    def _extract_state(self, response):
+    def _extract_state(self, page):
         """Extract state from location"""
-        location = self._extract_location(response)
+        location = self._extract_location(page)
         if location:
             # Look for 2-letter state code
             state_match = re.search(r',\s*([A-Z]{2})\b', location)
@@ -164,7 +461,7 @@ class SchoolWebsitesSpider(scrapy.Spider):
                 return parts[-1].strip()
         return None
 
-    def _extract_mission(self, response):
+    def _extract_mission(self, page):
         """Extract mission statement"""
         selectors = [
             '[class*="mission"]::text',
@@ -174,165 +471,103 @@ class SchoolWebsitesSpider(scrapy.Spider):
         ]
         
         for selector in selectors:
-            mission = ' '.join(response.css(selector).getall())
+            mission = ' '.join(page.css_all(selector))
             if mission and len(mission) > 50:  # Reasonable mission length
                 return mission.strip()[:1000]  # Limit length
         
         return None
 
-    def _extract_tuition(self, response):
+    def _field_text(self, page, field):
+        """Content blocks where a field's patterns can match, menus and footers excluded"""
+        return page.section_text(FIELD_KEYWORDS[field])
+
+    def _extract_tuition(self, page):
         """Extract tuition information"""
-        text = ' '.join(response.css('body').getall())
-        
-        # Look for tuition patterns
-        patterns = [
-            r'tuition[:\s]*\$?([\d,]+)',
-            r'\$([\d,]+)[\s]*tuition',
-            r'tuition.*?(\$[\d,]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    amount = match.group(1).replace(',', '').replace('$', '')
-                    return int(amount)
-                except:
-                    pass
+        for match in iter_field_matches('tuition', self._field_text(page, 'tuition')):
+            try:
+                amount = match.group(1).replace(',', '').replace('$', '')
+                return int(amount)
+            except:
+                pass
         
         return None
 
-    def _extract_gpa(self, response):
+    def _extract_gpa(self, page):
         """Extract average GPA"""
-        text = ' '.join(response.css('body').getall())
-        
-        patterns = [
-            r'gpa[:\s]*(\d+\.\d+)',
-            r'average.*?gpa[:\s]*(\d+\.\d+)',
-            r'gpa.*?(\d+\.\d+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    return float(match.group(1))
-                except:
-                    pass
+        for match in iter_field_matches('gpa', self._field_text(page, 'gpa')):
+            try:
+                return float(match.group(1))
+            except:
+                pass
         
         return None
 
-    def _extract_mcat(self, response):
+    def _extract_mcat(self, page):
         """Extract average MCAT score"""
-        text = ' '.join(response.css('body').getall())
-        
-        patterns = [
-            r'mcat[:\s]*(\d{3})',
-            r'average.*?mcat[:\s]*(\d{3})',
-            r'mcat.*?score[:\s]*(\d{3})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    score = int(match.group(1))
-                    if 472 <= score <= 528:  # Valid MCAT range
-                        return score
-                except:
-                    pass
+        for match in iter_field_matches('mcat', self._field_text(page, 'mcat')):
+            try:
+                score = int(match.group(1))
+                if 472 <= score <= 528:  # Valid MCAT range
+                    return score
+            except:
+                pass
         
         return None
 
-    def _extract_courses(self, response):
+    def _keywords(self, page):
+        """Labels of all keywords on the page, found in a single pass"""
+        return page.memo('keywords', lambda: PAGE_KEYWORDS.scan(page.lower))
+
+    def _extract_courses(self, page):
         """Extract required courses"""
-        text = ' '.join(response.css('body').getall())
-        
-        # Common required courses
-        common_courses = [
-            'Biology', 'Chemistry', 'Organic Chemistry', 'Physics',
-            'Mathematics', 'English', 'Biochemistry', 'Psychology',
-            'Sociology', 'Calculus', 'Statistics'
-        ]
-        
-        found_courses = []
-        for course in common_courses:
-            # Look for course name in text
-            pattern = rf'\b{re.escape(course)}\b'
-            if re.search(pattern, text, re.IGNORECASE):
-                found_courses.append(course)
+        keywords = self._keywords(page)
+        found_courses = [course for course in COMMON_COURSES if ('course', course) in keywords]
         
         return found_courses if found_courses else None
 
-    def _extract_deadlines(self, response):
+    def _extract_deadlines(self, page):
         """Extract application deadlines"""
-        text = ' '.join(response.css('body').getall())
-        
         deadlines = {}
         
-        # Look for primary deadline
-        primary_match = re.search(r'primary.*?deadline[:\s]*([A-Z][a-z]+\s+\d{1,2})', text, re.IGNORECASE)
-        if primary_match:
-            deadlines['primary'] = primary_match.group(1)
-        
-        # Look for secondary deadline
-        secondary_match = re.search(r'secondary.*?deadline[:\s]*([A-Z][a-z]+\s+\d{1,2})', text, re.IGNORECASE)
-        if secondary_match:
-            deadlines['secondary'] = secondary_match.group(1)
+        # Look for primary and secondary deadlines
+        for kind in ('primary', 'secondary'):
+            for match in iter_field_matches(f'{kind}_deadline', self._field_text(page, f'{kind}_deadline')):
+                deadlines[kind] = match.group(1)
+                break
         
         return deadlines if deadlines else None
 
-    def _extract_class_size(self, response):
+    def _extract_class_size(self, page):
         """Extract class size"""
-        text = ' '.join(response.css('body').getall())
-        
-        patterns = [
-            r'class.*?size[:\s]*(\d+)',
-            r'(\d+).*?students.*?class',
-            r'enrollment[:\s]*(\d+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    size = int(match.group(1))
-                    if 50 <= size <= 500:  # Reasonable class size
-                        return size
-                except:
-                    pass
+        for match in iter_field_matches('class_size', self._field_text(page, 'class_size')):
+            try:
+                size = int(match.group(1))
+                if 50 <= size <= 500:  # Reasonable class size
+                    return size
+            except:
+                pass
         
         return None
 
-    def _extract_acceptance_rate(self, response):
+    def _extract_acceptance_rate(self, page):
         """Extract acceptance rate"""
-        text = ' '.join(response.css('body').getall())
-        
-        patterns = [
-            r'acceptance.*?rate[:\s]*(\d+\.?\d*)%',
-            r'(\d+\.?\d*)%.*?acceptance',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    rate = float(match.group(1)) / 100
-                    if 0 < rate <= 1:  # Valid percentage
-                        return rate
-                except:
-                    pass
+        for match in iter_field_matches('acceptance_rate', self._field_text(page, 'acceptance_rate')):
+            try:
+                rate = float(match.group(1)) / 100
+                if 0 < rate <= 1:  # Valid percentage
+                    return rate
+            except:
+                pass
         
         return None
 
-    def _extract_accreditation(self, response):
+    def _extract_accreditation(self, page):
         """Extract accreditation info"""
-        text = ' '.join(response.css('body').getall())
+        keywords = self._keywords(page)
         
-        if re.search(r'lcm[ea]', text, re.IGNORECASE):
+        if ('accreditation', 'LCME') in keywords:
             return 'LCME'
-        elif re.search(r'aacom', text, re.IGNORECASE):
+        elif ('accreditation', 'AACOM') in keywords:
             return 'AACOM'
         
         return None
-
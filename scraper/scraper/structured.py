@@ -0,0 +1,234 @@
+# schema.org structured data (JSON-LD and microdata) embedded in school pages
+import json
+import re
+from datetime import date
+
+# Entities that describe the school itself, most specific first
+SCHOOL_TYPES = ('CollegeOrUniversity', 'EducationalOrganization')
+
+# Entities that describe the MD/DO program (tuition, deadline, class size)
+PROGRAM_TYPES = ('EducationalOccupationalProgram',)
+
+MONTH_DAY_RE = re.compile(r'^[A-Z][a-z]+\s+\d{1,2}$')
+
+
+def structured_fields(response):
+    """
+    Item fields found in the page's JSON-LD and microdata, e.g.
+    {'name': ..., 'city': ..., 'state': ..., 'tuition': ...}.
+
+    Only values that are explicitly marked up are returned, so they can be
+    trusted over the text heuristics. Pages without markup cost two
+    substring checks.
+    """
+    body = response.body
+    entities = []
+    if b'ld+json' in body:
+        entities.extend(_jsonld_entities(response))
+    if b'itemscope' in body:
+        entities.extend(_microdata_entities(response))
+    if not entities:
+        return {}
+
+    fields = {}
+    schools = [entity for entity in entities if _rank(entity, SCHOOL_TYPES) is not None]
+    if schools:
+        _school_fields(min(schools, key=lambda entity: _rank(entity, SCHOOL_TYPES)), fields)
+    for entity in entities:
+        if _rank(entity, PROGRAM_TYPES) is not None:
+            _program_fields(entity, fields)
+    return fields
+
+
+def _types(entity):
+    """schema.org type names of an entity, without the vocabulary URL"""
+    types = entity.get('@type') or []
+    if isinstance(types, str):
+        types = [types]
+    return [str(t).rstrip('/').rsplit('/', 1)[-1] for t in types]
+
+
+def _rank(entity, wanted):
+    """Position of the entity's best type in wanted, or None"""
+    ranks = [wanted.index(t) for t in _types(entity) if t in wanted]
+    return min(ranks) if ranks else None
+
+
+def _walk(node):
+    """Every entity (dict) in a JSON-LD document, including nested and @graph ones"""
+    if isinstance(node, list):
+        for child in node:
+            yield from _walk(child)
+    elif isinstance(node, dict):
+        yield node
+        for value in node.values():
+            if isinstance(value, (list, dict)):
+                yield from _walk(value)
+
+
+def _jsonld_entities(response):
+    for script in response.xpath('//script[@type="application/ld+json"]/text()').getall():
+        try:
+            data = json.loads(script)
+        except ValueError:
+            # Hand-written blocks often have comments or trailing commas
+            continue
+        yield from _walk(data)
+
+
+def _microdata_entities(response):
+    for scope in response.xpath('//*[@itemscope][not(ancestor::*[@itemscope])]'):
+        yield from _walk(_microdata_item(scope.root))
+
+
+def _microdata_item(element):
+    item = {'@type': element.get('itemtype', '').split()}
+    _collect_properties(element, item)
+    return item
+
+
+def _collect_properties(element, item):
+    # An explicit stack rather than recursion: pages can nest deeper than
+    # Python's recursion limit. A property is set after those nested in it.
+    stack = [(iter(element), None, None)]
+    while stack:
+        children, parent, parent_value = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if parent is not None:
+                _set_properties(item, parent, parent_value)
+            continue
+        if not isinstance(child.tag, str):
+            continue  # Comments and processing instructions
+        if child.get('itemscope') is not None:
+            _set_properties(item, child, _microdata_item(child))
+        else:
+            stack.append((iter(child), child, _microdata_value(child)))
+
+
+def _set_properties(item, element, value):
+    for prop in (element.get('itemprop') or '').split():
+        item.setdefault(prop, value)
+
+
+def _microdata_value(element):
+    tag = element.tag.lower()
+    if element.get('content') is not None:
+        return element.get('content').strip()
+    if tag in ('a', 'link', 'area'):
+        return element.get('href')
+    if tag in ('img', 'audio', 'video', 'source'):
+        return element.get('src')
+    if tag == 'time' and element.get('datetime'):
+        return element.get('datetime')
+    if tag in ('data', 'meter') and element.get('value') is not None:
+        return element.get('value')
+    return ' '.join(''.join(element.itertext()).split())
+
+
+def _text(value):
+    """Plain text of a property value (first of a list, name of an entity)"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('@value')
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    value = ' '.join(str(value).split())
+    return value or None
+
+
+def _school_fields(school, fields):
+    name = _text(school.get('name'))
+    if name:
+        fields['name'] = name
+        if 'osteopathic' in name.lower():
+            fields['type'] = 'DO'
+
+    address = school.get('address') or (school.get('location') or {})
+    if isinstance(address, list):
+        address = address[0] if address else {}
+    if isinstance(address, dict) and 'address' in address:
+        address = address['address']  # A Place wrapping its PostalAddress
+    if isinstance(address, dict):
+        city = _text(address.get('addressLocality'))
+        state = _text(address.get('addressRegion'))
+        if city:
+            fields['city'] = city
+        if state:
+            fields['state'] = state
+        location = ', '.join(part for part in (city, state) if part)
+        if location:
+            fields['location'] = location
+    elif _text(address):
+        fields['location'] = _text(address)
+
+    tuition = _tuition(school.get('offers'))
+    if tuition:
+        fields['tuition'] = tuition
+
+
+def _program_fields(program, fields):
+    credential = (_text(program.get('educationalCredentialAwarded')) or '').lower()
+    if 'osteopath' in credential or 'd.o.' in credential:
+        fields.setdefault('type', 'DO')
+    elif 'doctor of medicine' in credential or 'm.d.' in credential:
+        fields.setdefault('type', 'MD')
+
+    tuition = _tuition(program.get('offers'))
+    if tuition:
+        fields.setdefault('tuition', tuition)
+
+    deadline = _month_day(_text(program.get('applicationDeadline')))
+    if deadline:
+        fields.setdefault('deadlines', {'primary': deadline})
+
+    size = _number(program.get('maximumEnrollment'))
+    if size and 50 <= size <= 500:  # Same bounds as the text heuristics
+        fields.setdefault('class_size', int(size))
+
+
+def _tuition(offers):
+    """Yearly tuition in USD from an Offer (or list of them)"""
+    if isinstance(offers, dict):
+        offers = [offers]
+    for offer in offers or []:
+        if not isinstance(offer, dict):
+            continue
+        price = offer.get('price')
+        currency = offer.get('priceCurrency')
+        spec = offer.get('priceSpecification')
+        if price is None and isinstance(spec, dict):
+            price = spec.get('price')
+            currency = spec.get('priceCurrency', currency)
+        if currency and str(currency).upper() != 'USD':
+            continue
+        amount = _number(price)
+        if amount and 1000 <= amount <= 200000:
+            return int(amount)
+    return None
+
+
+def _number(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.replace(',', '').replace('$', '').strip())
+        except ValueError:
+            return None
+    return None
+
+
+def _month_day(value):
+    """An ISO date as 'October 1', the format of the deadline heuristics"""
+    if not value:
+        return None
+    try:
+        day = date.fromisoformat(value[:10])
+    except ValueError:
+        return value if MONTH_DAY_RE.match(value) else None
+    return f'{day:%B} {day.day}'
@@ -0,0 +1,208 @@
+# Crawl telemetry: extractor/pipeline/download timings and progress metrics
+import bisect
+import logging
+import os
+from time import perf_counter, time
+from urllib.parse import urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import defer, task
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'buckets': {str(bound): count for bound, count in self.cumulative()},
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class CrawlTelemetry:
+    """
+    Times extractors, pipelines and downloads, and reports crawl progress.
+
+    Histograms are published to the Scrapy stats (telemetry/...) and every
+    TELEMETRY_INTERVAL seconds a snapshot is written to TELEMETRY_FILE in
+    Prometheus text format, with progress and ETA against the spider's URL
+    list. When TELEMETRY_ENABLED is off nothing is wrapped or connected.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('TELEMETRY_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = settings.getfloat('TELEMETRY_INTERVAL', 15.0)
+        self.path = settings.get('TELEMETRY_FILE', 'crawl_metrics.prom')
+        self.extractors = {}  # method name -> Histogram
+        self.pipelines = {}  # pipeline class -> Histogram
+        self.downloads = Histogram()
+        self.hosts = {}  # host -> Histogram
+        self.total = None
+        self.started = None
+        self.task = None
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.response_received, signal=signals.response_received)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.started = time()
+        self._wrap_extractors(spider)
+        self._wrap_pipelines()
+        if hasattr(spider, 'count_schools'):
+            self.total = spider.count_schools()
+        self.task = task.LoopingCall(self.snapshot, spider)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+        self.snapshot(spider)
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return
+        self.downloads.observe(latency)
+        host = urlparse(response.url).netloc
+        histogram = self.hosts.get(host)
+        if histogram is None:
+            histogram = self.hosts[host] = Histogram()
+        histogram.observe(latency)
+
+    def _wrap_extractors(self, spider):
+        """Replace the spider's _extract_* methods with timed versions"""
+        for name in dir(spider):
+            if not name.startswith('_extract_'):
+                continue
+            histogram = self.extractors[name] = Histogram()
+            setattr(spider, name, self._timed(getattr(spider, name), histogram))
+
+    def _wrap_pipelines(self):
+        """Time each pipeline's process_item, including deferred results"""
+        try:
+            methods = self.crawler.engine.scraper.itemproc.methods['process_item']
+        except AttributeError:
+            logger.warning('Pipeline timing is not supported by this Scrapy version')
+            return
+        for i, method in enumerate(methods):
+            owner = getattr(getattr(method, '__wrapped__', method), '__self__', None)
+            name = type(owner).__name__ if owner is not None else getattr(method, '__name__', str(i))
+            histogram = self.pipelines[name] = Histogram()
+            methods[i] = self._timed(method, histogram)
+
+    def _timed(self, method, histogram):
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            result = method(*args, **kwargs)
+            if isinstance(result, defer.Deferred):
+                def done(value):
+                    histogram.observe(perf_counter() - start)
+                    return value
+                result.addBoth(done)
+            else:
+                histogram.observe(perf_counter() - start)
+            return result
+        return timed
+
+    def progress(self):
+        """(done, total, eta seconds) for spiders that know their URL list size"""
+        done = self.stats.get_value('item_scraped_count', 0) + self.stats.get_value('item_dropped_count', 0)
+        if not self.total:
+            return done, None, None
+        elapsed = time() - self.started
+        eta = elapsed / done * max(self.total - done, 0) if done else None
+        return done, self.total, eta
+
+    def snapshot(self, spider):
+        """Publish histograms to the stats and write the metrics file"""
+        for name, histogram in self.extractors.items():
+            self.stats.set_value(f'telemetry/extract/{name}', histogram.as_dict())
+        for name, histogram in self.pipelines.items():
+            self.stats.set_value(f'telemetry/pipeline/{name}', histogram.as_dict())
+        self.stats.set_value('telemetry/download', self.downloads.as_dict())
+        for host, histogram in self.hosts.items():
+            self.stats.set_value(f'telemetry/host/{host}', histogram.as_dict())
+        done, total, eta = self.progress()
+        if eta is not None:
+            self.stats.set_value('telemetry/eta_seconds', round(eta))
+
+        try:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(self.render(spider, done, total, eta))
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            logger.error(f'Could not write metrics to {self.path}: {e}')
+
+    def render(self, spider, done, total, eta):
+        """Prometheus text exposition of the current metrics"""
+        lines = []
+        spider_label = f'spider="{_label(spider.name)}"'
+
+        def histogram(metric, help_text, label, series):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for key, hist in series.items():
+                labels = spider_label + (f',{label}="{_label(key)}"' if label else '')
+                for bound, count in hist.cumulative():
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum{{{labels}}} {hist.sum:.6f}')
+                lines.append(f'{metric}_count{{{labels}}} {hist.count}')
+
+        def gauge(metric, help_text, value):
+            if value is None:
+                return
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric}{{{spider_label}}} {value}')
+
+        histogram('scraper_extract_seconds', 'Time spent in each _extract_* method',
+                  'extractor', self.extractors)
+        histogram('scraper_pipeline_seconds', 'Time spent in each pipeline process_item',
+                  'pipeline', self.pipelines)
+        histogram('scraper_download_seconds', 'Download latency of all responses',
+                  None, {'': self.downloads})
+        histogram('scraper_host_download_seconds', 'Download latency per host',
+                  'host', dict(sorted(self.hosts.items())))
+
+        gauge('scraper_items_done', 'Items scraped or dropped so far', done)
+        gauge('scraper_items_total', 'Size of the URL list', total)
+        gauge('scraper_eta_seconds', 'Estimated seconds until the URL list is done',
+              round(eta) if eta is not None else None)
+        gauge('scraper_elapsed_seconds', 'Seconds since the spider opened',
+              round(time() - self.started))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,109 @@
+# Per-host adaptive throttling
+import logging
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+
+class HostThrottleMiddleware:
+    """
+    Adjusts the delay and concurrency of each host's download slot on its own.
+
+    Scrapy already keeps one downloader slot per host, so politeness towards
+    one school does not have to serialize the others. This middleware tunes
+    every slot from what that host does: the delay follows measured latency,
+    backs off on 429/503 (honouring Retry-After) and on connection errors,
+    and a host that backed off gets its parallel requests back after a run of
+    quick answers, up to CONCURRENT_REQUESTS_PER_DOMAIN (or the higher
+    HOST_THROTTLE_MAX_CONCURRENCY, if set). Responses from the HTTP cache are
+    ignored: their timings say nothing about the host.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('HOST_THROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.min_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.max_delay = settings.getfloat('HOST_THROTTLE_MAX_DELAY', 60.0)
+        self.target_concurrency = settings.getfloat('HOST_THROTTLE_TARGET_CONCURRENCY', 1.0)
+        # Going past the configured per-host concurrency is opt-in
+        self.max_concurrency = max(settings.getint('HOST_THROTTLE_MAX_CONCURRENCY'),
+                                   settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'))
+        self.backoff_codes = {int(code) for code in settings.getlist('HOST_THROTTLE_BACKOFF_CODES', [429, 503])}
+        self.debug = settings.getbool('HOST_THROTTLE_DEBUG')
+        self.successes = {}  # slot key -> consecutive fast responses
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _get_slot(self, request):
+        key = request.meta.get('download_slot')
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def process_response(self, request, response, spider):
+        key, slot = self._get_slot(request)
+        if slot is None or 'cached' in response.flags:
+            return response
+
+        old_delay = slot.delay
+        if response.status in self.backoff_codes:
+            retry_after = self._retry_after(response)
+            self._back_off(key, slot, factor=2.0, at_least=retry_after)
+            self.crawler.stats.inc_value('host_throttle/backoff')
+        else:
+            latency = request.meta.get('download_latency')
+            if latency is not None:
+                # Same target as AutoThrottle, but errors may not speed a host up
+                target = latency / self.target_concurrency
+                new_delay = max(target, (slot.delay + target) / 2.0)
+                if response.status >= 400:
+                    new_delay = max(new_delay, slot.delay)
+                slot.delay = self._clamp(new_delay)
+                self._speed_up(key, slot, latency)
+
+        if self.debug and slot.delay != old_delay:
+            logger.debug(f'{key}: delay {old_delay:.2f}s -> {slot.delay:.2f}s '
+                         f'(status {response.status}, concurrency {slot.concurrency})')
+        return response
+
+    def process_exception(self, request, exception, spider):
+        key, slot = self._get_slot(request)
+        if slot is not None:
+            self._back_off(key, slot, factor=1.5)
+            self.crawler.stats.inc_value('host_throttle/error_backoff')
+
+    def _back_off(self, key, slot, factor, at_least=0.0):
+        slot.delay = self._clamp(max(slot.delay * factor, self.min_delay or 1.0, at_least))
+        slot.concurrency = max(1, slot.concurrency // 2)
+        self.successes[key] = 0
+
+    def _speed_up(self, key, slot, latency):
+        # Give back one parallel request after a run of quick answers
+        if latency > slot.delay:
+            self.successes[key] = 0
+            return
+        self.successes[key] = self.successes.get(key, 0) + 1
+        if self.successes[key] >= 5 and slot.concurrency < self.max_concurrency:
+            slot.concurrency += 1
+            self.successes[key] = 0
+
+    def _clamp(self, delay):
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def _retry_after(self, response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return 0.0
+        try:
+            return float(value.decode('latin-1'))
+        except ValueError:
+            # HTTP-date form: fall back to the normal backoff
+            return 0.0
+
+    def _spider_closed(self, spider):
+        self.successes.clear()
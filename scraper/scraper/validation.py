@@ -0,0 +1,142 @@
+# Data-quality checks of scraped numbers, run on batches of items with NumPy
+import numpy as np
+
+FIELDS = ('tuition', 'avg_gpa', 'avg_mcat', 'class_size', 'acceptance_rate')
+COLUMN = {field: i for i, field in enumerate(FIELDS)}
+
+# Plausible values (inclusive); acceptance_rate is a fraction, as extracted
+RANGES = {
+    'tuition': (1000, 150000),
+    'avg_gpa': (2.5, 4.0),
+    'avg_mcat': (472, 528),
+    'class_size': (20, 1000),
+    'acceptance_rate': (0.005, 0.8),
+}
+
+# Tuition that is really the year of the page ("2025-2026 tuition: ...")
+YEARS = (1990, 2100)
+
+# Integer fields that should never hold the same number: the same match
+# extracted twice. The second field of each pair is the one flagged. Only
+# MCAT and class size share a plausible range; a tuition equal to either is
+# already out of range.
+DUPLICATE_PAIRS = (('avg_mcat', 'class_size'),)
+
+# Fields that move together across schools (+1) or against each other (-1):
+# selective schools have high GPAs and MCATs and low acceptance rates
+CORRELATED_PAIRS = (('avg_gpa', 'avg_mcat', 1), ('avg_mcat', 'acceptance_rate', -1),
+                    ('avg_gpa', 'acceptance_rate', -1))
+
+# Scales the median absolute deviation to a standard deviation (normal data)
+MAD_SCALE = 0.6745
+
+
+class BatchValidator:
+    """
+    Flags implausible values in a batch of items, all fields at once.
+
+    values is an (items, FIELDS) float array with NaN for missing values.
+    Each value is checked against RANGES, then scored per school type (MD,
+    DO) with the modified z-score 0.6745 * (x - median) / MAD, where median
+    and MAD are computed over the batch and the last history_size accepted
+    values of that type: |z| > threshold is an outlier. Fields that are
+    correlated across schools are flagged when their z-scores contradict
+    each other by more than pair_threshold. Scores need min_samples values
+    of a field; the first batches of a crawl are only range-checked.
+    """
+
+    def __init__(self, ranges=None, threshold=3.5, pair_threshold=6.0, min_samples=20,
+                 history_size=1000):
+        ranges = ranges or RANGES
+        self.low = np.array([ranges[field][0] for field in FIELDS], dtype=float)
+        self.high = np.array([ranges[field][1] for field in FIELDS], dtype=float)
+        self.threshold = threshold
+        self.pair_threshold = pair_threshold
+        self.min_samples = min_samples
+        self.history_size = history_size
+        self.history = {}  # type -> (rows, FIELDS) array of accepted values
+
+    def validate(self, types, values):
+        """
+        Returns the reasons of each flagged value as a list of
+        (row, field, check, detail) tuples, and the flagged mask.
+        """
+        types = np.asarray(types, dtype=object)
+        present = ~np.isnan(values)
+        reasons = []
+
+        tuition = values[:, COLUMN['tuition']]
+        with np.errstate(invalid='ignore'):
+            out_of_range = present & ((values < self.low) | (values > self.high))
+            year = (tuition >= YEARS[0]) & (tuition <= YEARS[1]) & (tuition == np.round(tuition))
+        out_of_range[:, COLUMN['tuition']] |= year
+        for row, column in zip(*np.nonzero(out_of_range)):
+            field = FIELDS[column]
+            if field == 'tuition' and year[row]:
+                detail = f'{values[row, column]:g} looks like a year'
+            else:
+                detail = f'{values[row, column]:g} outside {self.low[column]:g}-{self.high[column]:g}'
+            reasons.append((row, field, 'range', detail))
+        flagged = out_of_range.copy()
+
+        for first, second in DUPLICATE_PAIRS:
+            a, b = COLUMN[first], COLUMN[second]
+            same = present[:, a] & present[:, b] & (values[:, a] == values[:, b]) & ~flagged[:, b]
+            for row in np.nonzero(same)[0]:
+                reasons.append((row, second, 'duplicate', f'same value as {first} ({values[row, a]:g})'))
+            flagged[:, b] |= same
+
+        # Robust z-scores of the values that passed, per school type
+        checked = np.where(flagged, np.nan, values)
+        scores = np.full(values.shape, np.nan)
+        for kind in np.unique(types):
+            rows = types == kind
+            reference = checked[rows]
+            history = self.history.get(kind)
+            if history is not None:
+                reference = np.concatenate([history, reference])
+            block = np.full((int(rows.sum()), len(FIELDS)), np.nan)
+            for column in range(len(FIELDS)):
+                known = reference[:, column]
+                known = known[~np.isnan(known)]
+                if len(known) < self.min_samples:
+                    continue
+                # np.median partitions in linear time; nanmedian is far slower
+                median = np.median(known)
+                mad = np.median(np.abs(known - median))
+                if mad > 0:  # Otherwise all values are identical: nothing stands out
+                    block[:, column] = MAD_SCALE * (checked[rows, column] - median) / mad
+            scores[rows] = block
+
+        with np.errstate(invalid='ignore'):
+            outliers = np.abs(scores) > self.threshold
+        for row, column in zip(*np.nonzero(outliers)):
+            reasons.append((row, FIELDS[column], 'outlier',
+                            f'{values[row, column]:g} is {scores[row, column]:+.1f} MADs from the '
+                            f'{types[row]} median'))
+        flagged |= outliers
+
+        for first, second, sign in CORRELATED_PAIRS:
+            a, b = COLUMN[first], COLUMN[second]
+            with np.errstate(invalid='ignore'):
+                gap = np.abs(scores[:, a] - sign * scores[:, b])
+                contradicting = (gap > self.pair_threshold) & ~flagged[:, a] & ~flagged[:, b]
+            for row in np.nonzero(contradicting)[0]:
+                # The value further from its median is the suspect one
+                column = a if abs(scores[row, a]) >= abs(scores[row, b]) else b
+                other = FIELDS[b if column == a else a]
+                reasons.append((row, FIELDS[column], 'inconsistent',
+                                f'{values[row, column]:g} contradicts {other} ({gap[row]:.1f} MADs)'))
+                flagged[row, column] = True
+
+        self._remember(types, np.where(flagged, np.nan, values))
+        return reasons, flagged
+
+    def _remember(self, types, accepted):
+        """Add accepted values to the per-type history, keeping the newest"""
+        for kind in np.unique(types):
+            rows = accepted[types == kind]
+            history = self.history.get(kind)
+            if history is not None:
+                rows = np.concatenate([history, rows])
+            self.history[kind] = rows[-self.history_size:]
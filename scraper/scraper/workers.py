@@ -0,0 +1,167 @@
+# Process pool for CPU-heavy extraction, off the Twisted reactor thread
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from twisted.internet import defer
+
+# Never fork the process running the reactor and its threads
+_context = multiprocessing.get_context('spawn')
+
+
+def _worker_main(conn, spider_path):
+    """Worker process: load the spider, then run extraction tasks until the pipe closes"""
+    from scrapy.utils.misc import load_object
+    spider = load_object(spider_path)()
+    conn.send(('ready', None))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = ('ok', _run_task(spider, *task))
+        except Exception as e:
+            result = ('error', e)
+        try:
+            conn.send(result)
+        except Exception as e:  # The result or the exception does not pickle
+            conn.send(('error', RuntimeError(f'{type(e).__name__}: {e}')))
+
+
+def _run_task(spider, method, url, body, encoding, school, args):
+    """Rebuild the response in the worker and run a spider extraction method on it"""
+    from scrapy import Request
+    from scrapy.http import HtmlResponse
+
+    request = Request(url, meta={'school': school})
+    response = HtmlResponse(url, body=body, encoding=encoding, request=request)
+    return getattr(spider, method)(response, *args)
+
+
+class _Worker:
+    """One worker process, started on first use and replaced when it hangs or dies"""
+
+    def __init__(self, spider_path):
+        self.spider_path = spider_path
+        self.process = None
+        self.conn = None
+
+    def run(self, task, timeout):
+        """Run a task; the timeout only counts once the worker has the task"""
+        if self.process is not None and not self.process.is_alive():
+            self.stop()  # Died between tasks
+        if self.process is None:
+            self._start()
+        self.conn.send(task)
+        if not self.conn.poll(timeout):
+            self.stop()
+            raise TimeoutError
+        try:
+            status, value = self.conn.recv()
+        except EOFError:
+            self.stop()
+            raise RuntimeError('Extraction worker died')
+        if status == 'error':
+            raise value
+        return value
+
+    def _start(self):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(
+            target=_worker_main, args=(child_conn, self.spider_path), daemon=True)
+        self.process.start()
+        child_conn.close()
+        try:
+            self.conn.recv()  # 'ready': importing the spider is not part of any task
+        except EOFError:
+            self.stop()
+            raise RuntimeError('Extraction worker failed to start')
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.conn.close()
+        self.process.terminate()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.process = self.conn = None
+
+
+class ExtractionPool:
+    """
+    Runs spider extraction methods in worker processes and returns Deferreds.
+
+    At most max_pending tasks are in flight; further submissions wait their
+    turn, so response bodies queue up in the scraper (where Scrapy's
+    SCRAPER_SLOT_MAX_ACTIVE_SIZE slows downloads) rather than in the pool.
+    Each worker process is driven by its own thread, and a task's timeout
+    starts when a worker picks it up, not while it waits behind others. A
+    task that exceeds the timeout fails with defer.TimeoutError so the
+    spider can emit a partial item, and its worker is killed and replaced
+    so that a pathological page never holds a worker for long.
+    """
+
+    def __init__(self, spider_cls, workers=None, timeout=10.0, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        spider_path = f'{spider_cls.__module__}.{spider_cls.__name__}'
+        self.idle = queue.SimpleQueue()
+        self.all_workers = [_Worker(spider_path) for _ in range(self.workers)]
+        for worker in self.all_workers:
+            self.idle.put(worker)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix='extraction')
+        self.semaphore = defer.DeferredSemaphore(max_pending or self.workers * 2)
+
+    @classmethod
+    def from_settings(cls, spider_cls, settings):
+        return cls(
+            spider_cls,
+            workers=settings.getint('EXTRACTION_POOL_WORKERS') or None,
+            timeout=settings.getfloat('EXTRACTION_POOL_TIMEOUT', 10.0),
+            max_pending=settings.getint('EXTRACTION_POOL_MAX_PENDING') or None,
+        )
+
+    def submit(self, method, response, *args):
+        """Run spider.method(response, *args) in a worker; returns a Deferred"""
+        school = response.meta.get('school', {})
+        return self.semaphore.run(
+            self._submit, (method, response.url, response.body, response.encoding, school, args)
+        )
+
+    def _submit(self, task):
+        # Imported here so that importing this module never installs a reactor
+        from twisted.internet import reactor
+        d = defer.Deferred()
+        future = self.executor.submit(self._run, task)
+        # Done callbacks run in the executor's thread: hop back to the reactor
+        future.add_done_callback(lambda f: reactor.callFromThread(self._resolve, d, f))
+        return d
+
+    def _run(self, task):
+        """Run a task on an idle worker (executor thread)"""
+        worker = self.idle.get()
+        try:
+            return worker.run(task, self.timeout)
+        finally:
+            self.idle.put(worker)
+
+    def _resolve(self, d, future):
+        """Fire the task's Deferred from the reactor thread"""
+        if future.cancelled():
+            d.errback(defer.CancelledError())
+        elif isinstance(future.exception(), TimeoutError):
+            d.errback(defer.TimeoutError(f'Extraction took longer than {self.timeout}s'))
+        elif future.exception() is not None:
+            d.errback(future.exception())
+        else:
+            d.callback(future.result())
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for worker in self.all_workers:
+            worker.stop()
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+class FakePostgrest:
+    """
+    Stand-in for the Supabase REST API: upserts rows on their on_conflict
+    column, answers with the queued statuses first and with 422 for batches
+    holding a row that reject(row) refuses.
+    """
+
+    def __init__(self):
+        self.rows = {}  # table -> {key: row}
+        self.batches = []  # rows of every POST, in the order received
+        self.statuses = []  # responses of the next requests
+        self.reject = lambda row: False
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                rows = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                key = parse_qs(url.query)['on_conflict'][0]
+                self._respond(fake.upsert(url.path.strip('/'), key, rows))
+
+            def _respond(self, status):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return Handler
+
+    def upsert(self, table, key, rows):
+        with self.lock:
+            self.batches.append(rows)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            status = self.statuses.pop(0) if self.statuses else None
+        try:
+            time.sleep(self.delay)
+            if status is not None:
+                return status
+            if any(self.reject(row) for row in rows):
+                return 422
+            with self.lock:
+                stored = self.rows.setdefault(table, {})
+                for row in rows:
+                    stored[row[key]] = row
+            return 201
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def serve(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def postgrest():
+    fake = FakePostgrest()
+    fake.serve()
+    yield fake
+    fake.close()
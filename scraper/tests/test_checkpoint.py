@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from scraper.checkpoint import (
+    BloomDupeFilter, BloomFilter, CrawlCheckpoint, StaleRequestMiddleware, checkpoint_saving,
+    completed_schools, load_checkpoint,
+)
+from scraper.pipelines import JsonLinesExportPipeline
+
+
+def dupefilter(jobdir):
+    return BloomDupeFilter.from_crawler(get_crawler(settings_dict={'JOBDIR': str(jobdir)}))
+
+
+def test_bloom_filter_error_rate():
+    bloom = BloomFilter(capacity=20000, error_rate=1e-3)
+
+    def fingerprint(i):  # Request fingerprints are SHA1 digests
+        return hashlib.sha1(str(i).encode()).digest()
+
+    added = sum(not bloom.add(fingerprint(i)) for i in range(20000))
+    assert added > 19950
+    false_positives = sum(fingerprint(-i) in bloom for i in range(1, 20001))
+    assert false_positives < 60  # 1e-3 expected: 20
+
+
+def test_bloom_dupefilter_persists_in_jobdir(tmp_path):
+    seen = dupefilter(tmp_path)
+    assert not seen.request_seen(Request('https://a.edu/'))
+    assert seen.request_seen(Request('https://a.edu/'))
+    assert not seen.request_seen(Request('https://a.edu/admissions'))
+    seen.close('shutdown')
+
+    resumed = dupefilter(tmp_path)
+    assert resumed.request_seen(Request('https://a.edu/admissions'))
+    assert not resumed.request_seen(Request('https://b.edu/'))
+    resumed.close('finished')
+
+
+def scraped_response(url):
+    request = Request(url, meta={'school': {'url': url}})
+    return Response(url, request=request)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    jobdir = tmp_path / 'job'
+    crawler = get_crawler(settings_dict={'JOBDIR': str(jobdir)})
+    export_path = str(tmp_path / 'schools.jsonl')
+    pipeline = JsonLinesExportPipeline(export_path)
+    crawler.signals.connect(pipeline.checkpoint_saving, signal=checkpoint_saving)
+    checkpoint = CrawlCheckpoint(crawler)
+    os.makedirs(jobdir, exist_ok=True)
+
+    pipeline.open_spider(None)
+    for url in ('https://a.edu/', 'https://b.edu/'):
+        pipeline.process_item({'name': url}, None)
+        checkpoint.item_scraped({}, scraped_response(url), None)
+    checkpoint.save()
+    # Exported after the checkpoint, then the crawl dies before the next one
+    pipeline.process_item({'name': 'https://c.edu/'}, None)
+    pipeline.raw.flush()
+
+    state = load_checkpoint(str(jobdir))
+    assert state['completed'] == ['https://a.edu/', 'https://b.edu/']
+    assert state['jsonl']['items'] == 2
+    assert completed_schools(crawler.settings) == {'https://a.edu/', 'https://b.edu/'}
+
+    resumed = JsonLinesExportPipeline(export_path, resume=state['jsonl'])
+    resumed.open_spider(None)
+    resumed.process_item({'name': 'https://c.edu/'}, None)
+    resumed.close_spider(None)
+    with open(export_path, encoding='utf-8') as f:
+        names = [json.loads(line)['name'] for line in f]
+    assert names == ['https://a.edu/', 'https://b.edu/', 'https://c.edu/']
+
+
+def test_stale_requests_are_dropped_before_download(tmp_path):
+    crawler = get_crawler(settings_dict={'JOBDIR': str(tmp_path)})
+    middleware = StaleRequestMiddleware.from_crawler(crawler)
+    spider = Spider('schools')
+    spider.run_id = 'current'
+
+    assert middleware.process_request(Request('https://a.edu/', meta={'run': 'current'}), spider) is None
+    assert middleware.process_request(Request('https://a.edu/robots.txt'), spider) is None
+    with pytest.raises(IgnoreRequest):
+        middleware.process_request(Request('https://a.edu/', meta={'run': 'earlier'}), spider)
+    with pytest.raises(IgnoreRequest):
+        middleware.process_request(Request('https://a.edu/apply', meta={'focus': {'run': 'earlier'}}), spider)
+    assert crawler.stats.get_value('checkpoint/stale_requests') == 2
@@ -0,0 +1,119 @@
+import itertools
+import random
+import time
+
+from scraper.dedupe import resolve
+
+SYLLABLES = ['bar', 'cel', 'dor', 'fin', 'gal', 'hol', 'kem', 'lis', 'mar', 'nov', 'pel', 'ros',
+             'sal', 'tor', 'val', 'wen', 'yar', 'zel']
+
+STATES = [('California', 'CA'), ('Texas', 'TX'), ('New York', 'NY'), ('Ohio', 'OH'),
+          ('Florida', 'FL'), ('Michigan', 'MI')]
+
+SPELLINGS = [
+    '{0} Medical School',
+    '{0} University School of Medicine',
+    'Univ of {0} College of Medicine',
+    'The {0} School of Medicine',
+    '{0} Medical College',
+]
+
+
+def schools(count):
+    """count distinct schools: a two-word name, a state and a domain"""
+    words = (''.join(parts) for parts in itertools.permutations(SYLLABLES, 3))
+    for i in range(count):
+        first, second = next(words), next(words)
+        yield {
+            'name': f'{first.title()} {second.title()}',
+            'state': STATES[i % len(STATES)],
+            'type': 'DO' if i % 7 == 0 else 'MD',
+            'domain': f'{first}{second}.edu',
+        }
+
+
+def scraped_records(school_list, copies, seed=0):
+    """copies records per school, as several spiders and sources spell them"""
+    rng = random.Random(seed)
+    records = []
+    for school in school_list:
+        state_name, state_code = school['state']
+        for _ in range(copies):
+            record = {
+                'name': rng.choice(SPELLINGS).format(school['name']),
+                'state': rng.choice([state_name, state_code, '']),
+                'type': rng.choice([school['type'], '']),
+                'tuition': rng.choice([None, 50000 + len(school['name'])]),
+            }
+            if rng.random() < 0.5:
+                record['website'] = f'https://www.{school["domain"]}/admissions'
+            records.append(record)
+    rng.shuffle(records)
+    return records
+
+
+def test_merges_spellings_of_one_school():
+    records = [
+        {'name': 'Harvard Medical School', 'state': 'MA', 'type': 'MD', 'tuition': 69300},
+        {'name': 'Harvard University School of Medicine', 'state': 'Massachusetts'},
+        {'name': 'Howard University College of Medicine', 'state': 'DC', 'type': 'MD'},
+    ]
+    merged = resolve(records)
+    assert sorted(r['name'] for r in merged) == [
+        'Harvard Medical School', 'Howard University College of Medicine']
+    harvard = next(r for r in merged if r['name'] == 'Harvard Medical School')
+    assert harvard['tuition'] == 69300
+
+
+def test_never_merges_across_states_or_types():
+    records = [
+        {'name': 'Kansas City University', 'state': 'MO', 'type': 'DO'},
+        {'name': 'Kansas City University', 'state': 'MO', 'type': 'MD'},
+        {'name': 'Kansas City University', 'state': 'KS', 'type': 'DO'},
+    ]
+    assert len(resolve(records)) == 3
+
+
+def test_records_without_a_name_are_kept_apart():
+    records = [{'name': 'School of Medicine', 'state': 'CA'}] * 3
+    assert len(resolve(records)) == 3
+
+
+def test_merges_at_scale():
+    # 400 records for each of 300 schools: every block holds far more than
+    # max_block records, but only a handful of distinct keys
+    school_list = list(schools(300))
+    records = scraped_records(school_list, copies=400)
+    assert len(records) == 120000
+
+    started = time.perf_counter()
+    merged = resolve(records)
+    elapsed = time.perf_counter() - started
+
+    assert len(merged) == 300
+    assert {record['tuition'] for record in merged} == {50000 + len(s['name']) for s in school_list}
+    assert elapsed < 30
+
+
+def test_blank_state_does_not_bridge_two_schools():
+    records = [
+        {'name': 'University of Washington School of Medicine', 'state': 'WA', 'type': 'MD',
+         'tuition': 40000},
+        {'name': 'Washington University School of Medicine', 'state': 'MO', 'type': 'MD',
+         'tuition': 70000},
+        {'name': 'Washington University School of Medicine', 'type': 'MD'},
+    ]
+    merged = resolve(records)
+    assert len(merged) == 2
+    assert sorted((r['state'], r['tuition']) for r in merged) == [('MO', 70000), ('WA', 40000)]
+
+
+def test_blank_record_does_not_bridge_states_and_types():
+    records = [
+        {'name': 'Kansas City University', 'state': 'MO', 'type': 'DO'},
+        {'name': 'Kansas City University', 'state': 'KS', 'type': 'MD'},
+        {'name': 'Kansas City University'},
+    ]
+    merged = resolve(records)
+    assert len(merged) == 2
+    assert {(r['state'], r['type']) for r in merged} == {('MO', 'DO'), ('KS', 'MD')}
@@ -0,0 +1,114 @@
+import json
+import pickle
+import time
+
+from scrapy import Request, Spider
+from scrapy.utils.test import get_crawler
+
+from scraper.frontier import Frontier, FrontierMiddleware
+from scraper.pipelines import export_items
+
+
+def entry(url, host):
+    return url, host, pickle.dumps({'url': url}, protocol=4)
+
+
+def seeded_workers(path):
+    """Two workers sharing one frontier file"""
+    first, second = Frontier(str(path)), Frontier(str(path))
+    added = first.add([
+        entry('https://a.edu/', 'a.edu'),
+        entry('https://a.edu/apply', 'a.edu'),
+        entry('https://b.edu/', 'b.edu'),
+    ])
+    assert added == 3
+    assert second.add([entry('https://b.edu/', 'b.edu')]) == 0
+    return first, second
+
+
+def test_workers_never_lease_the_same_host(tmp_path):
+    first, second = seeded_workers(tmp_path / 'frontier.sqlite')
+
+    leased = first.lease('one', 1, ttl=60)
+    assert len(leased) == 1
+    other = second.lease('two', 5, ttl=60)
+    assert set(leased) | set(other) == {'a.edu', 'b.edu'}
+    assert not set(leased) & set(other)
+    assert first.lease('one', 5, ttl=60) == {}
+    assert second.status()['leased_hosts'] == 2
+
+    second.complete([url for url, _ in other.popitem()[1]])
+    first.complete([url for url, _ in leased.popitem()[1]])
+    assert first.remaining() == second.remaining() == 0
+    first.close()
+    second.close()
+
+
+def test_expired_lease_goes_to_another_worker(tmp_path):
+    first, second = seeded_workers(tmp_path / 'frontier.sqlite')
+
+    leased = first.lease('one', 5, ttl=0.05)
+    assert set(leased) == {'a.edu', 'b.edu'}
+    first.complete(['https://a.edu/'])
+    assert second.lease('two', 5, ttl=60) == {}
+
+    time.sleep(0.1)  # 'one' stopped renewing
+    taken = second.lease('two', 5, ttl=60)
+    assert sorted(url for urls in taken.values() for url, _ in urls) == [
+        'https://a.edu/apply', 'https://b.edu/']
+    assert first.renew('one', ttl=60) == set()
+    first.close()
+    second.close()
+
+
+def test_merge_keeps_one_item_per_school(tmp_path):
+    first, second = seeded_workers(tmp_path / 'frontier.sqlite')
+    assert first.store_item('https://a.edu/', 'one', {'name': 'A School', 'tuition': 50000})
+    assert not second.store_item('https://a.edu/', 'two', {'name': 'A School', 'tuition': 51000})
+    assert second.store_item('https://b.edu/', 'two', {'name': 'B School'})
+    assert first.status()['items'] == 2
+
+    export_path = tmp_path / 'schools.jsonl'
+    crawler = get_crawler(settings_dict={
+        'ITEM_PIPELINES': {'scraper.pipelines.JsonLinesExportPipeline': 400},
+        'JSONL_EXPORT_PATH': str(export_path),
+    })
+    assert export_items(crawler, first.iter_items()) == 2
+    with open(export_path, encoding='utf-8') as f:
+        items = [json.loads(line) for line in f]
+    assert [(item['name'], item.get('tuition')) for item in items] == [
+        ('A School', 50000), ('B School', None)]
+    first.close()
+    second.close()
+
+
+class ListingSpider(Spider):
+    name = 'listing'
+
+    def parse_school(self, response):
+        pass
+
+
+def test_requests_from_callbacks_are_shared_by_host(tmp_path):
+    crawler = get_crawler(ListingSpider, settings_dict={'FRONTIER_PATH': str(tmp_path / 'frontier.sqlite')})
+    middleware = FrontierMiddleware.from_crawler(crawler)
+    spider = ListingSpider()
+    middleware.held = {'list.org': {'https://list.org/schools'}}
+    middleware.max_hosts = 1  # Lease nothing more
+
+    output = [
+        Request('https://list.org/schools?page=2'),
+        Request('https://a.edu/', callback=spider.parse_school),
+        Request('https://a.edu/', callback=spider.parse_school),
+        Request('https://apply.list.org/', meta={'school': {'url': 'https://list.org/'}}),
+        {'name': 'Listed School'},
+    ]
+    kept = list(middleware.process_spider_output(None, output, spider))
+    assert [getattr(result, 'url', result) for result in kept] == [
+        'https://list.org/schools?page=2', 'https://apply.list.org/', {'name': 'Listed School'}]
+    assert crawler.stats.get_value('frontier/shared') == 1
+
+    leased = Frontier(str(tmp_path / 'frontier.sqlite')).lease('other', 5, ttl=60)
+    assert list(leased) == ['a.edu']
+    assert [url for url, _ in leased['a.edu']] == ['https://a.edu/']
+    middleware.frontier.close()
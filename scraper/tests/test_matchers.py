@@ -0,0 +1,28 @@
+from scrapy.http import HtmlResponse
+
+from scraper.matchers import FIELD_KEYWORDS, iter_field_matches
+from scraper.page import PageAnalysis
+
+
+def first_match(field, html):
+    response = HtmlResponse('https://med.example.edu/', body=html.encode('utf-8'), encoding='utf-8')
+    text = PageAnalysis(response).section_text(FIELD_KEYWORDS[field])
+    match = next(iter_field_matches(field, text), None)
+    return match.group(1) if match else None
+
+
+def test_matches_label_and_value_in_one_block():
+    assert first_match('tuition', '<body><p>Tuition: $62,450 per year</p></body>') == '62,450'
+    assert first_match('mcat', '<body><td>Average MCAT 514</td></body>') == '514'
+    assert first_match('primary_deadline', '<body><li>Primary deadline: October 15</li></body>') == 'October 15'
+
+
+def test_label_does_not_take_the_number_of_the_next_block():
+    html = '<body><h2>Tuition</h2><p>2026 entering class</p></body>'
+    assert first_match('tuition', html) is None
+    html = '<body><p>Class size</p><p>128 Main Street</p></body>'
+    assert first_match('class_size', html) is None
+    html = '<body><p>Our 200 faculty</p><p>Students in each class meet weekly</p></body>'
+    assert first_match('class_size', html) is None
+    html = '<body><p>Primary deadline</p><p>November 1 is when secondaries open</p></body>'
+    assert first_match('primary_deadline', html) is None
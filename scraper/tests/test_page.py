@@ -0,0 +1,32 @@
+from scrapy.http import HtmlResponse
+
+from scraper.page import PageAnalysis
+
+
+def analysis(body):
+    html = f'<html><body>{body}</body></html>'
+    return PageAnalysis(HtmlResponse('https://med.example.edu/', body=html.encode('utf-8'), encoding='utf-8'))
+
+
+def test_sections_split_at_headings_and_blocks():
+    page = analysis(
+        '<nav><a>Tuition</a></nav>'
+        '<p>Welcome to <b>Lakeside</b> Medical School</p>'
+        '<h2>Cost of attendance</h2><p>Tuition: $61,000</p><div>Fees: $2,000<br>Housing</div>'
+        '<footer>Tuition office</footer>'
+    )
+    assert page.sections == [
+        ('', ['Welcome to Lakeside Medical School']),
+        ('Cost of attendance', ['Tuition: $61,000', 'Fees: $2,000', 'Housing']),
+    ]
+    assert page.section_text(('tuition',)) == 'Tuition: $61,000'
+    assert page.section_text(('cost',)) == 'Cost of attendance\nTuition: $61,000\nFees: $2,000\nHousing'
+
+
+def test_deeply_nested_page():
+    # Deeper than the Python recursion limit; libxml2 itself stops near 2048 levels
+    for depth in (1200, 3000):
+        page = analysis('<div>' * depth + '<p>Tuition: $50,000</p>' + '</div>' * depth)
+        text = page.section_text(('tuition',))
+        if depth < 2000:
+            assert text == 'Tuition: $50,000'
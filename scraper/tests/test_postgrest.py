@@ -0,0 +1,61 @@
+import pytest
+
+from scraper.postgrest import PostgrestClient, bulk_upsert, upsert_batch
+
+
+@pytest.fixture
+def client(postgrest):
+    client = PostgrestClient(postgrest.url, rest_path='')
+    yield client
+    client.close()
+
+
+def rows(count, tuition=50000):
+    return [{'name': f'School {i}', 'tuition': tuition} for i in range(count)]
+
+
+def test_rows_are_sent_in_batches(postgrest, client):
+    batches = []
+    # A school repeated within a batch is sent once, as last seen
+    result = bulk_upsert(client, 'schools', iter(rows(1049) + [{'name': 'School 1048', 'tuition': 1}]),
+                         batch_size=500, backoff=0, on_batch=lambda ok, failed: batches.append(len(ok)))
+    assert (result.succeeded, result.failed, result.requests) == (1049, 0, 3)
+    assert sorted(batches) == [49, 500, 500]
+    assert sorted(len(batch) for batch in postgrest.batches) == [49, 500, 500]
+    assert len(postgrest.rows['schools']) == 1049
+    assert postgrest.rows['schools']['School 1048']['tuition'] == 1
+
+
+def test_in_flight_batches_are_bounded(postgrest, client):
+    postgrest.delay = 0.05
+    result = bulk_upsert(client, 'schools', rows(200), batch_size=10, max_in_flight=2, backoff=0)
+    assert result.succeeded == 200
+    assert postgrest.max_in_flight == 2
+
+
+def test_server_errors_are_retried(postgrest, client):
+    postgrest.statuses = [503, 502]
+    succeeded, failed, requests = upsert_batch(client, 'schools', rows(10), backoff=0)
+    assert (len(succeeded), failed, requests) == (10, [], 3)
+
+    postgrest.statuses = [503] * 4
+    succeeded, failed, requests = upsert_batch(client, 'schools', rows(10), retries=3, backoff=0)
+    assert (succeeded, len(failed), requests) == ([], 10, 4)
+    assert 'HTTP 503' in failed[0][1]
+
+
+def test_rejected_batch_is_split_down_to_the_bad_row(postgrest, client):
+    postgrest.reject = lambda row: row['name'] == 'School 5'
+    succeeded, failed, requests = upsert_batch(client, 'schools', rows(16), backoff=0)
+    assert len(succeeded) == 15
+    assert [(row['name'], error[:8]) for row, error in failed] == [('School 5', 'HTTP 422')]
+    # 16 rows, then 8 + 8, 4 + 4, 2 + 2 and 1 + 1
+    assert requests == 9
+    assert 'School 5' not in postgrest.rows['schools']
+    assert len(postgrest.rows['schools']) == 15
+
+
+def test_other_errors_fail_the_batch_at_once(postgrest, client):
+    postgrest.statuses = [401]
+    succeeded, failed, requests = upsert_batch(client, 'schools', rows(16), backoff=0)
+    assert (succeeded, len(failed), requests) == ([], 16, 1)
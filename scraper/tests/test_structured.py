@@ -0,0 +1,23 @@
+from scrapy.http import HtmlResponse
+
+from scraper.structured import structured_fields
+
+
+def fields(body):
+    html = f'<html><body>{body}</body></html>'
+    return structured_fields(HtmlResponse('https://med.example.edu/', body=html.encode('utf-8'), encoding='utf-8'))
+
+
+def test_microdata_nested_deeper_than_the_recursion_limit():
+    depth = 1500
+    result = fields(
+        '<div itemscope itemtype="https://schema.org/CollegeOrUniversity">'
+        '<span itemprop="name">Lakeside Medical School</span>'
+        + '<div>' * depth
+        + '<span itemprop="address" itemscope itemtype="https://schema.org/PostalAddress">'
+          '<span itemprop="addressRegion">OH</span></span>'
+        + '</div>' * depth
+        + '</div>'
+    )
+    assert result['name'] == 'Lakeside Medical School'
+    assert result['state'] == 'OH'
@@ -0,0 +1,135 @@
+import csv
+
+import pytest
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, task
+
+from scraper import pipelines
+from scraper.items import MedicalSchoolItem
+from scraper.normalize import build_school_data
+from scraper.pipelines import CsvExportPipeline, SupabaseSinkPipeline
+
+
+class HeldBatches:
+    """Stands in for deferToThread: a batch is only sent when the test finishes it"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, function, *args, **kwargs):
+        d = defer.Deferred()
+        self.calls.append((d, function, args, kwargs))
+        return d
+
+    def finish(self):
+        d, function, args, kwargs = self.calls.pop(0)
+        d.callback(function(*args, **kwargs))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = task.Clock()
+
+    class LoopingCall(task.LoopingCall):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.clock = clock
+
+    monkeypatch.setattr(pipelines.task, 'LoopingCall', LoopingCall)
+    return clock
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    held = HeldBatches()
+    monkeypatch.setattr(pipelines.threads, 'deferToThread', held)
+    return held
+
+
+def open_sink(postgrest, **options):
+    sink = SupabaseSinkPipeline(postgrest.url, rest_path='', stats=get_crawler().stats, **options)
+    sink.open_spider(None)
+    return sink
+
+
+def school(i, **fields):
+    return MedicalSchoolItem(name=f'School {i}', type='MD', state='OH', **fields)
+
+
+def test_full_batches_are_sent_at_once(postgrest, clock, batches):
+    sink = open_sink(postgrest, batch_size=3, flush_interval=5)
+    for i in range(5):
+        sink.process_item(school(i), None)
+    assert [len(args[2]) for _, _, args, _ in batches.calls] == [3]
+
+    batches.finish()
+    assert sorted(postgrest.rows['schools']) == ['School 0', 'School 1', 'School 2']
+    assert sink.stats.get_value('supabase_sink/batches') == 1
+    assert sink.stats.get_value('supabase_sink/rows') == 3
+
+    d = sink.close_spider(None)
+    batches.finish()  # The last two schools
+    assert d.called
+    assert len(postgrest.rows['schools']) == 5
+
+
+def test_partial_batch_is_sent_after_the_flush_interval(postgrest, clock, batches):
+    sink = open_sink(postgrest, batch_size=100, flush_interval=5)
+    sink.process_item(school(0), None)
+    sink.process_item(school(1), None)
+    sink.process_item(school(0, tuition=60000), None)  # The latest item of a school wins
+    clock.advance(4)
+    assert batches.calls == []
+
+    clock.advance(1)
+    assert [len(args[2]) for _, _, args, _ in batches.calls] == [2]
+    batches.finish()
+    assert postgrest.rows['schools']['School 0']['tuition'] == 60000
+    sink.close_spider(None)
+
+
+def test_items_are_held_while_every_batch_is_in_flight(postgrest, clock, batches):
+    sink = open_sink(postgrest, batch_size=2, max_in_flight=1)
+    results = [sink.process_item(school(i), None) for i in range(4)]
+    assert len(batches.calls) == 1
+    assert isinstance(results[3], defer.Deferred) and not results[3].called
+    assert sink.stats.get_value('supabase_sink/backpressure') == 1
+
+    # The slow batch finishes: the held one is sent and the item let go
+    batches.finish()
+    assert len(batches.calls) == 1
+    assert results[3].called
+    assert results[3].result is not None and results[3].result['name'] == 'School 3'
+
+    d = sink.close_spider(None)
+    batches.finish()
+    assert d.called
+    assert len(postgrest.rows['schools']) == 4
+
+
+def test_records_are_normalized_like_the_csv_import(postgrest, clock, batches, tmp_path):
+    items = [
+        MedicalSchoolItem(name='Lakeside Medical School', city='Toledo', state='OH', tuition='61000',
+                          avg_gpa=3.81, avg_mcat=511, required_courses=['Biology', 'Chemistry'],
+                          deadlines={'primary': 'October 15'}, website='https://lakeside.edu/'),
+        MedicalSchoolItem(name='Bay College of Osteopathic Medicine', type='DO', location='Tampa, FL'),
+        MedicalSchoolItem(name='', type='MD'),
+    ]
+    csv_path = str(tmp_path / 'schools.csv')
+    export = CsvExportPipeline(csv_path)
+    export.open_spider(None)
+    sink = open_sink(postgrest, batch_size=10)
+    for item in items:
+        export.process_item(item, None)
+        sink.process_item(item, None)
+    export.close_spider(None)
+    sink.close_spider(None)
+    batches.finish()
+
+    # import_csv_to_supabase reads the CSV export with csv.DictReader and
+    # normalizes each row with build_school_data
+    with open(csv_path, encoding='utf-8') as f:
+        expected = [build_school_data(row) for row in csv.DictReader(f)]
+    expected = {record['name']: record for record in expected if record['name']}
+    assert postgrest.rows['schools'] == expected
+    assert sink.stats.get_value('supabase_sink/skipped') == 1
@@ -0,0 +1,30 @@
+from scrapy import Request, Spider
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from scraper.telemetry import CrawlTelemetry
+
+
+def test_download_latency_histograms_per_host(tmp_path):
+    path = str(tmp_path / 'metrics.prom')
+    crawler = get_crawler(settings_dict={'TELEMETRY_ENABLED': True, 'TELEMETRY_FILE': path})
+    telemetry = CrawlTelemetry.from_crawler(crawler)
+    telemetry.started = 0
+    spider = Spider('schools')
+
+    for url, latency in (('https://a.edu/', 0.2), ('https://a.edu/apply', 0.7), ('https://b.edu/', 3.0)):
+        request = Request(url, meta={'download_latency': latency})
+        telemetry.response_received(Response(url, request=request), request, spider)
+    telemetry.snapshot(spider)
+
+    a = crawler.stats.get_value('telemetry/host/a.edu')
+    assert a['count'] == 2
+    assert a['buckets']['0.5'] == 1 and a['buckets']['1.0'] == 2
+    assert crawler.stats.get_value('telemetry/host/b.edu')['buckets']['2.5'] == 0
+    assert crawler.stats.get_value('telemetry/download')['count'] == 3
+
+    with open(path, encoding='utf-8') as f:
+        metrics = f.read()
+    assert '# TYPE scraper_host_download_seconds histogram' in metrics
+    assert 'scraper_host_download_seconds_bucket{spider="schools",host="a.edu",le="1.0"} 2' in metrics
+    assert 'scraper_host_download_seconds_count{spider="schools",host="b.edu"} 1' in metrics
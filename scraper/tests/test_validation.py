@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from scraper.pipelines import ValidationPipeline
+from scraper.validation import FIELDS, BatchValidator
+
+
+def batch(*rows):
+    """(items, FIELDS) array from dicts of field values"""
+    values = np.full((len(rows), len(FIELDS)), np.nan)
+    for i, row in enumerate(rows):
+        for field, value in row.items():
+            values[i, FIELDS.index(field)] = value
+    return values
+
+
+def flags(reasons):
+    return [(int(row), field, check) for row, field, check, _ in reasons]
+
+
+def typical(count):
+    """MD schools with GPA and MCAT rising together"""
+    return [{'tuition': 50000 + 500 * i, 'avg_gpa': 3.5 + 0.4 * i / (count - 1),
+             'avg_mcat': 508 + 8 * i / (count - 1)} for i in range(count)]
+
+
+def test_values_outside_their_range():
+    reasons, flagged = BatchValidator().validate(['MD', 'MD'], batch(
+        {'tuition': 2025, 'avg_gpa': 3.7, 'avg_mcat': 600, 'acceptance_rate': 0.05},
+        {'tuition': 61000, 'avg_mcat': 512, 'class_size': 512},
+    ))
+    assert flags(reasons) == [(0, 'tuition', 'range'), (0, 'avg_mcat', 'range'), (1, 'class_size', 'duplicate')]
+    assert reasons[0][3] == '2025 looks like a year'
+    assert flagged[0].tolist() == [True, False, True, False, False]
+
+
+def test_outliers_are_scored_per_school_type():
+    validator = BatchValidator()
+    rows = typical(40) + [{'tuition': 140000}]
+    reasons, _ = validator.validate(['MD'] * 41, batch(*rows))
+    assert flags(reasons) == [(40, 'tuition', 'outlier')]
+
+    # Too few DO schools yet to tell, and MD schools are no reference for them
+    reasons, _ = validator.validate(['DO', 'MD'], batch({'tuition': 140000}, {'tuition': 140000}))
+    assert flags(reasons) == [(1, 'tuition', 'outlier')]
+
+
+def test_history_carries_over_between_batches():
+    validator = BatchValidator()
+    assert validator.validate(['MD'] * 40, batch(*typical(40)))[0] == []
+    reasons, _ = validator.validate(['MD'], batch({'tuition': 140000}))
+    assert flags(reasons) == [(0, 'tuition', 'outlier')]
+
+
+def test_correlated_fields_that_contradict_each_other():
+    rows = typical(40) + [{'avg_gpa': 3.2, 'avg_mcat': 523}, {'avg_gpa': 3.2, 'avg_mcat': 508}]
+    reasons, flagged = BatchValidator().validate(['MD'] * 42, batch(*rows))
+    # A high MCAT with a low GPA; a low MCAT with a low GPA is consistent
+    assert flags(reasons) == [(40, 'avg_mcat', 'inconsistent')]
+    assert reasons[0][3].startswith('523 contradicts avg_gpa')
+    assert not flagged[41].any()
+
+
+def open_pipeline(tmp_path, **options):
+    pipeline = ValidationPipeline(BatchValidator(), quarantine_path=str(tmp_path / 'quarantine.jsonl'),
+                                  stats=get_crawler().stats, **options)
+    pipeline.open_spider(None)
+    return pipeline
+
+
+def quarantined(tmp_path):
+    with open(tmp_path / 'quarantine.jsonl', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_flagged_values_are_removed_and_quarantined(tmp_path):
+    pipeline = open_pipeline(tmp_path, batch_size=2)
+    first = pipeline.process_item({'name': 'A', 'type': 'MD', 'tuition': 2025, 'avg_gpa': 3.7}, None)
+    assert not first.called
+    second = pipeline.process_item({'name': 'B', 'type': 'MD', 'avg_mcat': 511}, None)
+    assert first.result == {'name': 'A', 'type': 'MD', 'tuition': None, 'avg_gpa': 3.7}
+    assert second.result == {'name': 'B', 'type': 'MD', 'avg_mcat': 511}
+    pipeline.close_spider(None)
+
+    [record] = quarantined(tmp_path)
+    assert record['item'] == {'name': 'A', 'type': 'MD', 'tuition': 2025, 'avg_gpa': 3.7}
+    assert record['reasons'] == [{'field': 'tuition', 'check': 'range', 'detail': '2025 looks like a year'}]
+    assert pipeline.stats.get_value('validation/quarantined') == 1
+    assert pipeline.stats.get_value('validation/flagged/range') == 1
+
+
+def test_flagged_items_can_be_dropped(tmp_path):
+    pipeline = open_pipeline(tmp_path, drop=True)
+    kept = pipeline.process_item({'name': 'A', 'avg_gpa': 3.7}, None)
+    dropped = pipeline.process_item({'name': 'B', 'avg_gpa': 5.2}, None)
+    errors = []
+    dropped.addErrback(errors.append)
+    # A checkpoint waits for the pipelines to empty: the batch is validated at once
+    pipeline.checkpoint_requested()
+    assert kept.result == {'name': 'A', 'avg_gpa': 3.7}
+    assert errors[0].check(DropItem)
+    assert 'avg_gpa: 5.2 outside 2.5-4' in errors[0].getErrorMessage()
+    pipeline.close_spider(None)
+    assert [record['item']['name'] for record in quarantined(tmp_path)] == ['B']
@@ -0,0 +1,86 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+from twisted.internet import defer
+
+from scraper.workers import ExtractionPool, _Worker
+
+
+class ExtractionSpider:
+    """Loaded by name in the worker processes"""
+
+    def work(self, response, seconds):
+        time.sleep(seconds)
+        return os.getpid(), response.meta['school'].get('name')
+
+    def fail(self, response):
+        raise ValueError('bad page')
+
+    def crash(self, response):
+        os._exit(1)
+
+
+SPIDER_PATH = f'{ExtractionSpider.__module__}.{ExtractionSpider.__name__}'
+
+
+def task(method, *args):
+    return method, 'https://a.edu/', b'<html></html>', 'utf-8', {'name': 'A School'}, args
+
+
+@pytest.fixture
+def worker():
+    worker = _Worker(SPIDER_PATH)
+    yield worker
+    worker.stop()
+
+
+def test_worker_runs_tasks_in_one_process(worker):
+    pid, name = worker.run(task('work', 0), timeout=10)
+    assert name == 'A School'
+    assert worker.run(task('work', 0), timeout=10)[0] == pid != os.getpid()
+    with pytest.raises(ValueError, match='bad page'):
+        worker.run(task('fail'), timeout=10)
+    assert worker.run(task('work', 0), timeout=10)[0] == pid
+
+
+def test_hung_worker_is_replaced(worker):
+    pid, _ = worker.run(task('work', 0), timeout=10)
+    with pytest.raises(TimeoutError):
+        worker.run(task('work', 30), timeout=0.5)
+    assert worker.process is None
+    assert worker.run(task('work', 0), timeout=10)[0] != pid
+
+
+def test_dead_worker_is_replaced(worker):
+    pid, _ = worker.run(task('work', 0), timeout=10)
+    with pytest.raises(RuntimeError, match='died'):
+        worker.run(task('crash'), timeout=10)
+    assert worker.run(task('work', 0), timeout=10)[0] != pid
+
+
+def resolved(pool, future):
+    """The task's Deferred, as fired by the pool on the reactor thread (waits for the task)"""
+    d = defer.Deferred()
+    pool._resolve(d, future)
+    outcome = []
+    d.addBoth(outcome.append)
+    return outcome[0]
+
+
+def test_pool_timeout_fails_only_the_slow_task():
+    pool = ExtractionPool(ExtractionSpider, workers=1, timeout=0.5)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # One worker: whichever task waits for it, its timeout starts at pickup
+            slow = executor.submit(pool._run, task('work', 30))
+            fast = executor.submit(pool._run, task('work', 0.2))
+            assert resolved(pool, slow).check(defer.TimeoutError)
+            assert resolved(pool, fast)[1] == 'A School'
+            # The hung worker was replaced
+            after = executor.submit(pool._run, task('work', 0))
+            assert resolved(pool, after)[1] == 'A School'
+    finally:
+        pool.close()